@@ -7,6 +7,15 @@
 from ij import IJ                       								# Main functions of ImageJ (logging, opening images, etc.)
 from ij.plugin import FolderOpener        								# Allows opening a folder as a sequence of images
 from ij.process import ImageConverter    	 							# Image conversion between different formats
+from ij import ImagePlus, VirtualStack  								# Image container and stack whose frames are read on demand
+from ij.io import Opener                								# Opens a single image file (one frame at a time)
+from ij.io import FileSaver             								# JPEG quality configured in ImageJ
+# Imports for image stabilization (FFT phase correlation)
+from ij.process import FHT, FloatProcessor, ImageProcessor, Blitter, ImageStatistics	# Hartley transform and whole-image arithmetic
+from ij.measure import Measurements     								# Selection of the statistics to compute
+from ij.plugin.filter import MaximumFinder								# Locates the correlation peak
+import math                             								# Trigonometric functions for the FFT window
+import jarray                           								# Java arrays to build processors from Python lists
 # Imports for date and time handling
 from datetime import datetime             								# Formatting and manipulating dates and times
 # Imports related to ImageJ preferences
@@ -14,36 +23,82 @@ import ij.Prefs                         								# Handling ImageJ preferences an
 # Imports for interacting with the operating system
 import os                               								# Operations with paths, directories, and files
 import sys                             								 	# Access to system functions and parameters
+import time                             								# Measuring elapsed time of each processing job
+import threading                        								# Locks to protect shared counters between workers
+import hashlib                          								# Hash of the first frame used as orientation cache key
+import atexit                           								# Flushes the pending log lines when Fiji exits
 # Imports for network connections
 from java.net import URL  							# For making requests to web services and APIs
 # Imports for data input/output operations
 from java.io import BufferedReader, InputStreamReader, DataOutputStream # Handling streams for reading and writing data
+from java.io import IOException          								# Connection errors and timeouts of the HTTP requests
+from java.io import ByteArrayOutputStream 								# In-memory buffer for the JPEG sent to Custom Vision
+from javax.imageio import ImageIO, IIOImage, ImageWriteParam			# JPEG encoding without writing a file
 # Imports for encoding operations
 # Import for handling JSON data
 from org.json import JSONObject         								# Creating and parsing JSON objects
-# Imports for graphical interface and dialog handling
-import javax.swing.JDialog as JDialog     								# Dialog component for modal windows
-import java.awt.Dialog.ModalityType as ModalityType  					# Defines the modality type of dialogs
+# Imports for the worker pool that processes (well, point) jobs in parallel
+from java.lang import Runtime             								# Number of available processors
+from java.lang import Thread as JavaThread								# Stack traces of the workers sampled by the profiler
+from java.util.concurrent import Executors, Callable   					# Thread pool and tasks that return a result
+from java.util.concurrent import ArrayBlockingQueue   					# Bounded queue between the stages of the pipeline
+from java.util.concurrent import Semaphore   							# Bounds the Custom Vision requests in flight
+from java.util.concurrent import LinkedBlockingQueue, TimeUnit		# Log lines waiting for the log writer
 # Import for copying directories recursively
-from shutil import copytree             								# Complete copy of one folder to another
-# Imports for selecting files and directories through a dialog
-import javax.swing.JFileChooser as JFileChooser  						# Component for opening file or directory selection dialogs
+from java.nio.file import Files, Paths, StandardCopyOption				# Copies and links of the input files
+from java.nio.file.attribute import BasicFileAttributes					# Size and dates read with the directory listing
 import codecs                           								# Handling files with specific encoding
-# Additional Swing imports for building the GUI
-from javax.swing import JPanel, JButton, JLabel, JTextField, BoxLayout, BorderFactory, SwingConstants
-from javax.swing import JComboBox, JCheckBox, JScrollPane
-# AWT imports for layout, font, and color settings
-from java.awt import BorderLayout, FlowLayout, Font, Color, GridLayout, Insets, Dimension
-from javax.swing import SwingUtilities   								# To ensure the GUI runs on the event dispatch thread
+# Imports for the headless command line
+import argparse                         								# Arguments of the command line (see run_headless)
+import csv                              								# Batch manifest with several plates and metrics file (see run_batch, write_metrics)
+# Imports for the benchmark with synthetic plates (see run_benchmark)
+from java.util import Random             								# Seeded cells and drift of the synthetic frames
+from java.net import InetSocketAddress   								# Local address of the Custom Vision stand-in
+from com.sun.net.httpserver import HttpServer, HttpHandler				# HTTP server of the Custom Vision stand-in
+from java.lang import System, String     								# Garbage collection before each configuration and UTF-8 answers of the stand-in
+from java.lang.management import ManagementFactory, MemoryType			# Peak usage of the heap memory pools
+from java.awt import GraphicsEnvironment   								# Detects Fiji --headless and machines without a display
 # Imports for window event handling
 from java.awt.event import WindowAdapter   								# Adapter for window closing and other window events
+# Command line arguments or a JVM without a display select the headless mode, which never loads the GUI classes
+HEADLESS = len(sys.argv) > 1 or GraphicsEnvironment.isHeadless()
+if not HEADLESS:
+	# Imports for graphical interface and dialog handling
+	import javax.swing.JDialog as JDialog     							# Dialog component for modal windows
+	import java.awt.Dialog.ModalityType as ModalityType  				# Defines the modality type of dialogs
+	# Imports for selecting files and directories through a dialog
+	import javax.swing.JFileChooser as JFileChooser  					# Component for opening file or directory selection dialogs
+	# Additional Swing imports for building the GUI
+	from javax.swing import JPanel, JButton, JLabel, JTextField, BoxLayout, BorderFactory, SwingConstants
+	from javax.swing import JComboBox, JCheckBox, JScrollPane
+	# AWT imports for layout, font, and color settings
+	from java.awt import BorderLayout, FlowLayout, Font, Color, GridLayout, Insets, Dimension
+	from javax.swing import SwingUtilities   							# To ensure the GUI runs on the event dispatch thread
+	from javax.swing import Timer           							# Periodic refresh of the progress view
 
 # =============================================
 # Global Variables
 # =============================================
 configuracion = {}  # Do not initialize here (loaded after the GUI)
+PLATE_SIZES = ["1 x 1", "2 x 2", "3 x 2", "4 x 3", "8 x 6", "12 x 8"]   # Plate sizes of the GUI dropdown (also generated by run_benchmark)
 iteracion_avance = 0
+total_avance = 0   # Number of jobs of the run (see process_images)
+cuadros_avance = 0   # Frames written in the run (shown by the progress view)
+inicio_avance = 0   # Start time of the processing (see process_images)
+cancel_event = threading.Event()   # Set by the Cancel button of the progress view (see check_cancel)
 custom_plate_size = None   # New global variable to store the size entered in Edit
+lock_avance = threading.Lock()   # Protects iteracion_avance when several workers finish at the same time
+orientation_cache = None   # Orientation cache of the run (see get_orientation_cache)
+classifier_client = None   # Custom Vision client of the run (see get_classifier_client)
+local_classifier = None   # (model path, LocalOrientationClassifier) of the run (see get_local_classifier)
+orientation_policies = {}   # Orientation sharing of each plate of the run, by OutputFolder (see create_orientation_policy)
+input_readiness = None   # Wells already copied when the copy overlaps with processing (see start_ingest)
+run_manifests = {}   # Completion manifest of each plate of the run, by OutputFolder (see create_run_manifest)
+plate_metrics = {}   # Start and discovery time of each plate of the run, by OutputFolder (see plan_plate)
+scanned_frames = {}   # Frames of each point listed by scan_input, by point folder (see prepare_point)
+lock_client = threading.Lock()   # Protects the creation of classifier_client
+lock_cache = threading.Lock()   # Protects the creation of orientation_cache
+script_file = sys._getframe().f_code.co_filename   # Code file of this script, as named in the Java stack traces (see SamplingProfiler)
 
 # ==========================================================================
 # Graphical Interface
@@ -191,7 +246,7 @@ def _build_gui_dropdown():
 	lbl_placa = JLabel("Culture plate size:")
 	lbl_placa.setFont(Font("Arial", Font.PLAIN, 14))
 	lbl_placa.setForeground(Color(85, 85, 85))
-	sizes = ["1 x 1", "2 x 2", "3 x 2", "4 x 3", "8 x 6", "12 x 8", "Edit"]
+	sizes = PLATE_SIZES + ["Edit"]
 	combo_sizes = JComboBox(sizes)
 	combo_sizes.setFont(Font("Arial", Font.PLAIN, 12))
 	combo_sizes.setBackground(Color(255, 255, 255))
@@ -224,8 +279,8 @@ def _on_accept(frame, work_dir, copy_dir):
 	Handles the Accept button action.
 	
 	Validates that both directories are provided, creates the folder structure in
-	the working directory, updates the Config.txt file, copies the specified folder,
-	loads the configuration, and starts image processing.
+	the working directory, updates the Config.txt file, loads the configuration,
+	copies (or links) the specified folder, and starts image processing.
 	
 	Parameters:
 		frame (JDialog): The current GUI window.
@@ -240,20 +295,115 @@ def _on_accept(frame, work_dir, copy_dir):
 	workspace_path = setup_workspace(work_dir)
 	if workspace_path:
 		update_config(workspace_path)
-		copy_to_input(os.path.join(workspace_path, "InputFolder"), copy_dir)
 
 		# Close GUI and load configuration
 		frame.dispose()
-		global configuracion, iteracion_avance
+		global configuracion
 		configuracion = load_config_file()
-		iteracion_avance = 0  # Reset counter
 
-		# Execute main logic
-		start_program(configuracion)
-		create_destination_folders(configuracion)
-		process_images(configuracion)
-		debug(configuracion, 'END OF PROGRAM.', '')
+		# Execute main logic on a background thread, so the GUI stays responsive and the run can be cancelled
+		start_background_run(configuracion, workspace_path, copy_dir)
 		
+# =============================================
+# Progress View
+# =============================================
+class ProgressView(object):
+	"""
+	Non-modal window that shows the progress of a background run (points done, frames per second
+	and remaining time, see ProgressTracker) and lets the user cancel it. A Swing timer refreshes it on the event thread.
+	"""
+	def __init__(self):
+		self.frame = JDialog(None, "AutoStabilizer - v1.4.4 - Progress", ModalityType.MODELESS)
+		self.frame.setLayout(BorderLayout())
+		self.frame.setDefaultCloseOperation(JDialog.DO_NOTHING_ON_CLOSE)
+		panel = JPanel(GridLayout(4, 1, 5, 5))
+		panel.setBorder(BorderFactory.createEmptyBorder(15, 15, 15, 15))
+		panel.setBackground(Color(255, 255, 255))
+		self.lbl_points = JLabel("Points: 0 / 0")
+		self.lbl_rate = JLabel("Frames/s: -")
+		self.lbl_eta = JLabel("Remaining time: -")
+		self.lbl_status = JLabel("Processing...")
+		for label in [self.lbl_points, self.lbl_rate, self.lbl_eta, self.lbl_status]:
+			label.setFont(Font("Arial", Font.PLAIN, 14))
+			panel.add(label)
+		btn_panel = JPanel(FlowLayout(FlowLayout.RIGHT, 10, 10))
+		self.btn_cancel = JButton("Cancel", background=Color(220, 53, 69), foreground=Color.WHITE)
+		self.btn_cancel.setFont(Font("Arial", Font.BOLD, 12))
+		self.btn_cancel.addActionListener(lambda e: self.cancel())
+		btn_panel.add(self.btn_cancel)
+		self.frame.add(panel, BorderLayout.CENTER)
+		self.frame.add(btn_panel, BorderLayout.SOUTH)
+		self.timer = Timer(500, lambda e: self.refresh())
+
+	def show(self):
+		self.frame.setSize(400, 220)
+		self.frame.setLocationRelativeTo(None)  # Center window
+		self.frame.setVisible(True)
+		self.timer.start()
+
+	def refresh(self):
+		elapsed = time.time() - inicio_avance if inicio_avance else 0
+		fraction, rate, remaining = progress_tracker.status()
+		self.lbl_points.setText("Points: %d / %d (%.0f%%)" % (iteracion_avance, total_avance, fraction * 100))
+		if elapsed > 0:
+			self.lbl_rate.setText("Frames/s: %.1f" % (cuadros_avance / elapsed) + ("  (%.1f MB/s)" % (rate / 1048576.0) if rate else ""))
+		if remaining is not None:
+			self.lbl_eta.setText("Remaining time: %s" % format_duration(remaining))
+
+	def cancel(self):
+		# The workers stop after the frame they are reading (see check_cancel)
+		cancel_event.set()
+		self.btn_cancel.setEnabled(False)
+		self.lbl_status.setText("Cancelling after the current frame...")
+		IJ.log("Cancel requested.")
+
+	def finish(self, message):
+		self.timer.stop()
+		self.refresh()
+		self.lbl_status.setText(message)
+		self.btn_cancel.setText("Close")
+		for listener in self.btn_cancel.getActionListeners():
+			self.btn_cancel.removeActionListener(listener)
+		self.btn_cancel.addActionListener(lambda e: self.frame.dispose())
+		self.btn_cancel.setEnabled(True)
+
+def format_duration(seconds):
+	"""
+	Formats a number of seconds as H:MM:SS.
+	"""
+	seconds = int(seconds)
+	return "%d:%02d:%02d" % (seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+def start_background_run(configuracion, workspace_path, copy_dir):
+	"""
+	Runs run_program on a background thread and shows its progress, so the event dispatch
+	thread stays free and the run can be cancelled. Must be called on the event dispatch thread.
+
+	Parameters:
+		configuracion (dict): Configuration dictionary.
+		workspace_path (str): Workspace created by setup_workspace.
+		copy_dir (str): Folder with the wells to process.
+
+	Returns:
+		Thread: The thread that processes the plate.
+	"""
+	cancel_event.clear()
+	view = ProgressView()
+	view.show()
+	def run():
+		message = "Finished."
+		try:
+			run_program(configuracion, workspace_path, copy_dir)
+			if cancel_event.isSet():
+				message = "Cancelled. Completed videos were kept."
+		except Exception as e:
+			message = "Error: %s" % str(e)
+			IJ.log("Error during processing: {}".format(str(e)))
+		SwingUtilities.invokeLater(lambda: view.finish(message))
+	worker = threading.Thread(target=run, name="AutoStabilizer processing")
+	worker.start()
+	return worker
+
 # ==============================================
 # Adapter and window handling functions
 # =============================================
@@ -306,17 +456,312 @@ def update_config(workspace_path):
 	except Exception as e:
 		IJ.log("Error updating Config.txt: {}".format(str(e)))
 
-def copy_to_input(dest_dir, source_dir):
+class CopyTask(Callable):
+	"""
+	Copies one file for copy_to_input. The data is written to '<file>.part' and renamed when
+	complete, so an interrupted copy never leaves a file that looks finished, and the
+	modification time of the source is kept so the next sync can skip the file. on_done, if given,
+	is called when the task ends, whether the copy succeeded or not.
+	"""
+	def __init__(self, source, target, on_done=None):
+		self.source = source
+		self.target = target
+		self.on_done = on_done
+
+	def call(self):
+		try:
+			partial = Paths.get(self.target + '.part')
+			Files.copy(Paths.get(self.source), partial, StandardCopyOption.REPLACE_EXISTING, StandardCopyOption.COPY_ATTRIBUTES)
+			Files.move(partial, Paths.get(self.target), StandardCopyOption.REPLACE_EXISTING)
+			return os.path.getsize(self.target)
+		finally:
+			if self.on_done is not None:
+				self.on_done()
+
+def file_md5(path, prefix=''):
+	"""
+	Returns the MD5 hexadecimal digest of a file, optionally preceded by a text prefix.
+	"""
+	digest = hashlib.md5()
+	digest.update(prefix)
+	with open(path, 'rb') as data_file:
+		block = data_file.read(1 << 20)
+		while block:
+			digest.update(block)
+			block = data_file.read(1 << 20)
+	return digest.hexdigest()
+
+def file_unchanged(source, target, compare):
+	"""
+	Returns True if target is already an up-to-date copy of source: same size and modification
+	time (compare 'SizeMtime'), or same size and MD5 hash (compare 'Hash').
+	"""
+	if not os.path.isfile(target) or os.path.getsize(source) != os.path.getsize(target):
+		return False
+	if compare == 'Hash':
+		return file_md5(source) == file_md5(target)
+	# Two seconds of tolerance for file systems with coarse timestamps (FAT, network shares)
+	return abs(os.path.getmtime(source) - os.path.getmtime(target)) <= 2
+
+def copy_to_input(dest_dir, source_dir, configuracion=None, readiness=None):
+	"""
+	Synchronizes every folder of source_dir into dest_dir.
+
+	Only new or changed files are copied (see file_unchanged; SyncCompare 'SizeMtime' by default
+	or 'Hash'), on CopyStreams parallel copy threads (default 4). Folders that already exist are
+	completed instead of aborting the copy, so an interrupted copy is resumed by running it again.
+	The number of files, the volume and the throughput are reported in the ImageJ log.
+	The wells are walked and copied in the order of ReadFolders, so the first wells to process land
+	first, and each well starts copying as soon as it is walked.
+	A cancel from the progress view stops the walk, drops the queued copies and interrupts the
+	running ones; the next run completes the copy.
+
+	Parameters:
+		dest_dir (str): InputFolder of the workspace.
+		source_dir (str): Folder selected in the GUI.
+		configuracion (dict): Configuration dictionary (optional keys CopyStreams and SyncCompare).
+		readiness (InputReadiness): Optional, receives each folder once all its files are copied.
+	"""
+	configuracion = configuracion or {}
+	compare = configuracion.get('SyncCompare') or 'SizeMtime'
+	streams = max(1, get_config_int(configuracion, 'CopyStreams', 4))
+	start = time.time()
 	try:
-		for item in os.listdir(source_dir):
-			src_path = os.path.join(source_dir, item)
-			if os.path.isdir(src_path):
+		copied = {}
+		skipped = {}
+		pending = {}
+		lock = threading.Lock()
+		def release(item):
+			# Called once per copied file and once when the walk of the well ends
+			with lock:
+				pending[item] = pending[item] - 1
+				complete = not pending[item]
+			if complete and readiness is not None:
+				readiness.mark_ready(item)
+		futures = []
+		total_bytes = 0
+		errors = 0
+		order = [folder.strip() for folder in (configuracion.get('ReadFolders') or '').split(',')]
+		items = sorted(os.listdir(source_dir), key=lambda item: (order.index(item) if item in order else len(order), item))
+		pool = Executors.newFixedThreadPool(streams)
+		try:
+			for item in items:
+				if cancel_event.isSet():
+					break
+				src_path = os.path.join(source_dir, item)
+				if not os.path.isdir(src_path):
+					continue
+				copied[item] = 0
+				skipped[item] = 0
+				pending[item] = 1
 				dest_path = os.path.join(dest_dir, item)
-				copytree(src_path, dest_path)
-				IJ.log("Folder copied: {}".format(item))
+				# The files of each well are queued as soon as it is walked, so its copy starts (and with
+				# CopyOverlap its processing) while the next wells are still being compared
+				for root, dirs, files in os.walk(src_path):
+					if cancel_event.isSet():
+						break
+					target_root = os.path.normpath(os.path.join(dest_path, os.path.relpath(root, src_path)))
+					if not os.path.exists(target_root):
+						os.makedirs(target_root)
+					for name in files:
+						source = os.path.join(root, name)
+						target = os.path.join(target_root, name)
+						if file_unchanged(source, target, compare):
+							skipped[item] = skipped[item] + 1
+						else:
+							with lock:
+								pending[item] = pending[item] + 1
+							task = CopyTask(source, target, lambda item=item: release(item))
+							futures.append((item, task, pool.submit(task)))
+				release(item)
+			for item, task, future in futures:
+				# Polled so that a cancel does not wait for the copy of the remaining files
+				while not future.isDone() and not cancel_event.isSet():
+					cancel_event.wait(0.5)
+				if cancel_event.isSet():
+					break
+				try:
+					total_bytes = total_bytes + future.get()
+					copied[item] = copied[item] + 1
+				except Exception as e:
+					errors = errors + 1
+					IJ.log("Error copying {}: {}".format(task.source, str(e)))
+			if cancel_event.isSet():
+				# Queued copies are dropped and running ones interrupted; a partial copy stays in its .part file
+				dropped = len([future for item, task, future in futures if future.cancel(True)])
+				IJ.log("Copy cancelled: {} files not copied".format(dropped))
+		finally:
+			pool.shutdown()
+		for item in sorted(copied):
+			IJ.log("Folder copied: {} ({} new or changed files, {} unchanged)".format(item, copied[item], skipped[item]))
+		seconds = max(time.time() - start, 0.001)
+		IJ.log("Copy finished: {} files, {:.1f} MB in {:.1f} s ({:.1f} MB/s, {} streams), {} unchanged, {} errors".format(
+			sum(copied.values()), total_bytes / 1048576.0, seconds, total_bytes / 1048576.0 / seconds, streams,
+			sum(skipped.values()), errors))
 	except Exception as e:
 		IJ.log("Error copying files: {}".format(str(e)))
 
+def ingest_input(configuracion, dest_dir, source_dir, readiness=None):
+	"""
+	Makes the source acquisition available as the input of the run, according to Ingest:
+	  - 'Copy' (default): copies the new or changed files of every folder into InputFolder (see copy_to_input).
+	  - 'InPlace': processes the source folder directly; InputFolder is set to it for this run.
+	  - 'Symlink': creates one symbolic link per folder in InputFolder.
+	  - 'Hardlink': recreates the folders in InputFolder and hard-links every file (same drive only;
+	    files that cannot be linked are copied).
+
+	Parameters:
+		configuracion (dict): Configuration dictionary.
+		dest_dir (str): InputFolder of the workspace.
+		source_dir (str): Folder selected in the GUI.
+		readiness (InputReadiness): Optional, receives each well folder once it is complete.
+	"""
+	mode = configuracion.get('Ingest') or 'Copy'
+	if mode == 'InPlace':
+		configuracion['InputFolder'] = source_dir
+		IJ.log("Processing the source folder in place: {}".format(source_dir))
+	elif mode in ('Symlink', 'Hardlink'):
+		link_to_input(dest_dir, source_dir, mode == 'Hardlink', readiness)
+	else:
+		if mode != 'Copy':
+			IJ.log("Invalid Ingest value, copying the files: {}".format(mode))
+		copy_to_input(dest_dir, source_dir, configuracion, readiness)
+
+def hardlink_folder(src_path, dest_path):
+	"""
+	Recreates the folders of src_path in dest_path and hard-links every file. Hard links only work
+	within a drive, so the files that cannot be linked are copied.
+
+	Returns:
+		int: Number of files copied instead of linked.
+	"""
+	copied = 0
+	for root, dirs, files in os.walk(src_path):
+		target_root = os.path.join(dest_path, os.path.relpath(root, src_path))
+		if not os.path.exists(target_root):
+			os.makedirs(target_root)
+		for name in files:
+			source = Paths.get(os.path.join(root, name))
+			target = Paths.get(os.path.join(target_root, name))
+			try:
+				Files.createLink(target, source)
+			except Exception:
+				Files.copy(source, target, StandardCopyOption.COPY_ATTRIBUTES)
+				copied = copied + 1
+	return copied
+
+def link_to_input(dest_dir, source_dir, hardlink, readiness=None):
+	"""
+	Links the folders of source_dir into dest_dir instead of copying their contents.
+
+	Each well is linked on its own: a well that fails is logged and the others are still linked.
+	When a symbolic link cannot be created (on Windows it needs Developer Mode or the
+	SeCreateSymbolicLink privilege), the files of that well are hard-linked or copied instead.
+
+	Parameters:
+		dest_dir (str): InputFolder of the workspace.
+		source_dir (str): Folder selected in the GUI.
+		hardlink (bool): True to hard-link every file, False to create one symbolic link per folder.
+		readiness (InputReadiness): Optional, receives each folder once it is linked, or once linking it failed.
+	"""
+	try:
+		items = os.listdir(source_dir)
+	except OSError as e:
+		IJ.log("Error linking files: {}".format(str(e)))
+		return
+	for item in items:
+		if cancel_event.isSet():
+			IJ.log("Linking cancelled before: {}".format(item))
+			break
+		src_path = os.path.join(source_dir, item)
+		if not os.path.isdir(src_path):
+			continue
+		dest_path = os.path.join(dest_dir, item)
+		try:
+			if os.path.exists(dest_path):
+				IJ.log("Folder already in the input, not linked: {}".format(item))
+				continue
+			if not hardlink:
+				try:
+					Files.createSymbolicLink(Paths.get(dest_path), Paths.get(os.path.abspath(src_path)))
+					IJ.log("Folder linked: {}".format(item))
+					continue
+				except Exception as e:
+					IJ.log("Could not create a symbolic link for {} ({}), linking its files instead".format(item, str(e)))
+			copied = hardlink_folder(src_path, dest_path)
+			if copied:
+				IJ.log("Folder linked: {} ({} files copied because they could not be linked)".format(item, copied))
+			else:
+				IJ.log("Folder linked: {}".format(item))
+		except Exception as e:
+			IJ.log("Error linking folder {}: {}".format(item, str(e)))
+		finally:
+			# Also after an error, so no worker waits for a well that will not be linked
+			if readiness is not None:
+				readiness.mark_ready(item)
+
+class InputReadiness(object):
+	"""
+	Tracks the well folders whose copy into InputFolder is complete, so that processing can
+	start on a well while the next ones are still being copied (see start_ingest).
+	"""
+	def __init__(self):
+		self.ready = set()
+		self.finished = False
+		self.condition = threading.Condition()
+
+	def mark_ready(self, item):
+		with self.condition:
+			self.ready.add(item)
+			self.condition.notifyAll()
+
+	def finish(self):
+		with self.condition:
+			self.finished = True
+			self.condition.notifyAll()
+
+	def is_ready(self, item):
+		with self.condition:
+			return item in self.ready or self.finished
+
+	def wait_for(self, item):
+		with self.condition:
+			while item not in self.ready and not self.finished:
+				self.condition.wait()
+
+def start_ingest(configuracion, dest_dir, source_dir):
+	"""
+	Runs ingest_input. With CopyOverlap=True and a 'Copy' or 'Hardlink' ingestion, it runs on a
+	background thread instead, and each well is handed to process_images as soon as its files
+	are in InputFolder, so the copy of the remaining wells overlaps with processing.
+
+	Parameters:
+		configuracion (dict): Configuration dictionary.
+		dest_dir (str): InputFolder of the workspace.
+		source_dir (str): Folder selected in the GUI.
+
+	Returns:
+		threading.Thread: The running ingestion thread to join after processing, or None if the
+		                  ingestion is already complete.
+	"""
+	global input_readiness
+	input_readiness = None
+	mode = configuracion.get('Ingest') or 'Copy'
+	if configuracion.get('CopyOverlap') != 'True' or mode not in ('Copy', 'Hardlink'):
+		ingest_input(configuracion, dest_dir, source_dir)
+		return None
+	readiness = InputReadiness()
+	input_readiness = readiness
+	def run():
+		try:
+			ingest_input(configuracion, dest_dir, source_dir, readiness)
+		finally:
+			# Releases the workers still waiting for a well that was not copied
+			readiness.finish()
+	thread = threading.Thread(target=run, name='AutoStabilizer ingest')
+	thread.start()
+	return thread
+
 def _update_config_checkbox(config_key, is_selected):
 	"""
 	Updates Config.txt when a checkbox is toggled.
@@ -377,7 +822,7 @@ def _update_plate_size(plate_size):
 			f.writelines(updated_lines)
 		IJ.log("Config.txt updated with plate size: {}".format(plate_size))
 	except Exception as e:
-		IJ.log("Error updating plate size: {}".format(str(e))
+		IJ.log("Error updating plate size: {}".format(str(e)))
 
 # New function to open the custom window
 
@@ -558,11 +1003,129 @@ def _save_edit_plate_size(plate_size, frame):
 		IJ.log("Config.txt updated with plate size: {}".format(plate_size))
 		frame.dispose()
 	except Exception as e:
-		IJ.log("Error updating plate size: {}".format(str(e))
+		IJ.log("Error updating plate size: {}".format(str(e)))
+
+class LogWriter(object):
+	"""
+	Writes the lines of log() from a single background thread, so the workers only queue them.
+
+	The log file of each LogFolder is kept open and flushed after every batch of lines (at most
+	FLUSH_SECONDS after a line is queued). The file is switched to the one of the new day when the
+	date changes, and the thread stops, closing the files, after IDLE_SECONDS without lines; the
+	next line starts it again.
+	"""
+	FLUSH_SECONDS = 1
+	IDLE_SECONDS = 30
+
+	def __init__(self):
+		self.queue = LinkedBlockingQueue()
+		self.lock = threading.Lock()
+		self.thread = None
+		self.files = {}   # LogFolder -> (log file path, open file)
+
+	def write(self, log_folder, message):
+		"""
+		Queues a line of the log file of log_folder. Safe to call from any thread.
+		"""
+		self.queue.put((log_folder, datetime.now(), message))
+		if self.thread is None:
+			self.start()
+
+	def flush(self, timeout=10):
+		"""
+		Waits until the lines queued so far are written to disk (at most timeout seconds).
+		"""
+		written = threading.Event()
+		self.queue.put(written)
+		if self.thread is None:
+			self.start()
+		written.wait(timeout)
+
+	def start(self):
+		with self.lock:
+			if self.thread is None:
+				self.thread = threading.Thread(target=self.run, name='AutoStabilizer log')
+				self.thread.setDaemon(True)
+				self.thread.start()
+
+	def run(self):
+		try:
+			self.process_queue()
+		finally:
+			with self.lock:
+				# After an unexpected error a new thread takes over the lines still queued
+				if self.thread is threading.current_thread():
+					self.thread = None
+			if self.thread is None and not self.queue.isEmpty():
+				self.start()
+
+	def process_queue(self):
+		idle = 0
+		while True:
+			item = self.queue.poll(self.FLUSH_SECONDS, TimeUnit.SECONDS)
+			if item is None:
+				idle += self.FLUSH_SECONDS
+				if idle < self.IDLE_SECONDS:
+					continue
+				with self.lock:
+					# Cleared before the check: a line queued after it starts a new thread
+					thread, self.thread = self.thread, None
+					if self.queue.isEmpty():
+						self.close_files()
+						return
+					self.thread = thread
+				continue
+			idle = 0
+			# Everything already queued is written as one batch with a single flush per file
+			markers = []
+			while item is not None:
+				if isinstance(item, tuple):
+					self.write_line(*item)
+				else:
+					markers.append(item)
+				item = self.queue.poll()
+			for path, log_file in self.files.values():
+				try:
+					log_file.flush()
+				except IOError:
+					pass
+			for marker in markers:
+				marker.set()
+
+	def write_line(self, log_folder, now, message):
+		try:
+			path = os.path.join(log_folder, "Log_%s.txt" % now.strftime("%Y_%m_%d"))
+			current = self.files.get(log_folder)
+			if current is None or current[0] != path:
+				if current is not None:
+					# Day rollover: the file of the previous day is closed
+					current[1].close()
+					del self.files[log_folder]
+				# Create LogFolder if it does not exist
+				if not os.path.exists(log_folder):
+					os.makedirs(log_folder)
+				current = (path, open(path, 'a'))
+				self.files[log_folder] = current
+			current[1].write("%s || %s\n" % (now.strftime('%Y-%m-%d %H:%M:%S'), message))
+		except Exception as e:
+			# Any error (a missing LogFolder, a line that cannot be encoded) loses only that line
+			print("%s || ERROR: Could not write to the log file: %s" % (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), e))
+
+	def close_files(self):
+		for path, log_file in self.files.values():
+			try:
+				log_file.close()
+			except IOError:
+				pass
+		self.files = {}
+
+log_writer = LogWriter()   # Log writer shared by all the threads (see log)
+atexit.register(log_writer.flush)
 
 def log(config, message):
 	"""
-	Logs a message to the log file defined in the configuration.
+	Logs a message to the log file defined in the configuration. The line is written by the
+	background log writer (see LogWriter), so the call does not wait for the disk.
 
 	Parameters:
 		config (dict): Configuration dictionary that must contain the key 'LogFolder'.
@@ -571,20 +1134,7 @@ def log(config, message):
 	Example:
 		log(config, "Process started successfully.")
 	"""
-	log_folder = config.get('LogFolder')
-	
-	# Generates a file name with the current date in the format Log_AAAA_MM_DD.txt.
-	log_file_name = "Log_%s.txt" % datetime.now().strftime("%Y_%m_%d")
-	log_file_path = os.path.join(log_folder, log_file_name)
-	
-	try:
-		# Create LogFolder if it does not exist
-		if not os.path.exists(log_folder):
-			os.makedirs(log_folder)
-		with open(log_file_path, 'a') as log_file:
-			log_file.write("%s || %s\n" % (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), message))
-	except IOError:
-		print("%s || ERROR: Could not write to the log file." % datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+	log_writer.write(config.get('LogFolder'), message)
 
 def validate_data(config):
 	"""
@@ -601,15 +1151,32 @@ def validate_data(config):
 	"""
 	# Define keys present in Config
 	variables= ['LogFolder','InputFolder','OutputFolder','ReadFolders','CreateFolders','BrightFoldersPoint','Debug','Avance','Visor','Dev','ENDPOINT','PREDICTION_KEY']
+	# The local orientation backend does not use the Custom Vision service
+	if config.get('OrientationBackend') == 'Local':
+		variables = variables[:-2]
 	for variable in variables:
 		if variable not in config or not config[variable]:
 			print("\n%s || ERROR: The variable '%s' does not exist or contains no data." % (datetime.now(),variable))
 			sys.exit(1)
+	# Without a model the local backend would leave every point unflipped
+	if config.get('OrientationBackend') == 'Local':
+		path = local_model_path(config)
+		try:
+			LocalOrientationClassifier.load(path)
+		except (IOError, OSError, KeyError, ValueError) as e:
+			print("\n%s || ERROR: OrientationBackend=Local needs a local model, '%s' cannot be read (%s). "
+				  "Create it with a CustomVision run and TrainLocalModel=True, or set LocalModel." % (datetime.now(), path, e))
+			sys.exit(1)
 
-def load_config_file():
+def load_config_file(ruta_config='Config.txt', overrides=None):
 	"""
 	Reads the 'Config.txt' file, parses its lines, and returns a dictionary of parameters.
 
+	Parameters:
+		ruta_config (str): Path of the configuration file (default 'Config.txt').
+		overrides (dict): Values that replace those of the file before the validation
+		                  (used by the headless command line, which does not rewrite Config.txt).
+
 	Returns:
 		dict: A dictionary containing the loaded configuration parameters.
 
@@ -619,7 +1186,6 @@ def load_config_file():
 	config = {}
 
 	# Open the configuration file
-	ruta_config = 'Config.txt'
 	try:
 		with open(ruta_config, 'r') as archivo:
 			for linea in archivo:   
@@ -630,11 +1196,16 @@ def load_config_file():
 					valor = valor.strip()
 					# Store in the dictionary
 					config[clave] = valor
+			if overrides:
+				config.update(overrides)
 			validate_data(config)
 			# if 'DEV' is enabled, overwrite values of 'ReadFolders' and 'BrightFoldersPoint'
 			if config.get('Dev') == 'True':
 				config.update({"BrightFoldersPoint": "POINT 00001\\BRIGHT,POINT 00002\\BRIGHT"})
 				config.update({'ReadFolders':'A01'})
+			# The points are written with Windows separators ('POINT 00001\\BRIGHT'); they are converted to
+			# those of the system, so the same Config.txt also works on Linux (e.g., headless render nodes)
+			config['BrightFoldersPoint'] = config['BrightFoldersPoint'].replace('\\', os.sep).replace('/', os.sep)
 			return config
 	except IOError:
 		print('Error: could not find or open the file %s.' % (ruta_config))
@@ -704,194 +1275,3286 @@ def debug(configuracion,mensaje,variable):
 		print('%s || %s %s' % (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), mensaje, variable))
 	log(configuracion, mensaje + variable)
 
-def update_progress(folderNames,BrightNames):
+class ProgressTracker(object):
+	"""
+	Progress of a run weighted by the bytes of each point, measured by the scan before the
+	processing, so a missing folder or a resumed video does not count as a point with hundreds
+	of frames. The throughput is an exponential moving average (SMOOTHING) of samples of at
+	least SAMPLE_SECONDS, and the remaining time is the remaining bytes divided by it.
+	"""
+	SMOOTHING = 0.3
+	SAMPLE_SECONDS = 1.0
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.reset()
+
+	def reset(self):
+		with self.lock:
+			self.planned = {}   # (OutputFolder, well, point) -> expected bytes
+			self.expected = 0
+			self.done = 0
+			self.rate = None
+			self.sample_bytes = 0
+			self.sample_start = time.time()
+
+	def add_jobs(self, plate, jobs, sizes):
+		"""
+		Adds the (well, point) jobs of a plate with their size in bytes (None if not known yet).
+		"""
+		known = [size for size in sizes if size is not None]
+		# A point that could not be listed yet (e.g. still being copied) counts as an average one
+		average = sum(known) / len(known) if known else 1
+		with self.lock:
+			for (newFolderName, BrightName), size in zip(jobs, sizes):
+				weight = average if size is None else size
+				self.planned[(plate, newFolderName, BrightName)] = weight
+				self.expected += weight
+
+	def begin(self):
+		with self.lock:
+			self.sample_start = time.time()
+
+	def finish(self, plate, result):
+		"""
+		Replaces the expected size of a finished job by the bytes it actually processed.
+		"""
+		processed = result['bytes_read'] if result['status'] == 'done' else 0
+		now = time.time()
+		with self.lock:
+			self.expected += processed - self.planned.pop((plate, result['well'], result['point']), 0)
+			self.done += processed
+			if not processed:
+				if self.rate is None and not self.sample_bytes:
+					# Points skipped before the first processed one do not lower the throughput
+					self.sample_start = now
+				return
+			self.sample_bytes += processed
+			elapsed = now - self.sample_start
+			if elapsed >= self.SAMPLE_SECONDS:
+				sample = self.sample_bytes / elapsed
+				self.rate = sample if self.rate is None else self.SMOOTHING * sample + (1 - self.SMOOTHING) * self.rate
+				self.sample_bytes = 0
+				self.sample_start = now
+
+	def status(self):
+		"""
+		Returns (fraction done, throughput in bytes/s or None, remaining seconds or None).
+		"""
+		with self.lock:
+			if self.expected:
+				fraction = min(1.0, float(self.done) / self.expected)
+			else:
+				fraction = 0.0 if self.planned else 1.0
+			remaining = None
+			if self.rate:
+				remaining = max(0, self.expected - self.done) / self.rate
+			return fraction, self.rate, remaining
+
+progress_tracker = ProgressTracker()   # Weighted progress of the run (see update_progress)
+
+def update_progress(folderNames, BrightNames, result=None, plate=None):
 	"""
-	Increments a global counter to indicate processing progress and logs the percentage completed.
+	Increments a global counter to indicate processing progress and, with Avance=True, logs and prints
+	the percentage completed (weighted by bytes, see ProgressTracker), the throughput and the remaining time.
 
 	Parameters:
 		folderNames (list): List of folders to process.
 		BrightNames (list): List of subfolders (e.g., 'BRIGHT').
+		result (dict): Result record of the finished job (see process_point).
+		plate (str): OutputFolder of the plate of the job.
 
 	Example:
-		update_progress(folderNames, BrightNames)
+		update_progress(folderNames, BrightNames, result, configuration.get('OutputFolder'))
 	"""
 	global iteracion_avance
-	if configuracion.get('Avance') == 'True':
+	# The counter is shared by all workers, so the increment and the read are done under the lock.
+	# It is always updated because the progress view reads it
+	with lock_avance:
 		iteracion_avance = iteracion_avance + 1
-		percentage = float(iteracion_avance) / (len(folderNames)*len(BrightNames)) * 100
-		message = '%.2f%% completed.' % percentage
-		debug(configuracion, message, '')
+		points = iteracion_avance
+	if result is not None:
+		progress_tracker.finish(plate, result)
+	if configuracion.get('Avance') == 'True':
+		fraction, rate, remaining = progress_tracker.status()
+		message = '%.2f%% completed (%d of %d points, %s MB/s, remaining time %s).' % (
+			fraction * 100, points, total_avance or len(folderNames)*len(BrightNames),
+			'%.1f' % (rate / 1048576.0) if rate else '-', format_duration(remaining) if remaining is not None else '-')
+		# Also printed without Debug, so a headless run can be followed on the console
+		print('%s || %s' % (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), message))
+		log(configuracion, message)
 
-def check_image_orientation(configuracion,NewDire):
+class ProcessingCancelled(Exception):
 	"""
-	Checks the orientation of the first image in the folder and determines if a flip is needed.
+	Raised by check_cancel when the run was cancelled from the progress view.
+	"""
+	pass
+
+def check_cancel():
+	"""
+	Stops the current job when the Cancel button of the progress view was pressed. It is called
+	before every frame that is streamed or stabilized, and before each AVI is written, so a cancelled
+	run stops after the frame being processed. The ingestion reads cancel_event itself (see copy_to_input). Opening and converting a whole stack cannot be interrupted.
+
+	Example:
+		check_cancel()
+	"""
+	if cancel_event.isSet():
+		raise ProcessingCancelled('Processing cancelled')
+
+# =============================================
+# Orientation Cache
+# =============================================
+class OrientationCache(object):
+	"""
+	Persistent cache of Custom Vision predictions, keyed by a hash of the first frame of a point.
+	The entries are kept in least recently used order and the oldest ones are evicted when
+	the cache holds more than max_entries. New entries are appended to the file as soon as
+	they are known, and save() rewrites the file with the surviving entries.
+	"""
+	def __init__(self, path, max_entries):
+		self.path = path
+		self.max_entries = max_entries
+		self.entries = {}
+		self.order = []   # Keys from the least to the most recently used
+		self.lock = threading.Lock()
+		self.load()
+
+	def load(self):
+		if not os.path.exists(self.path):
+			return
+		with open(self.path, 'r') as cache_file:
+			for line in cache_file:
+				line = line.strip()
+				if not line or line.startswith('#'):
+					continue
+				try:
+					key, values = line.split(',', 1)
+					predictions = []
+					for value in values.split(';'):
+						if value:
+							tag_name, probability = value.rsplit(':', 1)
+							predictions.append((tag_name, float(probability)))
+					self.remember(key, predictions)
+				except ValueError:
+					continue
+
+	def remember(self, key, predictions):
+		if key in self.entries:
+			self.order.remove(key)
+		self.entries[key] = predictions
+		self.order.append(key)
+		while len(self.order) > self.max_entries:
+			del self.entries[self.order.pop(0)]
+
+	def format(self, key, predictions):
+		return '%s,%s\n' % (key, ';'.join(['%s:%.6f' % (tag_name, probability) for tag_name, probability in predictions]))
+
+	def get(self, key):
+		with self.lock:
+			predictions = self.entries.get(key)
+			if predictions is not None:
+				self.remember(key, predictions)
+			return predictions
+
+	def put(self, key, predictions):
+		with self.lock:
+			self.remember(key, predictions)
+			with open(self.path, 'a') as cache_file:
+				cache_file.write(self.format(key, predictions))
+
+	def save(self):
+		with self.lock:
+			with open(self.path, 'w') as cache_file:
+				cache_file.write('# AutoStabilizer orientation cache\n')
+				for key in self.order:
+					cache_file.write(self.format(key, self.entries[key]))
+
+def get_orientation_cache(configuracion):
+	"""
+	Returns the orientation cache of the run, or None if OrientationCache is not 'True'.
+
+	The cache file is 'orientation_cache.csv' in OrientationCacheFolder (default: LogFolder) and
+	holds at most OrientationCacheSize entries (default 5000).
 
 	Parameters:
-		configuracion (dict): Configuration dictionary with API data (ENDPOINT, PREDICTION_KEY).
-		NewDire (str): Path to the folder containing the image sequence.
+		configuracion (dict): Configuration dictionary.
 
 	Returns:
-		bool: True if a flip is required; False otherwise.
+		OrientationCache: The cache shared by all workers, or None.
 
 	Example:
-		need_flip = check_image_orientation(configuration, folderPath)
+		cache = get_orientation_cache(configuration)
 	"""
-	ruta_tiff=NewDire + '\\00000.TIFF'
-	ruta_jpg=NewDire + '\\_TIFF_JPG.jpg'
-	imagen = IJ.openImage(ruta_tiff)
-	IJ.saveAs(imagen, 'JPG', ruta_jpg)
-	imagen.close()
-	flip_required = custom_vision_connection(configuracion,ruta_jpg)
-	return flip_required
-		
-def custom_vision_connection(configuracion,ruta_jpg):
+	global orientation_cache
+	if configuracion.get('OrientationCache') != 'True':
+		return None
+	folder = configuracion.get('OrientationCacheFolder') or configuracion.get('LogFolder')
+	path = os.path.join(folder, 'orientation_cache.csv')
+	with lock_cache:
+		if orientation_cache is None or orientation_cache.path != path:
+			if not os.path.exists(folder):
+				os.makedirs(folder)
+			orientation_cache = OrientationCache(path, max(1, get_config_int(configuracion, 'OrientationCacheSize', 5000)))
+			debug(configuracion, 'Orientation cache: ', '%s (%d entries)' % (path, len(orientation_cache.order)))
+	return orientation_cache
+
+def first_frame_hash(configuracion, ruta_tiff):
 	"""
-	Sends the image to the Custom Vision API, analyzes the JSON response, and determines the correct orientation.
+	Returns the MD5 hash of a frame file. The ENDPOINT is included in the hash, so the cached
+	predictions are not reused after switching to another Custom Vision model or iteration.
 
 	Parameters:
-		configuracion (dict): Configuration with 'ENDPOINT', 'PREDICTION_KEY', etc.
-		ruta_jpg (str): Path to the JPG image to be sent.
+		configuracion (dict): Configuration dictionary.
+		ruta_tiff (str): Path to the first frame of the point.
 
 	Returns:
-		bool: True if the image is inverted (tagged as 'Derecha') and probability is above the threshold;
-			  False if correctly oriented ('Izquierda') with high probability;
-			  None in case of error.
+		str: Hexadecimal digest.
+	"""
+	return file_md5(ruta_tiff, configuracion.get('ENDPOINT') or '')
 
-	Example:
-		flip_required = custom_vision_connection(configuration, "C:/path/image.jpg")
+# =============================================
+# Custom Vision Client
+# =============================================
+class CustomVisionClient(object):
 	"""
-	# API Configuration
-	ENDPOINT = configuracion.get('ENDPOINT')
-	PREDICTION_KEY = configuracion.get('PREDICTION_KEY')
-	IMAGE_PATH = ruta_jpg
-	
-	# Check if the image exists
-	if not os.path.exists(IMAGE_PATH):
-		debug(configuracion, 'Input image does not exist: ', IMAGE_PATH)  # Fix: use comma to separate message and variable.
-		return None
+	Client for the Custom Vision prediction endpoint, shared by all the workers of a run.
 
-	# Read the image in binary
-	with open(IMAGE_PATH, "rb") as image_file:
-		image_data = image_file.read()
-	
-	# Create the HTTP connection
-	url = URL(ENDPOINT)
-	connection = url.openConnection()
-	connection.setRequestMethod("POST")
-	connection.setRequestProperty("Content-Type", "application/octet-stream")
-	connection.setRequestProperty("Prediction-Key", PREDICTION_KEY)
-	connection.setDoOutput(True)
-	
-	# Send the image data
-	output_stream = DataOutputStream(connection.getOutputStream())
-	output_stream.write(image_data)
-	output_stream.flush()
-	output_stream.close()
-	
-	# Read the API response
-	response_code = connection.getResponseCode()
-	if response_code == 200:
-		debug(configuracion, "Connection to custom vision model successful.", "")
-		reader = BufferedReader(InputStreamReader(connection.getInputStream()))
-		response = ""
-		line = reader.readLine()
-		while line is not None:
-			response += line
+	At most max_in_flight requests are sent at the same time. Every request has a connect and
+	a read timeout, and timeouts, connection errors, 429 and 5xx responses are retried up to
+	'retries' times with exponential backoff. The response bodies are always read to the end,
+	so the JDK returns the keep-alive connection to its cache and the next request reuses it.
+	"""
+	def __init__(self, endpoint, prediction_key, max_in_flight=4, connect_timeout=10, read_timeout=30, retries=2, backoff=1.0):
+		self.endpoint = endpoint
+		self.prediction_key = prediction_key
+		self.url = URL(endpoint)
+		self.connect_timeout = connect_timeout
+		self.read_timeout = read_timeout
+		self.retries = retries
+		self.backoff = backoff
+		self.in_flight = Semaphore(max_in_flight)
+
+	def read_stream(self, stream):
+		if stream is None:
+			return ''
+		reader = BufferedReader(InputStreamReader(stream, 'UTF-8'))
+		lines = []
+		try:
 			line = reader.readLine()
-		reader.close()
-
-		# Parse the JSON response
-		json_response = JSONObject(response)
-		predictions = json_response.getJSONArray("predictions")
-
-		# Confirm orientation
-		for i in range(predictions.length()):
-			prediction = predictions.getJSONObject(i)
-			tag_name = prediction.getString("tagName")
-			probability = prediction.getDouble("probability")
-			if tag_name == 'Derecha' and probability > 0.7:
-				debug(configuracion, 'Image requires orientation change as it is oriented from right to left. Probability:', "{0:.2f}%".format(probability * 100))
-				return True
-			elif tag_name == 'Izquierda' and probability > 0.7:
-				debug(configuracion, 'Correct orientation. Probability:', "{0:.2f}%".format(probability * 100))
-				return False
+			while line is not None:
+				lines.append(line)
+				line = reader.readLine()
+		finally:
+			reader.close()
+		return ''.join(lines)
+
+	def post(self, image_data):
+		connection = self.url.openConnection()
+		connection.setConnectTimeout(int(self.connect_timeout * 1000))
+		connection.setReadTimeout(int(self.read_timeout * 1000))
+		connection.setRequestMethod("POST")
+		connection.setRequestProperty("Content-Type", "application/octet-stream")
+		connection.setRequestProperty("Prediction-Key", self.prediction_key)
+		connection.setDoOutput(True)
+		connection.setFixedLengthStreamingMode(len(image_data))
+		output_stream = DataOutputStream(connection.getOutputStream())
+		try:
+			output_stream.write(image_data)
+			output_stream.flush()
+		finally:
+			output_stream.close()
+		response_code = connection.getResponseCode()
+		if response_code == 200:
+			body = self.read_stream(connection.getInputStream())
+		else:
+			body = self.read_stream(connection.getErrorStream())
+		return response_code, body, connection.getHeaderField("Retry-After")
+
+	def predict(self, configuracion, image_data):
+		"""
+		Sends an image and returns its predictions as (tagName, probability) pairs, or None if
+		the request still fails after the retries.
+		"""
+		attempt = 0
+		while True:
+			self.in_flight.acquire()
+			try:
+				try:
+					response_code, body, retry_after = self.post(image_data)
+				except IOException as e:
+					# Includes connect and read timeouts (SocketTimeoutException)
+					response_code, body, retry_after = None, str(e), None
+			finally:
+				self.in_flight.release()
+			if response_code == 200:
+				debug(configuracion, "Connection to custom vision model successful.", "")
+				predictions = JSONObject(body).getJSONArray("predictions")
+				result = []
+				for i in range(predictions.length()):
+					prediction = predictions.getJSONObject(i)
+					result.append((prediction.getString("tagName"), prediction.getDouble("probability")))
+				return result
+			if response_code is None:
+				debug(configuracion, 'Error connecting to custom vision: ', body)
 			else:
-				debug(configuracion, 'Orientation inconclusive. Probability:', "{0:.2f}%".format(probability * 100))
-		return None
-	else:
-		debug(configuracion, 'Error connecting to custom vision. Error code:', str(response_code))
-		reader = BufferedReader(InputStreamReader(connection.getErrorStream()))
-		error_response = []
-		line = reader.readLine()
-		while line is not None:
-			error_response.append(line)
-			line = reader.readLine()
-		reader.close()
-		debug(configuracion, 'Error type', str(error_response))
-		return None
+				debug(configuracion, 'Error connecting to custom vision. Error code:', str(response_code))
+				debug(configuracion, 'Error type', body)
+			# Other 4xx errors (bad key, bad image) are not solved by retrying
+			retryable = response_code is None or response_code == 429 or response_code >= 500
+			if not retryable or attempt >= self.retries:
+				return None
+			delay = self.backoff * (2 ** attempt)
+			if retry_after:
+				try:
+					delay = max(delay, float(retry_after))
+				except ValueError:
+					pass
+			debug(configuracion, 'Retrying custom vision request in seconds: ', '%.1f' % delay)
+			time.sleep(delay)
+			attempt = attempt + 1
 
-def flip_orientation(imp):
+def get_classifier_client(configuracion):
 	"""
-	Iterates through all frames in a stack and applies a horizontal flip.
+	Returns the Custom Vision client of the run, created from ENDPOINT, PREDICTION_KEY and the
+	optional keys MaxInFlight (default 4), ConnectTimeout (default 10 s), ReadTimeout (default 30 s),
+	Retries (default 2) and RetryBackoff (default 1 s).
 
 	Parameters:
-		imp (ImagePlus): Image object (stack) opened in ImageJ.
+		configuracion (dict): Configuration dictionary.
+
+	Returns:
+		CustomVisionClient: The client shared by all workers.
 
 	Example:
-		flip_orientation(imp)
+		predictions = get_classifier_client(configuration).predict(configuration, image_data)
 	"""
-	stack = imp.getStack()  # Access the video frames
-	for i in range(1, stack.getSize() + 1):
-		frame = stack.getProcessor(i)
-		frame.flipHorizontal()  # Change orientation horizontally
-	debug(configuracion, "Orientation change applied to the video.", "")
+	global classifier_client
+	endpoint = configuracion.get('ENDPOINT')
+	prediction_key = configuracion.get('PREDICTION_KEY')
+	with lock_client:
+		if (classifier_client is None or classifier_client.endpoint != endpoint
+				or classifier_client.prediction_key != prediction_key):
+			classifier_client = CustomVisionClient(endpoint, prediction_key,
+				max(1, get_config_int(configuracion, 'MaxInFlight', 4)),
+				max(0.0, get_config_float(configuracion, 'ConnectTimeout', 10.0)),
+				max(0.0, get_config_float(configuracion, 'ReadTimeout', 30.0)),
+				max(0, get_config_int(configuracion, 'Retries', 2)),
+				max(0.0, get_config_float(configuracion, 'RetryBackoff', 1.0)))
+	return classifier_client
 
-def process_images(configuracion):
-	inputFolder = configuracion.get('InputFolder')
-	if inputFolder:
-		folderNames = configuracion.get('ReadFolders').split(',')
-		for newFolderName in folderNames:
-			BrightNames = configuracion.get('BrightFoldersPoint').split(',')
-			for BrightName in BrightNames:
-				# Normalize directory path to remove extra backslashes
-				raw_new_dire = os.path.join(inputFolder, newFolderName, BrightName)
-				NewDire = os.path.normpath(raw_new_dire)
-				debug(configuracion, 'Directory to open: ', NewDire)
-				if os.path.exists(NewDire):
-					flip_required = check_image_orientation(configuracion, NewDire)
-					imp = FolderOpener.open(NewDire)
-					if imp:
-						if configuracion.get('Visor') == 'True':
-							imp.show()
-						ij.Prefs.set("options.scaleConversions", True)
-						ic = ImageConverter(imp)
-						ic.setDoScaling(True)
-						ic.convertToGray8()
-						NombreVideo = BrightName[:11] + '.avi'
-						# Normalize output path and create directory if needed
-						output_path = os.path.normpath(os.path.join(configuracion.get('OutputFolder'), newFolderName, NombreVideo))
-						out_dir = os.path.dirname(output_path)
-						if not os.path.exists(out_dir):
-							os.makedirs(out_dir)
-						debug(configuracion, 'Directory where the avi file will be saved: ', output_path)
-						if flip_required:
-							flip_orientation(imp)
-						IJ.run(imp, "AVI... ", "compression=None frame=7 save=[" + output_path + "]")
-						debug(configuracion, 'File save completed: ', NombreVideo)
-					else:
-						error_message = 'ERROR: Could not open the image sequence from folder %s' % NewDire
-						debug(configuracion, error_message, '')
-				else:
-					no_dir_message = 'Directory does not exist for %s\\%s.' % (newFolderName, BrightName)
-					debug(configuracion, no_dir_message, '')
-				update_progress(folderNames, BrightNames)
+# =============================================
+# Custom Vision Stand-in
+# =============================================
+class CustomVisionStandIn(HttpHandler):
+	"""
+	Local stand-in for the Custom Vision prediction endpoint, used by the self-test and the benchmark.
+	It reads the uploaded image, waits 'latency' seconds and answers with a 'predictions' array like
+	the real service. The orientation depends on the size of the upload, so both orientations are
+	exercised. 'responses' scripts the first answers as (status, delay) pairs, e.g. [(503, 0)], to
+	reproduce errors and timeouts. The requests received and the most served at once are counted.
+	"""
+	def __init__(self, latency=0.0, responses=None):
+		self.latency = latency
+		self.responses = list(responses or [])
+		self.requests = 0
+		self.in_flight = 0
+		self.max_in_flight = 0
+		self.lock = threading.Lock()
+
+	def handle(self, exchange):
+		with self.lock:
+			self.requests = self.requests + 1
+			self.in_flight = self.in_flight + 1
+			self.max_in_flight = max(self.max_in_flight, self.in_flight)
+			status, delay = self.responses.pop(0) if self.responses else (200, self.latency)
+		try:
+			stream = exchange.getRequestBody()
+			buffer = jarray.zeros(65536, 'b')
+			size = 0
+			count = stream.read(buffer)
+			while count != -1:
+				size = size + count
+				count = stream.read(buffer)
+			if delay:
+				time.sleep(delay)
+			if status == 200:
+				probability = 0.95 if size % 2 == 0 else 0.05
+				body = ('{"predictions": [{"tagName": "Derecha", "probability": %.2f}, '
+						'{"tagName": "Izquierda", "probability": %.2f}]}' % (probability, 1.0 - probability))
+			else:
+				body = '{"error": {"code": "StandIn", "message": "HTTP %d"}}' % status
+				if status == 429:
+					exchange.getResponseHeaders().set("Retry-After", "0")
+			body = String(body).getBytes("UTF-8")
+			exchange.getResponseHeaders().set("Content-Type", "application/json")
+			exchange.sendResponseHeaders(status, len(body))
+			output_stream = exchange.getResponseBody()
+			try:
+				output_stream.write(body)
+			finally:
+				output_stream.close()
+		except IOException:
+			# The client stopped waiting (read timeout) before the answer was sent
+			pass
+		finally:
+			with self.lock:
+				self.in_flight = self.in_flight - 1
+			exchange.close()
+
+def start_stand_in(handler):
+	"""
+	Starts a Custom Vision stand-in (see CustomVisionStandIn) on a free local port.
+
+	Returns:
+		tuple: (server, endpoint); stop it with server.stop(0).
+
+	Example:
+		server, endpoint = start_stand_in(CustomVisionStandIn(0.2))
+	"""
+	server = HttpServer.create(InetSocketAddress("127.0.0.1", 0), 0)
+	server.createContext("/", handler)
+	server.setExecutor(Executors.newCachedThreadPool())
+	server.start()
+	endpoint = "http://127.0.0.1:%d/customvision/v3.0/Prediction/standin/classify/iterations/standin/image" % server.getAddress().getPort()
+	return server, endpoint
+
+def run_selftest():
+	"""
+	Checks the Custom Vision client against local stand-ins, without network: a normal answer, 503
+	and 429 answers that are retried, a 401 that is not, 5xx answers and read timeouts that give up
+	after the retries, and MaxInFlight bounding the concurrent requests. Each check is logged as OK
+	or FAILED, with the requests the stand-in received.
+
+	Returns:
+		bool: True if every check passed.
+
+	Example:
+		ImageJ-linux64 --headless --jython AutoStabilizer_v1.4.4_EN.ijm.py --selftest
+	"""
+	configuracion = {'Debug': 'True', 'LogFolder': str(Files.createTempDirectory('autostabilizer_selftest'))}
+	image_data = jarray.zeros(1000, 'b')
+
+	def check(name, responses, expected_requests, succeeds, read_timeout=5.0, max_in_flight=4, concurrent=1):
+		handler = CustomVisionStandIn(0.0, responses)
+		server, endpoint = start_stand_in(handler)
+		predictions = []
+		try:
+			# Two retries with a short backoff, as the defaults but faster
+			client = CustomVisionClient(endpoint, 'selftest', max_in_flight, 2.0, read_timeout, 2, 0.05)
+			threads = [threading.Thread(target=lambda: predictions.append(client.predict(configuracion, image_data)))
+					   for i in range(concurrent)]
+			for thread in threads:
+				thread.start()
+			for thread in threads:
+				thread.join()
+		finally:
+			server.stop(0)
+			server.getExecutor().shutdown()
+		answered = len([prediction for prediction in predictions if prediction])
+		passed = (handler.requests == expected_requests and handler.max_in_flight <= max_in_flight
+				  and answered == (concurrent if succeeds else 0))
+		IJ.log("Self-test {}: {} ({} requests, at most {} at once, {} of {} answered)".format(
+			name, 'OK' if passed else 'FAILED', handler.requests, handler.max_in_flight, answered, concurrent))
+		return passed
+
+	results = [check('answer', [], 1, True),
+			   check('503 is retried', [(503, 0)], 2, True),
+			   check('429 is retried', [(429, 0), (429, 0)], 3, True),
+			   check('401 is not retried', [(401, 0)], 1, False),
+			   check('5xx gives up after the retries', [(500, 0)] * 3, 3, False),
+			   check('read timeout is retried', [(200, 1.5)], 2, True, read_timeout=0.5),
+			   check('read timeout gives up after the retries', [(200, 1.5)] * 3, 3, False, read_timeout=0.5),
+			   check('MaxInFlight bounds the requests', [(200, 0.3)] * 6, 6, True, max_in_flight=2, concurrent=6)]
+	IJ.log("Self-test: {} of {} checks passed (log in {})".format(len([result for result in results if result]),
+		len(results), configuracion['LogFolder']))
+	log_writer.flush()
+	return all(results)
 
 # =============================================
-# Main Execution
+# Local Orientation Classifier
 # =============================================
-# Only this runs at the start
-if __name__ == "__main__":
-	setup_gui()
+class LocalOrientationClassifier(object):
+	"""
+	Offline orientation classifier: a logistic regression over the horizontal intensity profile of
+	the first frame. The frame is averaged down to 'bins' columns and normalized, and the features are
+	the differences between each column and its mirror column, so flipping an image negates every
+	feature (and the weighted sum, but not the bias). The weights are learned from the decisions of
+	a Custom Vision run (see train_local_model) and saved as a small text model.
+	"""
+	def __init__(self, weights, bias=0.0, bins=32):
+		self.weights = weights
+		self.bias = bias
+		self.bins = bins
+
+	@staticmethod
+	def load(path):
+		values = {}
+		with open(path, 'r') as model_file:
+			for line in model_file:
+				line = line.strip()
+				if '=' in line and not line.startswith('#'):
+					key, value = line.split('=', 1)
+					values[key.strip()] = value.strip()
+		weights = [float(weight) for weight in values['weights'].split(',')]
+		return LocalOrientationClassifier(weights, float(values.get('bias', 0.0)), int(values.get('bins', 2 * len(weights))))
+
+	def save(self, path):
+		with open(path, 'w') as model_file:
+			model_file.write('# AutoStabilizer local orientation model\n')
+			model_file.write('bins=%d\n' % self.bins)
+			model_file.write('bias=%.8f\n' % self.bias)
+			model_file.write('weights=%s\n' % ','.join(['%.8f' % weight for weight in self.weights]))
+
+	def features(self, ip):
+		# Whole-image averaging in ImageJ instead of a per-pixel loop in Python
+		profile = ip.convertToFloat().resize(self.bins, 1, True)
+		values = [profile.getf(i, 0) for i in range(self.bins)]
+		mean = sum(values) / len(values)
+		std = math.sqrt(sum([(value - mean) ** 2 for value in values]) / len(values)) or 1.0
+		values = [(value - mean) / std for value in values]
+		return [values[i] - values[self.bins - 1 - i] for i in range(self.bins // 2)]
+
+	def score(self, features):
+		return self.bias + sum([weight * feature for weight, feature in zip(self.weights, features)])
+
+	def predict(self, configuracion, ruta_tiff):
+		"""
+		Returns the predictions for a frame file as (tagName, probability) pairs, or None if it cannot be read.
+		"""
+		imagen = IJ.openImage(ruta_tiff)
+		if imagen is None:
+			debug(configuracion, 'Input image does not exist: ', ruta_tiff)
+			return None
+		features = self.features(imagen.getProcessor())
+		imagen.close()
+		probability = 1.0 / (1.0 + math.exp(-max(-50.0, min(50.0, self.score(features)))))
+		predictions = [('Derecha', probability), ('Izquierda', 1.0 - probability)]
+		predictions.sort(key=lambda prediction: -prediction[1])
+		return predictions
+
+def local_model_path(configuracion):
+	"""
+	Returns the path of the local orientation model: LocalModel, or 'orientation_model.txt' in the Fiji
+	folder (next to Config.txt), so the model is shared by every working directory.
+	"""
+	return configuracion.get('LocalModel') or os.path.join(IJ.getDirectory('imagej') or os.getcwd(), 'orientation_model.txt')
+
+def get_local_classifier(configuracion):
+	"""
+	Returns the local orientation classifier of the run, loaded once from local_model_path.
+
+	Parameters:
+		configuracion (dict): Configuration dictionary.
+
+	Returns:
+		LocalOrientationClassifier: The loaded model, or None if it does not exist or cannot be read.
+
+	Example:
+		predictions = get_local_classifier(configuration).predict(configuration, ruta_tiff)
+	"""
+	global local_classifier
+	path = local_model_path(configuracion)
+	with lock_client:
+		if local_classifier is None or local_classifier[0] != path:
+			try:
+				local_classifier = (path, LocalOrientationClassifier.load(path))
+			except (IOError, KeyError, ValueError) as e:
+				debug(configuracion, 'ERROR: Could not load the local orientation model %s: ' % path, str(e))
+				return None
+	return local_classifier[1]
+
+def train_local_model(configuracion, results):
+	"""
+	Fits the local orientation classifier on the decisions of the current run and saves it in
+	local_model_path. Only points with a conclusive decision (flip True or False) are used.
+
+	Parameters:
+		configuracion (dict): Configuration dictionary.
+		results (list): Result records returned by process_images (in a batch run, those of
+		                all plates, each with the InputFolder of its plate in 'input').
+
+	Returns:
+		LocalOrientationClassifier: The trained model, or None if there are not enough samples.
+
+	Example:
+		train_local_model(configuration, results)
+	"""
+	model = LocalOrientationClassifier([0.0] * 16)
+	samples = []
+	for result in results:
+		if result['status'] != 'done' or result['flip'] not in (True, False):
+			continue
+		ruta_tiff = os.path.join(result.get('input') or configuracion.get('InputFolder'), result['well'], result['point'], '00000.TIFF')
+		imagen = IJ.openImage(ruta_tiff)
+		if imagen is None:
+			continue
+		samples.append((model.features(imagen.getProcessor()), 1.0 if result['flip'] else 0.0))
+		imagen.close()
+	labels = set([label for features, label in samples])
+	if len(labels) < 2:
+		debug(configuracion, 'Local orientation model not trained: both orientations are needed. Samples: ', str(len(samples)))
+		return None
+	# Batch gradient descent on the L2-regularized logistic loss
+	rate = 0.5
+	penalty = 0.01
+	for iteration in range(500):
+		gradient = [0.0] * len(model.weights)
+		gradient_bias = 0.0
+		for features, label in samples:
+			error = 1.0 / (1.0 + math.exp(-max(-50.0, min(50.0, model.score(features))))) - label
+			for i in range(len(gradient)):
+				gradient[i] += error * features[i]
+			gradient_bias += error
+		for i in range(len(gradient)):
+			model.weights[i] -= rate * (gradient[i] / len(samples) + penalty * model.weights[i])
+		model.bias -= rate * gradient_bias / len(samples)
+	correct = len([1 for features, label in samples if (model.score(features) > 0) == (label == 1.0)])
+	path = local_model_path(configuracion)
+	model.save(path)
+	debug(configuracion, 'Local orientation model saved in %s. Training accuracy: ' % path, '%d/%d' % (correct, len(samples)))
+	return model
+
+# =============================================
+# Orientation Backends
+# =============================================
+def encode_jpeg(configuracion, ip):
+	"""
+	Encodes a frame as JPEG in memory, with the JPEG quality set in ImageJ. If UploadSize is set, the
+	frame is first downscaled so that its longest side is at most UploadSize pixels.
+
+	Parameters:
+		configuracion (dict): Configuration dictionary.
+		ip (ImageProcessor): Frame to encode (it is converted to 8 bits with its display range).
+
+	Returns:
+		byte[]: The JPEG data.
+
+	Example:
+		image_data = encode_jpeg(configuration, imagen.getProcessor())
+	"""
+	ip = ip.convertToByte(True)
+	size = get_config_int(configuracion, 'UploadSize', 0)
+	width = ip.getWidth()
+	height = ip.getHeight()
+	if size > 0 and max(width, height) > size:
+		scale = float(size) / max(width, height)
+		ip = ip.resize(max(1, int(round(width * scale))), max(1, int(round(height * scale))), True)
+	buffer = ByteArrayOutputStream()
+	writer = ImageIO.getImageWritersByFormatName('jpeg').next()
+	param = writer.getDefaultWriteParam()
+	param.setCompressionMode(ImageWriteParam.MODE_EXPLICIT)
+	param.setCompressionQuality(FileSaver.getJpegQuality() / 100.0)
+	output = ImageIO.createImageOutputStream(buffer)
+	try:
+		writer.setOutput(output)
+		writer.write(None, IIOImage(ip.getBufferedImage(), None, None), param)
+	finally:
+		output.close()
+		writer.dispose()
+	return buffer.toByteArray()
+
+def custom_vision_orientation(configuracion, NewDire):
+	"""
+	Custom Vision backend: encodes the first frame as JPEG in memory and sends it to the prediction endpoint.
+	"""
+	ruta_tiff = os.path.join(NewDire, '00000.TIFF')
+	imagen = IJ.openImage(ruta_tiff)
+	if imagen is None:
+		debug(configuracion, 'Input image does not exist: ', ruta_tiff)
+		return None
+	image_data = encode_jpeg(configuracion, imagen.getProcessor())
+	imagen.close()
+	# Earlier versions left this file in the input folder, where it was opened as an extra frame
+	ruta_jpg = os.path.join(NewDire, '_TIFF_JPG.jpg')
+	if os.path.exists(ruta_jpg):
+		try:
+			os.remove(ruta_jpg)
+		except OSError:
+			pass
+	return custom_vision_connection(configuracion, image_data)
+
+def local_orientation(configuracion, NewDire):
+	"""
+	Local backend: classifies the first frame on the CPU, without network (see LocalOrientationClassifier).
+	"""
+	classifier = get_local_classifier(configuracion)
+	if classifier is None:
+		return None
+	return classifier.predict(configuracion, os.path.join(NewDire, '00000.TIFF'))
+
+# Orientation backends selectable with OrientationBackend in Config.txt. Each one receives the
+# point folder and returns (tagName, probability) pairs, or None in case of error.
+orientation_backends = {'CustomVision': custom_vision_orientation, 'Local': local_orientation}
+
+def get_orientation_backend(configuracion):
+	"""
+	Returns the name of the configured orientation backend (OrientationBackend, default 'CustomVision').
+	"""
+	backend = configuracion.get('OrientationBackend') or 'CustomVision'
+	if backend not in orientation_backends:
+		debug(configuracion, 'Invalid OrientationBackend value, using the default: ', 'CustomVision')
+		backend = 'CustomVision'
+	return backend
+
+# =============================================
+# Orientation Policy
+# =============================================
+class OrientationPolicy(object):
+	"""
+	Shares the orientation decision between the points of a well ('Well') or of the whole plate
+	('Plate'), since they are acquired with the same stage orientation.
+
+	The first point of each scope is classified while its siblings wait. A conclusive result
+	with a probability of at least 'confidence' is then reused for the rest of the scope; until
+	one is found, every point is classified. With verify_every > 0, every verify_every-th reuse
+	is classified anyway, and if it confidently disagrees the scope goes back to per-point
+	classification.
+	"""
+	def __init__(self, scope, confidence, verify_every=0):
+		self.scope = scope
+		self.confidence = confidence
+		self.verify_every = verify_every
+		self.decisions = {}   # Scope -> shared flip decision
+		self.reuses = {}      # Scope -> number of points that reused the decision
+		self.tried = set()    # Scopes whose first point was already classified
+		self.disabled = set() # Scopes where a verification disagreed
+		self.locks = {}
+		self.lock = threading.Lock()
+		self.calls = 0
+
+	def key(self, well):
+		if self.scope == 'Well':
+			return well
+		return 'plate'
+
+	def classify(self, configuracion, key, NewDire):
+		predictions = orientation_predictions(configuracion, NewDire)
+		flip_required = orientation_decision(configuracion, predictions)
+		confident = flip_required is not None and prediction_confidence(predictions) >= self.confidence
+		with self.lock:
+			self.calls = self.calls + 1
+			shared = self.decisions.get(key)
+			if confident and shared is None and key not in self.disabled:
+				self.decisions[key] = flip_required
+			elif confident and shared is not None and shared != flip_required:
+				debug(configuracion, 'Orientation disagrees with the shared decision, classifying each point of: ', key)
+				del self.decisions[key]
+				self.disabled.add(key)
+			elif not confident and shared is not None:
+				# An inconclusive verification does not override the shared decision
+				flip_required = shared
+		return flip_required
+
+	def orientation(self, configuracion, well, NewDire):
+		key = self.key(well)
+		with self.lock:
+			scope_lock = self.locks.setdefault(key, threading.Lock())
+		# The siblings wait for the first classification of the scope instead of sending their own
+		with scope_lock:
+			if key not in self.tried:
+				self.tried.add(key)
+				return self.classify(configuracion, key, NewDire)
+		with self.lock:
+			shared = self.decisions.get(key)
+			if shared is not None:
+				self.reuses[key] = self.reuses.get(key, 0) + 1
+				if not (self.verify_every and self.reuses[key] % self.verify_every == 0):
+					debug(configuracion, 'Orientation reused from %s for: ' % key, NewDire)
+					return shared
+		return self.classify(configuracion, key, NewDire)
+
+def create_orientation_policy(configuracion):
+	"""
+	Creates the orientation policy of a run from OrientationPolicy ('Point', 'Well' or 'Plate'),
+	OrientationConfidence (default 0.9) and OrientationVerifyEvery (default 0, no verification).
+
+	Parameters:
+		configuracion (dict): Configuration dictionary.
+
+	Returns:
+		OrientationPolicy: The policy, or None for the default 'Point' policy (every point is classified).
+
+	Example:
+		orientation_policies[configuration.get('OutputFolder')] = create_orientation_policy(configuration)
+	"""
+	scope = configuracion.get('OrientationPolicy') or 'Point'
+	if scope not in ('Point', 'Well', 'Plate'):
+		debug(configuracion, 'Invalid OrientationPolicy value, using the default: ', 'Point')
+		scope = 'Point'
+	debug(configuracion, 'Orientation policy: ', scope)
+	if scope == 'Point':
+		return None
+	return OrientationPolicy(scope, get_config_float(configuracion, 'OrientationConfidence', 0.9),
+							 max(0, get_config_int(configuracion, 'OrientationVerifyEvery', 0)))
+
+def prediction_confidence(predictions):
+	"""
+	Returns the highest probability of the orientation tags ('Derecha', 'Izquierda'), or 0 if there are none.
+	"""
+	probabilities = [probability for tag_name, probability in (predictions or []) if tag_name in ('Derecha', 'Izquierda')]
+	return max(probabilities or [0.0])
+
+def check_image_orientation(configuracion,NewDire):
+	"""
+	Checks the orientation of the first image in the folder and determines if a flip is needed.
+
+	Parameters:
+		configuracion (dict): Configuration dictionary with API data (ENDPOINT, PREDICTION_KEY).
+		NewDire (str): Path to the folder containing the image sequence.
+
+	Returns:
+		bool: True if a flip is required; False otherwise.
+
+	Example:
+		need_flip = check_image_orientation(configuration, folderPath)
+	"""
+	flip_required = orientation_decision(configuracion, orientation_predictions(configuracion, NewDire))
+	return flip_required
+
+def orientation_predictions(configuracion, NewDire):
+	"""
+	Returns the orientation predictions of the first image in the folder.
+	The predictions come from the backend selected with OrientationBackend: 'CustomVision' (default)
+	or 'Local'. With OrientationCache=True the Custom Vision predictions are looked up by the hash
+	of the first frame first, and the service is only called for frames that are not in the cache.
+
+	Parameters:
+		configuracion (dict): Configuration dictionary.
+		NewDire (str): Path to the folder containing the image sequence.
+
+	Returns:
+		list: (tagName, probability) pairs, or None in case of error.
+
+	Example:
+		predictions = orientation_predictions(configuration, folderPath)
+	"""
+	ruta_tiff=os.path.join(NewDire, '00000.TIFF')
+	backend = get_orientation_backend(configuracion)
+	# The local backend is faster than hashing the frame, so only Custom Vision goes through the cache
+	cache = get_orientation_cache(configuracion) if backend == 'CustomVision' else None
+	if cache is not None:
+		key = first_frame_hash(configuracion, ruta_tiff)
+		predictions = cache.get(key)
+		if predictions is not None:
+			debug(configuracion, 'Orientation taken from cache for: ', NewDire)
+			return predictions
+	predictions = orientation_backends[backend](configuracion, NewDire)
+	# Only answered requests are cached; connection errors are retried on the next run
+	if cache is not None and predictions is not None:
+		cache.put(key, predictions)
+	return predictions
+		
+def custom_vision_connection(configuracion,image_data):
+	"""
+	Sends the image to the Custom Vision API and reads the predictions of the JSON response.
+	The request goes through the shared client (see get_classifier_client), which bounds the
+	number of requests in flight, reuses connections and retries failed requests.
+
+	Parameters:
+		configuracion (dict): Configuration with 'ENDPOINT', 'PREDICTION_KEY', etc.
+		image_data (byte[]): JPEG data to be sent (see encode_jpeg).
+
+	Returns:
+		list: (tagName, probability) pairs in the order returned by the API;
+			  None in case of error.
+
+	Example:
+		predictions = custom_vision_connection(configuration, encode_jpeg(configuration, ip))
+	"""
+	if image_data is None or len(image_data) == 0:
+		debug(configuracion, 'Input image is empty.', '')
+		return None
+	return get_classifier_client(configuracion).predict(configuracion, image_data)
+
+def orientation_decision(configuracion, predictions):
+	"""
+	Determines the correct orientation from the Custom Vision predictions.
+
+	Parameters:
+		configuracion (dict): Configuration dictionary.
+		predictions (list): (tagName, probability) pairs returned by custom_vision_connection, or None.
+
+	Returns:
+		bool: True if the image is inverted (tagged as 'Derecha') and probability is above the threshold;
+			  False if correctly oriented ('Izquierda') with high probability;
+			  None in case of error or inconclusive result.
+
+	Example:
+		flip_required = orientation_decision(configuration, [('Derecha', 0.93), ('Izquierda', 0.07)])
+	"""
+	if predictions is None:
+		return None
+	# Confirm orientation
+	for tag_name, probability in predictions:
+		if tag_name == 'Derecha' and probability > 0.7:
+			debug(configuracion, 'Image requires orientation change as it is oriented from right to left. Probability:', "{0:.2f}%".format(probability * 100))
+			return True
+		elif tag_name == 'Izquierda' and probability > 0.7:
+			debug(configuracion, 'Correct orientation. Probability:', "{0:.2f}%".format(probability * 100))
+			return False
+		else:
+			debug(configuracion, 'Orientation inconclusive. Probability:', "{0:.2f}%".format(probability * 100))
+	return None
+
+def flip_orientation(imp):
+	"""
+	Iterates through all frames in a stack and applies a horizontal flip.
+
+	Parameters:
+		imp (ImagePlus): Image object (stack) opened in ImageJ.
+
+	Example:
+		flip_orientation(imp)
+	"""
+	stack = imp.getStack()  # Access the video frames
+	for i in range(1, stack.getSize() + 1):
+		frame = stack.getProcessor(i)
+		frame.flipHorizontal()  # Change orientation horizontally
+	debug(configuracion, "Orientation change applied to the video.", "")
+
+# =============================================
+# Image Stabilization
+# =============================================
+hann_windows = {}  # Hann windows already built, by patch size (they only depend on the size)
+
+def get_config_int(configuracion, key, default):
+	"""
+	Reads an optional integer key from the configuration.
+
+	Parameters:
+		configuracion (dict): Configuration dictionary.
+		key (str): Key in Config.txt (e.g., 'RegistrationSize').
+		default (int): Value used when the key is missing, empty or not a number.
+
+	Returns:
+		int: The configured value or the default.
+
+	Example:
+		size = get_config_int(configuration, 'RegistrationSize', 512)
+	"""
+	value = str(configuracion.get(key, '')).strip()
+	if not value:
+		return default
+	try:
+		return int(value)
+	except ValueError:
+		debug(configuracion, 'Invalid %s value, using the default: ' % key, str(default))
+		return default
+
+def get_config_float(configuracion, key, default):
+	"""
+	Reads an optional decimal key from the configuration (see get_config_int).
+	"""
+	value = str(configuracion.get(key, '')).strip()
+	if not value:
+		return default
+	try:
+		return float(value)
+	except ValueError:
+		debug(configuracion, 'Invalid %s value, using the default: ' % key, str(default))
+		return default
+
+def _hann_window(size):
+	"""
+	Returns a size x size Hann window that attenuates the borders of a patch before the FFT,
+	so that the image edges do not produce a false correlation peak at zero shift.
+	"""
+	window = hann_windows.get(size)
+	if window is None:
+		profile = [0.5 - 0.5 * math.cos(2.0 * math.pi * i / (size - 1)) for i in range(size)]
+		window = FloatProcessor(size, size, jarray.array([wy * wx for wy in profile for wx in profile], 'f'))
+		hann_windows[size] = window
+	return window
+
+def _mirror(ip):
+	"""
+	Returns a copy of a square Hartley spectrum where pixel (x, y) holds the value of
+	((N - x) % N, (N - y) % N), i.e. the coefficient of the opposite frequency.
+	"""
+	size = ip.getWidth()
+	flipped = ip.duplicate()
+	flipped.flipHorizontal()
+	flipped.flipVertical()
+	# After flipping, (x, y) holds (N - 1 - x, N - 1 - y); shifting by one pixel with wrap-around fixes the offset
+	mirrored = FloatProcessor(size, size)
+	mirrored.insert(flipped, 1, 1)
+	flipped.setRoi(size - 1, 0, 1, size)
+	mirrored.insert(flipped.crop(), 0, 1)
+	flipped.setRoi(0, size - 1, size, 1)
+	mirrored.insert(flipped.crop(), 1, 0)
+	mirrored.setf(0, 0, flipped.getf(size - 1, size - 1))
+	return mirrored
+
+def _whiten(fht):
+	"""
+	Divides every Hartley coefficient by the magnitude of its Fourier coefficient, so that only
+	the phase is kept (the Fourier magnitude is sqrt((H(k)^2 + H(-k)^2) / 2)).
+	All operations run on whole ImageJ processors, without per-pixel loops in Jython.
+	"""
+	magnitude = fht.duplicate()
+	magnitude.sqr()
+	mirrored = _mirror(fht)
+	mirrored.sqr()
+	magnitude.copyBits(mirrored, 0, 0, Blitter.ADD)
+	magnitude.multiply(0.5)
+	magnitude.sqrt()
+	magnitude.add(1e-6)
+	fht.copyBits(magnitude, 0, 0, Blitter.DIVIDE)
+
+def _parabolic_offset(left, center, right):
+	"""
+	Returns the sub-pixel position (between -0.5 and 0.5) of the vertex of the parabola
+	that passes through three neighboring correlation values.
+	"""
+	denominator = left - 2.0 * center + right
+	if denominator == 0:
+		return 0.0
+	return max(-0.5, min(0.5, 0.5 * (left - right) / denominator))
+
+def phase_correlation(reference, moving):
+	"""
+	Estimates the translation of one patch with respect to another by phase correlation.
+
+	Parameters:
+		reference (FHT): Whitened spectrum of the reference patch.
+		moving (FHT): Whitened spectrum of the patch to align, of the same size.
+
+	Returns:
+		tuple: (dx, dy) shift of 'moving' with respect to 'reference', with sub-pixel precision.
+
+	Example:
+		dx, dy = phase_correlation(previous_spectrum, current_spectrum)
+	"""
+	size = reference.getWidth()
+	correlation = moving.conjugateMultiply(reference)
+	correlation.inverseTransform()
+	correlation.swapQuadrants()
+	correlation.resetMinAndMax()
+	tolerance = (correlation.getMax() - correlation.getMin()) * 0.1
+	maxima = MaximumFinder().getMaxima(correlation, tolerance, False)
+	if maxima.npoints == 0:
+		return (0.0, 0.0)
+	# Keep the highest of the candidate peaks
+	best = max(range(maxima.npoints), key=lambda i: correlation.getf(maxima.xpoints[i], maxima.ypoints[i]))
+	x, y = maxima.xpoints[best], maxima.ypoints[best]
+	center = correlation.getf(x, y)
+	dx = dy = 0.0
+	if 0 < x < size - 1:
+		dx = _parabolic_offset(correlation.getf(x - 1, y), center, correlation.getf(x + 1, y))
+	if 0 < y < size - 1:
+		dy = _parabolic_offset(correlation.getf(x, y - 1), center, correlation.getf(x, y + 1))
+	return (x - size // 2 + dx, y - size // 2 + dy)
+
+class FrameRegistrar(object):
+	"""
+	Aligns the frames of a point to its first frame.
+
+	Each frame is compared with the previous one by phase correlation on a centered square
+	patch (power of two, at most RegistrationSize pixels) and the shifts are accumulated,
+	so slow drift and stage jitter are both removed. Frames must be passed in order.
+
+	With pyramid levels, the shift is first estimated on a frame downsampled by 2^levels
+	(where the patch covers a much larger part of the field) and then refined on each finer
+	level with a patch displaced by the current estimate, so large drifts are found while
+	every level only costs one patch-sized FFT.
+	"""
+	def __init__(self, width, height, size, levels=0):
+		# Do not go down to levels where the frame is too small to correlate
+		while levels > 0 and min(width >> levels, height >> levels) < 32:
+			levels = levels - 1
+		self.levels = levels
+		self.geometry = []
+		for level in range(levels + 1):
+			level_width = width >> level
+			level_height = height >> level
+			patch = 2
+			while patch * 2 <= min(level_width, level_height, size):
+				patch = patch * 2
+			self.geometry.append((patch, (level_width - patch) // 2, (level_height - patch) // 2, level_width, level_height))
+		self.size = self.geometry[0][0]
+		self.reset()
+
+	def reset(self):
+		"""
+		Forgets the registered frames, so the next frame passed becomes the reference.
+		"""
+		self.previous = None
+		self.dx = 0.0
+		self.dy = 0.0
+		self.shifts = []
+
+	def pyramid(self, ip):
+		"""
+		Returns the frame followed by its successive 2x downsampled (averaged) versions.
+		"""
+		pyramid = [ip]
+		for level in range(1, self.levels + 1):
+			finer = pyramid[-1]
+			finer.setInterpolationMethod(ImageProcessor.BILINEAR)
+			pyramid.append(finer.resize(finer.getWidth() // 2, finer.getHeight() // 2, True))
+		return pyramid
+
+	def offset_limits(self, level, ox, oy):
+		"""
+		Clamps a patch displacement so that the patch stays inside the frame of a level.
+		"""
+		patch, x0, y0, level_width, level_height = self.geometry[level]
+		ox = max(-x0, min(level_width - patch - x0, ox))
+		oy = max(-y0, min(level_height - patch - y0, oy))
+		return ox, oy
+
+	def spectrum(self, ip, level=0, ox=0, oy=0):
+		"""
+		Returns the whitened Hartley spectrum of the patch of a frame at a pyramid level,
+		centered or displaced by (ox, oy) pixels of that level.
+		"""
+		patch_size, x0, y0, level_width, level_height = self.geometry[level]
+		ip.setRoi(x0 + ox, y0 + oy, patch_size, patch_size)
+		patch = ip.crop().convertToFloat()
+		ip.resetRoi()
+		patch.subtract(ImageStatistics.getStatistics(patch, Measurements.MEAN, None).mean)
+		patch.copyBits(_hann_window(patch_size), 0, 0, Blitter.MULTIPLY)
+		fht = FHT(patch)
+		fht.transform()
+		_whiten(fht)
+		return fht
+
+	def estimate(self, ip):
+		"""
+		Returns the (dx, dy) shift of a frame with respect to the previous frame, from the
+		coarsest pyramid level to the full resolution.
+		"""
+		pyramid = self.pyramid(ip)
+		current = [self.spectrum(pyramid[level], level) for level in range(self.levels + 1)]
+		previous = self.previous
+		# The centered spectra of this frame are the reference of the next one
+		self.previous = current
+		if previous is None:
+			return (0.0, 0.0)
+		dx = dy = 0.0
+		for level in range(self.levels, -1, -1):
+			scale = float(1 << level)
+			ox, oy = self.offset_limits(level, int(round(dx / scale)), int(round(dy / scale)))
+			if ox == 0 and oy == 0:
+				moving = current[level]
+			else:
+				# Displacing the patch by the coarse estimate leaves only a small residual to measure
+				moving = self.spectrum(pyramid[level], level, ox, oy)
+			rx, ry = phase_correlation(previous[level], moving)
+			dx = (ox + rx) * scale
+			dy = (oy + ry) * scale
+		return (dx, dy)
+
+	def register(self, ip):
+		"""
+		Estimates the drift of the next frame, corrects it in place and returns the accumulated (dx, dy).
+		"""
+		dx, dy = self.estimate(ip)
+		self.dx = self.dx + dx
+		self.dy = self.dy + dy
+		self.shifts.append((self.dx, self.dy))
+		self.apply(ip, self.dx, self.dy)
+		return (self.dx, self.dy)
+
+	def apply(self, ip, dx, dy):
+		"""
+		Moves a frame by (-dx, -dy) with bilinear interpolation to undo an accumulated drift.
+		"""
+		translate_frame(ip, dx, dy)
+
+	def max_drift(self):
+		"""
+		Returns the largest accumulated drift (in pixels) among the registered frames.
+		"""
+		if not self.shifts:
+			return 0.0
+		return max([math.sqrt(dx * dx + dy * dy) for dx, dy in self.shifts])
+
+def stabilize_stack(configuracion, imp):
+	"""
+	Registers every frame of an in-memory 8-bit stack to its first frame.
+
+	Parameters:
+		configuracion (dict): Configuration dictionary ('RegistrationSize' and 'PyramidLevels' are
+		                      optional, default 512 and 0).
+		imp (ImagePlus): Stack already converted to 8 bits (and flipped if needed).
+
+	Returns:
+		FrameRegistrar: Registrar with the accumulated shift of every frame.
+
+	Example:
+		registrar = stabilize_stack(configuration, imp)
+	"""
+	stack = imp.getStack()
+	registrar = FrameRegistrar(imp.getWidth(), imp.getHeight(), get_config_int(configuracion, 'RegistrationSize', 512),
+							   get_config_int(configuracion, 'PyramidLevels', 0))
+	for i in range(1, stack.getSize() + 1):
+		check_cancel()
+		registrar.register(stack.getProcessor(i))
+	debug(configuracion, 'Stabilization applied. Maximum drift (px): ', '%.2f' % registrar.max_drift())
+	return registrar
+
+# =============================================
+# Transform Sidecar and Output Options
+# =============================================
+def sidecar_path(output_path):
+	"""
+	Returns the path of the transform sidecar of a video (e.g., 'POINT 00001.avi' -> 'POINT 00001.shifts.csv').
+	"""
+	return os.path.splitext(output_path)[0] + '.shifts.csv'
+
+def write_transform_sidecar(configuracion, path, flip_required, shifts):
+	"""
+	Saves the orientation decision and the accumulated shift of every frame next to the video.
+
+	Parameters:
+		configuracion (dict): Configuration dictionary.
+		path (str): Path of the sidecar file (see sidecar_path).
+		flip_required (bool): Orientation decision used for the video (True, False or None).
+		shifts (list): Accumulated (dx, dy) of each frame, empty if the video was not stabilized.
+
+	Example:
+		write_transform_sidecar(configuration, sidecar_path(output_path), True, registrar.shifts)
+	"""
+	try:
+		with open(path, 'w') as sidecar:
+			sidecar.write('# AutoStabilizer transform sidecar\n')
+			sidecar.write('# flip=%s\n' % flip_required)
+			sidecar.write('frame,dx,dy\n')
+			for i, (dx, dy) in enumerate(shifts):
+				sidecar.write('%d,%.3f,%.3f\n' % (i + 1, dx, dy))
+		debug(configuracion, 'Transform sidecar saved: ', path)
+	except IOError as e:
+		debug(configuracion, 'ERROR: Could not save the transform sidecar %s: ' % path, str(e))
+
+def read_transform_sidecar(configuracion, path):
+	"""
+	Reads a transform sidecar written by write_transform_sidecar.
+
+	Parameters:
+		configuracion (dict): Configuration dictionary.
+		path (str): Path of the sidecar file.
+
+	Returns:
+		dict: {'flip': True/False/None, 'shifts': list of (dx, dy)}, or None if the file
+		      does not exist or cannot be parsed.
+
+	Example:
+		transform = read_transform_sidecar(configuration, sidecar_path(output_path))
+	"""
+	if not os.path.exists(path):
+		debug(configuracion, 'No transform sidecar, the point will be analyzed: ', path)
+		return None
+	transform = {'flip': None, 'shifts': []}
+	try:
+		with open(path, 'r') as sidecar:
+			for line in sidecar:
+				line = line.strip()
+				if line.startswith('# flip='):
+					transform['flip'] = {'True': True, 'False': False}.get(line[len('# flip='):])
+				elif line and not line.startswith('#') and not line.startswith('frame'):
+					frame, dx, dy = line.split(',')
+					transform['shifts'].append((float(dx), float(dy)))
+	except (IOError, ValueError) as e:
+		debug(configuracion, 'ERROR: Invalid transform sidecar %s: ' % path, str(e))
+		return None
+	debug(configuracion, 'Transform reused from sidecar: ', path)
+	return transform
+
+def translate_frame(ip, dx, dy):
+	"""
+	Moves a frame by (-dx, -dy) with bilinear interpolation to undo an accumulated drift.
+	"""
+	if dx != 0 or dy != 0:
+		ip.setInterpolationMethod(ImageProcessor.BILINEAR)
+		ip.translate(-dx, -dy)
+
+def apply_shifts(configuracion, imp, shifts):
+	"""
+	Applies the shifts read from a sidecar to an in-memory stack, without registering it again.
+
+	Parameters:
+		configuracion (dict): Configuration dictionary.
+		imp (ImagePlus): 8-bit stack with one frame per shift.
+		shifts (list): Accumulated (dx, dy) of each frame.
+
+	Example:
+		apply_shifts(configuration, imp, transform['shifts'])
+	"""
+	stack = imp.getStack()
+	for i in range(1, stack.getSize() + 1):
+		check_cancel()
+		dx, dy = shifts[i - 1]
+		translate_frame(stack.getProcessor(i), dx, dy)
+	debug(configuracion, 'Stored shifts applied to the video.', '')
+
+def get_crop(configuracion):
+	"""
+	Reads the optional 'Crop' key (x,y,width,height in pixels) of the configuration.
+
+	Returns:
+		tuple: (x, y, width, height), or None if the key is missing, empty or invalid.
+
+	Example:
+		crop = get_crop(configuration)
+	"""
+	value = str(configuracion.get('Crop', '')).strip()
+	if not value:
+		return None
+	try:
+		x, y, width, height = [int(part) for part in value.split(',')]
+	except ValueError:
+		debug(configuracion, 'Invalid Crop value, the video will not be cropped: ', value)
+		return None
+	return (x, y, width, height)
+
+def clamp_crop(crop, width, height):
+	"""
+	Limits a crop rectangle to the size of the frames.
+	"""
+	x = max(0, min(crop[0], width - 1))
+	y = max(0, min(crop[1], height - 1))
+	return (x, y, max(1, min(crop[2], width - x)), max(1, min(crop[3], height - y)))
+
+def crop_stack(imp, crop):
+	"""
+	Crops every frame of an in-memory stack to the (x, y, width, height) rectangle.
+	"""
+	x, y, width, height = clamp_crop(crop, imp.getWidth(), imp.getHeight())
+	imp.setStack(imp.getStack().crop(x, y, 0, width, height, imp.getStackSize()))
+
+def avi_options(configuracion, output_path):
+	"""
+	Builds the options of the ImageJ 'AVI...' command from the optional 'Compression'
+	(None, JPEG or PNG; default None) and 'FrameRate' (default 7) keys.
+
+	Example:
+		IJ.run(imp, "AVI... ", avi_options(configuration, output_path))
+	"""
+	compression = str(configuracion.get('Compression', '')).strip() or 'None'
+	frame_rate = str(configuracion.get('FrameRate', '')).strip() or '7'
+	return "compression=" + compression + " frame=" + frame_rate + " save=[" + output_path + "]"
+
+def list_frame_files(NewDire):
+	"""
+	Lists the TIFF frames of a point folder in acquisition order.
+
+	Parameters:
+		NewDire (str): Path to the folder containing the image sequence.
+
+	Returns:
+		list: Sorted file names ending in .tif or .tiff (other files, such as the JPG used
+		      for the orientation check, are ignored).
+
+	Example:
+		frame_names = list_frame_files(folderPath)
+	"""
+	return sorted([name for name in os.listdir(NewDire)
+				   if name.lower().endswith('.tif') or name.lower().endswith('.tiff')])
+
+class StreamingStack(VirtualStack):
+	"""
+	Virtual stack that reads one TIFF at a time, converts it to 8 bits and flips it if needed.
+
+	Only the frame being requested is kept in memory, so the AVI writer can save a point
+	of any length with a peak memory of a few frames. The 16 -> 8 bit scaling uses the
+	display range of the first frame for every frame, so brightness is consistent along the video.
+	Frames can also be stabilized (registration_size), moved by stored shifts (shifts) and cropped (crop).
+	"""
+	def __init__(self, NewDire, frame_names, flip_required, registration_size=0, pyramid_levels=0, shifts=None, crop=None):
+		first = Opener().openImage(NewDire, frame_names[0]).getProcessor()
+		self.crop = None
+		if crop is not None:
+			self.crop = clamp_crop(crop, first.getWidth(), first.getHeight())
+			VirtualStack.__init__(self, self.crop[2], self.crop[3], None, NewDire)
+		else:
+			VirtualStack.__init__(self, first.getWidth(), first.getHeight(), None, NewDire)
+		self.directory = NewDire
+		self.frame_names = frame_names
+		self.flip_required = flip_required
+		self.shifts = shifts
+		self.cancelled = False
+		self.stabilize_seconds = 0.0   # Time spent registering and moving the frames (see encode_point)
+		# With a registration size the frames are also stabilized as they are streamed
+		self.registrar = None
+		if registration_size > 0 and shifts is None:
+			self.registrar = FrameRegistrar(first.getWidth(), first.getHeight(), registration_size, pyramid_levels)
+		first.resetMinAndMax()
+		self.display_min = first.getMin()
+		self.display_max = first.getMax()
+
+	def set_flip(self, flip_required):
+		"""
+		Changes the orientation of the frames read from now on. The frames already registered were
+		read with the other orientation, so the registration starts again from the first frame.
+		"""
+		if flip_required != self.flip_required:
+			self.flip_required = flip_required
+			if self.registrar is not None:
+				self.registrar.reset()
+
+	def getSize(self):
+		return len(self.frame_names)
+
+	def getBitDepth(self):
+		return 8
+
+	def getFileName(self, n):
+		return self.frame_names[n - 1]
+
+	def getSliceLabel(self, n):
+		return self.frame_names[n - 1]
+
+	def read_frame(self, n):
+		ip = Opener().openImage(self.directory, self.frame_names[n - 1]).getProcessor()
+		if ip.getBitDepth() != 8:
+			ip.setMinAndMax(self.display_min, self.display_max)
+			ip = ip.convertToByte(True)
+		if self.flip_required:
+			ip.flipHorizontal()
+		return ip
+
+	def getProcessor(self, n):
+		if cancel_event.isSet():
+			# Remembered in case the AVI writer does not pass the exception on (see encode_point)
+			self.cancelled = True
+		check_cancel()
+		ip = self.read_frame(n)
+		start = time.time()
+		if self.registrar is not None:
+			registered = len(self.registrar.shifts)
+			if n <= registered:
+				# Frame already registered (e.g. requested again by the viewer): reuse its shift
+				dx, dy = self.registrar.shifts[n - 1]
+				self.registrar.apply(ip, dx, dy)
+			else:
+				# The drift is accumulated frame by frame, so skipped frames are registered first
+				for m in range(registered + 1, n):
+					self.registrar.register(self.read_frame(m))
+				self.registrar.register(ip)
+		elif self.shifts is not None:
+			dx, dy = self.shifts[n - 1]
+			translate_frame(ip, dx, dy)
+		self.stabilize_seconds += time.time() - start
+		if self.crop is not None:
+			ip.setRoi(self.crop[0], self.crop[1], self.crop[2], self.crop[3])
+			ip = ip.crop()
+		return ip
+
+def open_streaming_stack(configuracion, NewDire, flip_required, stabilize=False, shifts=None, crop=None, frame_names=None):
+	"""
+	Opens a point folder as a StreamingStack instead of loading every frame with FolderOpener.
+
+	Parameters:
+		configuracion (dict): Configuration dictionary.
+		NewDire (str): Path to the folder containing the image sequence.
+		flip_required (bool): True if the frames must be flipped horizontally while streaming.
+		stabilize (bool): True to register every frame to the first one while streaming.
+		shifts (list): Stored (dx, dy) of each frame; when given, they are applied instead of registering.
+		crop (tuple): Optional (x, y, width, height) rectangle applied to every frame.
+		frame_names (list): Frame files already listed (see prepare_point); the folder is listed when None.
+
+	Returns:
+		ImagePlus: 8-bit image backed by a StreamingStack, or None if the folder has no TIFF frames.
+
+	Example:
+		imp = open_streaming_stack(configuration, folderPath, True)
+	"""
+	if frame_names is None:
+		frame_names = list_frame_files(NewDire)
+	if not frame_names:
+		return None
+	debug(configuracion, 'Streaming frames from: ', '%s (%d frames)' % (NewDire, len(frame_names)))
+	if shifts is not None and len(shifts) != len(frame_names):
+		debug(configuracion, 'The stored shifts do not match the number of frames, registering again: ', NewDire)
+		shifts = None
+	registration_size = get_config_int(configuracion, 'RegistrationSize', 512) if stabilize else 0
+	pyramid_levels = get_config_int(configuracion, 'PyramidLevels', 0)
+	return ImagePlus(os.path.basename(os.path.dirname(NewDire)),
+					 StreamingStack(NewDire, frame_names, flip_required, registration_size, pyramid_levels, shifts, crop))
+
+def get_workers(configuracion):
+	"""
+	Reads the number of workers from the 'Workers' key of the configuration.
+
+	Parameters:
+		configuracion (dict): Configuration dictionary. 'Workers' is optional; an empty value,
+		                      a missing key or an invalid number means 1 (sequential processing),
+		                      and 'Auto' or 0 uses one worker per available processor.
+
+	Returns:
+		int: Number of workers to use (at least 1).
+
+	Example:
+		workers = get_workers(configuration)
+	"""
+	value = str(configuracion.get('Workers', '1')).strip()
+	if value.lower() == 'auto':
+		return Runtime.getRuntime().availableProcessors()
+	try:
+		workers = int(value)
+	except ValueError:
+		debug(configuracion, 'Invalid Workers value, using 1 worker: ', value)
+		return 1
+	if workers == 0:
+		return Runtime.getRuntime().availableProcessors()
+	return max(1, workers)
+
+def new_result(newFolderName, BrightName):
+	"""
+	Returns an empty result record for a (well, point) job (see process_point).
+	"""
+	return {'well': newFolderName, 'point': BrightName, 'status': 'error', 'output': None,
+			'frames': 0, 'flip': None, 'seconds': 0.0, 'error': '',
+			'timings': {}, 'bytes_read': 0, 'bytes_written': 0}
+
+def prepare_point(configuracion, newFolderName, BrightName):
+	"""
+	Resolves the input folder and output video of a (well, point) job, creates the output
+	folder and, in re-render mode, reads the transform sidecar of a previous run.
+
+	Parameters:
+		configuracion (dict): Configuration dictionary.
+		newFolderName (str): Well folder (e.g., 'A01').
+		BrightName (str): Point subfolder (e.g., 'POINT 00001\\BRIGHT').
+
+	Returns:
+		dict: Point description ('well', 'dir', 'video', 'output', 'transform', 'streaming', 'stabilize',
+		      'shifts', 'crop', 'fingerprint', 'resumed', 'bytes', 'frame_names'), or None if the input folder
+		      does not exist. 'resumed' is the run manifest entry when the video of a previous run can be reused.
+
+	Example:
+		point = prepare_point(configuration, 'A01', 'POINT 00001\\BRIGHT')
+	"""
+	# Normalize directory path to remove extra backslashes
+	raw_new_dire = os.path.join(configuracion.get('InputFolder'), newFolderName, BrightName)
+	NewDire = os.path.normpath(raw_new_dire)
+	if input_readiness is not None:
+		# The well may still be copying (CopyOverlap)
+		input_readiness.wait_for(newFolderName)
+	debug(configuracion, 'Directory to open: ', NewDire)
+	if not os.path.exists(NewDire):
+		return None
+	# The frames listed by scan_input are used as they are, so the folder is not listed again
+	frames = scanned_frames.pop(NewDire, None)
+	if frames is None:
+		frames = frame_entries(NewDire)
+	NombreVideo = BrightName[:11] + '.avi'
+	# Normalize output path and create directory if needed
+	output_path = os.path.normpath(os.path.join(configuracion.get('OutputFolder'), newFolderName, NombreVideo))
+	out_dir = os.path.dirname(output_path)
+	if not os.path.exists(out_dir):
+		try:
+			os.makedirs(out_dir)
+		except OSError:
+			# Another worker may have created it in the meantime
+			if not os.path.isdir(out_dir):
+				raise
+	# With Resume=True a point completed by a previous run is not processed again
+	fingerprint = resumed = None
+	run_manifest = run_manifests.get(configuracion.get('OutputFolder'))
+	if run_manifest is not None:
+		fingerprint = input_fingerprint(configuracion, NewDire, frames)
+		resumed = run_manifest.complete(newFolderName, BrightName, fingerprint, output_path)
+	# In re-render mode the orientation and shifts of a previous run are reused from the sidecar
+	transform = None
+	if configuracion.get('Rerender') == 'True':
+		transform = read_transform_sidecar(configuracion, sidecar_path(output_path))
+	stabilize = configuracion.get('Stabilize') == 'True'
+	shifts = None
+	if stabilize and transform is not None and transform['shifts']:
+		shifts = transform['shifts']
+	return {'well': newFolderName, 'dir': NewDire, 'video': NombreVideo, 'output': output_path, 'transform': transform,
+			'streaming': configuracion.get('Streaming') == 'True', 'stabilize': stabilize,
+			'shifts': shifts, 'crop': get_crop(configuracion), 'fingerprint': fingerprint, 'resumed': resumed,
+			'bytes': sum([entry[2] for entry in frames]), 'frame_names': sorted([entry[0] for entry in frames])}
+
+def point_orientation(configuracion, point):
+	"""
+	Returns the orientation decision of a point: the one stored in its sidecar in re-render
+	mode, the one shared by its well or plate (see OrientationPolicy), otherwise the result
+	of check_image_orientation.
+	"""
+	if point['transform'] is not None:
+		return point['transform']['flip']
+	orientation_policy = orientation_policies.get(configuracion.get('OutputFolder'))
+	if orientation_policy is not None:
+		return orientation_policy.orientation(configuracion, point['well'], point['dir'])
+	return check_image_orientation(configuracion, point['dir'])
+
+def open_point(configuracion, point, flip_required):
+	"""
+	Opens the frames of a point: the whole stack with FolderOpener, or a StreamingStack in streaming mode.
+
+	Parameters:
+		configuracion (dict): Configuration dictionary.
+		point (dict): Point description returned by prepare_point.
+		flip_required (bool): Orientation decision. In streaming mode it can be updated later on
+		                      the stack (see StreamingStack.set_flip) before the frames are read.
+
+	Returns:
+		ImagePlus: The opened image, or None if the sequence could not be opened.
+	"""
+	if point['streaming']:
+		# In streaming mode the frames are converted and flipped one by one while the AVI is written
+		return open_streaming_stack(configuracion, point['dir'], flip_required, point['stabilize'], point['shifts'], point['crop'],
+									point['frame_names'])
+	return FolderOpener.open(point['dir'])
+
+def encode_point(configuracion, point, imp, flip_required, result):
+	"""
+	Converts an opened point to 8 bits, flips, stabilizes and crops it as configured, writes the
+	AVI video and the transform sidecar, and fills the result record.
+
+	Parameters:
+		configuracion (dict): Configuration dictionary.
+		point (dict): Point description returned by prepare_point.
+		imp (ImagePlus): Image returned by open_point.
+		flip_required (bool): Orientation decision.
+		result (dict): Result record of the job (see process_point).
+	"""
+	global cuadros_avance
+	timings = result['timings']
+	streaming = point['streaming']
+	shifts = point['shifts']
+	transform = point['transform']
+	output_path = point['output']
+	if streaming and imp.getStack().flip_required != flip_required:
+		imp.getStack().set_flip(flip_required)
+		# The ImagePlus read the first frame when it was created, with the previous orientation
+		imp.setProcessor(imp.getStack().getProcessor(1))
+	if configuracion.get('Visor') == 'True':
+		imp.show()
+	if not streaming:
+		start = time.time()
+		ij.Prefs.set("options.scaleConversions", True)
+		ic = ImageConverter(imp)
+		ic.setDoScaling(True)
+		ic.convertToGray8()
+		add_timing(timings, 'convert', start)
+	debug(configuracion, 'Directory where the avi file will be saved: ', output_path)
+	if flip_required and not streaming:
+		start = time.time()
+		flip_orientation(imp)
+		add_timing(timings, 'flip', start)
+	if point['stabilize'] and not streaming:
+		start = time.time()
+		if shifts is not None and len(shifts) == imp.getStackSize():
+			apply_shifts(configuracion, imp, shifts)
+		else:
+			shifts = stabilize_stack(configuracion, imp).shifts
+			transform = None
+		add_timing(timings, 'stabilize', start)
+	if point['crop'] is not None and not streaming:
+		start = time.time()
+		crop_stack(imp, point['crop'])
+		add_timing(timings, 'crop', start)
+	# The video is written to a partial file and renamed when complete, so a cancelled or
+	# failed point never replaces a finished video
+	partial_path = os.path.splitext(output_path)[0] + '.partial.avi'
+	written = False
+	# Outside streaming mode the frames are already in memory, so a cancel is checked before the
+	# write; a video whose frames have all been written is always kept
+	check_cancel()
+	start = time.time()
+	try:
+		IJ.run(imp, "AVI... ", avi_options(configuracion, partial_path))
+		if streaming and imp.getStack().cancelled:
+			raise ProcessingCancelled('Processing cancelled')
+		Files.move(Paths.get(partial_path), Paths.get(output_path), StandardCopyOption.REPLACE_EXISTING)
+		written = True
+	finally:
+		if not written and os.path.exists(partial_path):
+			os.remove(partial_path)
+	# In streaming mode the frames are read, converted and flipped here, so their time is part of 'write'
+	add_timing(timings, 'write', start)
+	if streaming and imp.getStack().stabilize_seconds:
+		# The frames were also stabilized while they were written; that time belongs to 'stabilize'
+		stabilize_seconds = imp.getStack().stabilize_seconds
+		timings['write'] = max(0.0, timings['write'] - stabilize_seconds)
+		timings['stabilize'] = timings.get('stabilize', 0.0) + stabilize_seconds
+	debug(configuracion, 'File save completed: ', point['video'])
+	if streaming and imp.getStack().registrar is not None:
+		shifts = imp.getStack().registrar.shifts
+		transform = None
+	# Only a new analysis is saved; a re-render keeps the sidecar it was made from
+	if transform is None:
+		write_transform_sidecar(configuracion, sidecar_path(output_path), flip_required, shifts or [])
+	result['frames'] = imp.getStackSize()
+	result['output'] = output_path
+	result['status'] = 'done'
+	result['bytes_read'] = point['bytes']
+	result['bytes_written'] = os.path.getsize(output_path)
+	with lock_avance:
+		cuadros_avance = cuadros_avance + result['frames']
+	if configuracion.get('Visor') != 'True':
+		imp.close()
+
+def process_point(configuracion, newFolderName, BrightName, folderNames, BrightNames):
+	"""
+	Processes a single (well, point) job: opens the image sequence, converts it to 8 bits,
+	checks its orientation, flips it if needed and saves it as an AVI video.
+
+	Parameters:
+		configuracion (dict): Configuration dictionary.
+		newFolderName (str): Well folder (e.g., 'A01').
+		BrightName (str): Point subfolder (e.g., 'POINT 00001\\BRIGHT').
+		folderNames (list): All wells of the run (used to compute the progress).
+		BrightNames (list): All points of the run (used to compute the progress).
+
+	Returns:
+		dict: Result record with the keys 'well', 'point', 'status' ('done', 'skipped', 'missing', 'cancelled' or 'error'),
+		      'output', 'frames', 'flip', 'seconds', 'error', 'timings' (seconds per stage, see METRIC_STAGES),
+		      'bytes_read' and 'bytes_written'.
+
+	Example:
+		result = process_point(configuration, 'A01', 'POINT 00001\\BRIGHT', folderNames, BrightNames)
+	"""
+	result = new_result(newFolderName, BrightName)
+	start = time.time()
+	point = None
+	timings = result['timings']
+	try:
+		check_cancel()
+		point = prepare_point(configuracion, newFolderName, BrightName)
+		add_timing(timings, 'prepare', start)
+		if point is not None and point['resumed'] is not None:
+			skip_point(configuracion, point, result)
+		elif point is not None:
+			stage_start = time.time()
+			flip_required = point_orientation(configuracion, point)
+			result['flip'] = flip_required
+			add_timing(timings, 'orientation', stage_start)
+			stage_start = time.time()
+			imp = open_point(configuracion, point, flip_required)
+			add_timing(timings, 'open', stage_start)
+			if imp:
+				encode_point(configuracion, point, imp, flip_required, result)
+			else:
+				error_message = 'ERROR: Could not open the image sequence from folder %s' % point['dir']
+				result['error'] = error_message
+				debug(configuracion, error_message, '')
+		else:
+			no_dir_message = 'Directory does not exist for %s\\%s.' % (newFolderName, BrightName)
+			result['status'] = 'missing'
+			debug(configuracion, no_dir_message, '')
+	except ProcessingCancelled:
+		result['status'] = 'cancelled'
+		debug(configuracion, 'Cancelled: ', '%s\\%s' % (newFolderName, BrightName))
+	except Exception as e:
+		result['error'] = str(e)
+		debug(configuracion, 'ERROR: Processing failed for %s\\%s: ' % (newFolderName, BrightName), str(e))
+	result['seconds'] = time.time() - start
+	record_point(configuracion, point, result)
+	update_progress(folderNames, BrightNames, result, configuracion.get('OutputFolder'))
+	return result
+
+class PointJob(Callable):
+	"""
+	Task for the worker pool: wraps process_point so that a (well, point) pair
+	can be submitted to a java.util.concurrent executor.
+	"""
+	def __init__(self, configuracion, newFolderName, BrightName, folderNames, BrightNames):
+		self.configuracion = configuracion
+		self.newFolderName = newFolderName
+		self.BrightName = BrightName
+		self.folderNames = folderNames
+		self.BrightNames = BrightNames
+
+	def call(self):
+		return process_point(self.configuracion, self.newFolderName, self.BrightName, self.folderNames, self.BrightNames)
+
+def report_results(configuracion, results):
+	"""
+	Logs the result record of each job and a summary of the run.
+
+	Parameters:
+		configuracion (dict): Configuration dictionary.
+		results (list): Result records returned by process_point.
+
+	Example:
+		report_results(configuration, results)
+	"""
+	for result in results:
+		debug(configuracion, 'Result: ', '%s\\%s || %s || frames=%d || flip=%s || %.2f s || %s' % (
+			result['well'], result['point'], result['status'], result['frames'],
+			result['flip'], result['seconds'], result['error'] or result['output'] or ''))
+	done = len([r for r in results if r['status'] == 'done'])
+	skipped = len([r for r in results if r['status'] == 'skipped'])
+	cancelled = len([r for r in results if r['status'] == 'cancelled'])
+	missing = len([r for r in results if r['status'] == 'missing'])
+	errors = len([r for r in results if r['status'] == 'error'])
+	debug(configuracion, 'Jobs summary: ', 'done=%d, skipped=%d, missing=%d, cancelled=%d, errors=%d' % (done, skipped, missing, cancelled, errors))
+
+# =============================================
+# Metrics
+# =============================================
+METRIC_STAGES = ('prepare', 'orientation', 'open', 'convert', 'flip', 'stabilize', 'crop', 'write')
+
+def add_timing(timings, stage, start):
+	"""
+	Adds the time elapsed since start to a stage of the 'timings' of a result record (see METRIC_STAGES).
+	"""
+	timings[stage] = timings.get(stage, 0.0) + (time.time() - start)
+
+def metric_rows(results):
+	"""
+	Returns the metrics of each point: wall time per stage, bytes read and written, frames/s and MB/s.
+	"""
+	finished = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+	rows = []
+	for result in results:
+		seconds = result['seconds'] or 0.0
+		row = [('well', result['well']), ('point', result['point']), ('status', result['status']),
+			   ('frames', result['frames']), ('seconds', round(seconds, 3))]
+		row.extend([(stage, round(result['timings'].get(stage, 0.0), 3)) for stage in METRIC_STAGES])
+		row.extend([('bytes_read', result['bytes_read']), ('bytes_written', result['bytes_written']),
+					('frames_per_second', round(result['frames'] / seconds, 2) if seconds else 0.0),
+					('read_mb_per_second', round(result['bytes_read'] / 1048576.0 / seconds, 2) if seconds else 0.0),
+					('finished', finished)])
+		rows.append(row)
+	return rows
+
+def write_metrics(configuracion, results):
+	"""
+	Appends the metrics of each point to 'metrics.csv' in LogFolder, or to 'metrics.jsonl' (one
+	JSON object per line) with MetricsFormat=jsonl.
+
+	Parameters:
+		configuracion (dict): Configuration dictionary.
+		results (list): Result records of the plate.
+
+	Example:
+		write_metrics(configuration, results)
+	"""
+	jsonl = (configuracion.get('MetricsFormat') or 'csv').lower() == 'jsonl'
+	path = os.path.join(configuracion.get('LogFolder'), 'metrics.jsonl' if jsonl else 'metrics.csv')
+	rows = metric_rows(results)
+	try:
+		new_file = not os.path.exists(path)
+		with open(path, 'a') as metrics:
+			if jsonl:
+				for row in rows:
+					record = JSONObject()
+					for key, value in row:
+						record.put(key, value)
+					metrics.write(record.toString() + '\n')
+			else:
+				writer = csv.writer(metrics, lineterminator='\n')
+				if new_file:
+					writer.writerow([key for key, value in rows[0]] if rows else [])
+				for row in rows:
+					writer.writerow([value for key, value in row])
+		debug(configuracion, 'Metrics written: ', path)
+	except (IOError, OSError) as e:
+		debug(configuracion, 'ERROR: Could not write the metrics: ', str(e))
+
+def report_metrics(configuracion, results, plate=None):
+	"""
+	Logs the metrics summary of a plate: frames, bytes and throughput, and the time spent in
+	each stage as a share of the total, which shows whether the plate was bound by the disk
+	('open', 'write'), the network ('orientation') or the CPU ('convert', 'stabilize'). With
+	Metrics=True the metrics of each point are also exported (see write_metrics).
+
+	Parameters:
+		configuracion (dict): Configuration dictionary.
+		results (list): Result records of the plate.
+		plate (dict): 'start' and 'discovery' times recorded by plan_plate.
+	"""
+	wall = time.time() - plate['start'] if plate else sum([result['seconds'] for result in results])
+	frames = sum([result['frames'] for result in results])
+	read_mb = sum([result['bytes_read'] for result in results]) / 1048576.0
+	written_mb = sum([result['bytes_written'] for result in results]) / 1048576.0
+	debug(configuracion, 'Plate metrics: ', '%d points, %d frames in %.1f s (%.1f frames/s), read %.1f MB (%.1f MB/s), written %.1f MB' % (
+		len(results), frames, wall, frames / wall if wall else 0.0, read_mb, read_mb / wall if wall else 0.0, written_mb))
+	totals = [(stage, sum([result['timings'].get(stage, 0.0) for result in results])) for stage in METRIC_STAGES]
+	total = sum([seconds for stage, seconds in totals])
+	stages = ['%s=%.1f s (%d%%)' % (stage, seconds, round(100.0 * seconds / total) if total else 0) for stage, seconds in totals]
+	if plate:
+		stages.insert(0, 'discovery=%.1f s' % plate['discovery'])
+	debug(configuracion, 'Stage times: ', ', '.join(stages))
+	if configuracion.get('Metrics') == 'True' and results:
+		write_metrics(configuracion, results)
+
+# =============================================
+# Profiler
+# =============================================
+class SamplingProfiler(object):
+	"""
+	Sampling profiler of a run. Every 'interval' seconds a background thread reads the stack
+	traces of the threads running this script (the Python functions appear in them as Jython
+	frames) and counts, for each function, the samples where it is on the stack (inclusive) and
+	at the top (self). Waiting threads (a worker waiting for its orientation, the pool waiting for
+	its jobs) are counted apart, so the percentages only describe the time spent working.
+	"""
+	HOT_SPOTS = (('IJ.run (AVI writing)', ('ij.IJ.run',)),
+				 ('FolderOpener.open', ('ij.plugin.FolderOpener.open',)),
+				 ('ImageConverter', ('ij.process.ImageConverter.',)),
+				 ('HTTP (Custom Vision)', ('java.net.', 'sun.net.www.', 'sun.security.ssl.', 'javax.net.ssl.')))
+	IGNORED = ('org.python.', 'sun.reflect.', 'java.lang.reflect.', 'jdk.internal.')
+	TOP = 40
+
+	def __init__(self, path, interval):
+		self.path = path
+		self.interval = interval
+		self.functions = {}   # function -> [inclusive samples, self samples]
+		self.waiting = {}   # function of this script where the thread waits -> samples
+		self.hot_spots = dict([(label, 0) for label, prefixes in self.HOT_SPOTS])
+		self.samples = 0
+		self.running = 0
+		self.stopped = threading.Event()
+		self.thread = None
+		self.start_time = 0
+
+	def start(self):
+		self.start_time = time.time()
+		self.thread = threading.Thread(target=self.run, name='AutoStabilizer profiler')
+		self.thread.setDaemon(True)
+		self.thread.start()
+
+	def run(self):
+		while not self.stopped.isSet():
+			self.sample()
+			self.stopped.wait(self.interval)
+
+	def is_script_frame(self, frame):
+		"""
+		Tells whether a stack frame runs code of this script. The file name of the frame is compared
+		with script_file, so the script is found whatever it is named or wherever it is run from.
+		"""
+		file_name = frame.getFileName()
+		return bool(file_name) and file_name in (script_file, os.path.basename(script_file))
+
+	def function_name(self, frame):
+		"""
+		Returns the name of a stack frame: the function for this script, 'function (file.py)' for
+		other Python files, 'class.method' for Java, or None for the frames of Jython itself.
+		"""
+		file_name = frame.getFileName() or ''
+		if self.is_script_frame(frame):
+			return frame.getMethodName().split('$')[0]
+		if file_name.endswith('.py'):
+			return '%s (%s)' % (frame.getMethodName().split('$')[0], file_name)
+		class_name = frame.getClassName()
+		if class_name.startswith(self.IGNORED):
+			return None
+		return '%s.%s' % (class_name, frame.getMethodName())
+
+	def sample(self):
+		current = JavaThread.currentThread()
+		for entry in JavaThread.getAllStackTraces().entrySet():
+			thread, frames = entry.getKey(), entry.getValue()
+			if thread.equals(current) or not [frame for frame in frames if self.is_script_frame(frame)]:
+				continue
+			names = [name for name in [self.function_name(frame) for frame in frames] if name]
+			self.samples += 1
+			if str(thread.getState()) in ('WAITING', 'TIMED_WAITING', 'BLOCKED'):
+				script = [self.function_name(frame) for frame in frames if self.is_script_frame(frame)]
+				self.waiting[script[0]] = self.waiting.get(script[0], 0) + 1
+				continue
+			self.running += 1
+			if names:
+				self.functions.setdefault(names[0], [0, 0])[1] += 1
+			for name in set(names):
+				self.functions.setdefault(name, [0, 0])[0] += 1
+			methods = ['%s.%s' % (frame.getClassName(), frame.getMethodName()) for frame in frames]
+			for label, prefixes in self.HOT_SPOTS:
+				if [method for method in methods if method.startswith(prefixes)]:
+					self.hot_spots[label] += 1
+
+	def stop(self):
+		"""
+		Stops the sampling and writes the report.
+		"""
+		self.stopped.set()
+		if self.thread is not None:
+			self.thread.join()
+		self.write_report()
+
+	def write_report(self):
+		duration = time.time() - self.start_time
+		share = lambda count, total: 100.0 * count / total if total else 0.0
+		lines = ['AutoStabilizer profile',
+				 'Started: %s, duration: %.1f s, interval: %d ms' % (
+					 datetime.fromtimestamp(self.start_time).strftime('%Y-%m-%d %H:%M:%S'), duration, self.interval * 1000),
+				 'Thread samples: %d (working %d, waiting %d)' % (self.samples, self.running, self.samples - self.running),
+				 '', 'Hot spots (share of the working samples)']
+		for label, prefixes in self.HOT_SPOTS:
+			lines.append('  %6.1f%%  %s' % (share(self.hot_spots[label], self.running), label))
+		lines.extend(['', 'Functions by inclusive time (top %d)' % self.TOP, '  total%    self%  samples  function'])
+		ranking = sorted(self.functions.items(), key=lambda item: -item[1][0])[:self.TOP]
+		for name, (inclusive, own) in ranking:
+			lines.append('  %6.1f%%  %6.1f%%  %7d  %s' % (share(inclusive, self.running), share(own, self.running), inclusive, name))
+		lines.extend(['', 'Waiting, by function of the script', '  share%  samples  function'])
+		for name, count in sorted(self.waiting.items(), key=lambda item: -item[1]):
+			lines.append('  %6.1f%%  %7d  %s' % (share(count, self.samples), count, name))
+		with open(self.path, 'w') as report:
+			report.write('\n'.join(lines) + '\n')
+
+def create_profiler(configuracion):
+	"""
+	Starts a sampling profiler with Profile=True. The report is written to
+	'profile_YYYY_MM_DD_HHMMSS.txt' in LogFolder when it is stopped. The sampling interval is
+	ProfileInterval milliseconds (default 20).
+
+	Parameters:
+		configuracion (dict): Configuration dictionary.
+
+	Returns:
+		SamplingProfiler: The running profiler, or None if Profile is not enabled.
+
+	Example:
+		profiler = create_profiler(configuration)
+	"""
+	if configuracion.get('Profile') != 'True':
+		return None
+	interval = max(1, get_config_int(configuracion, 'ProfileInterval', 20)) / 1000.0
+	path = os.path.join(configuracion.get('LogFolder'), 'profile_%s.txt' % datetime.now().strftime('%Y_%m_%d_%H%M%S'))
+	profiler = SamplingProfiler(path, interval)
+	profiler.start()
+	debug(configuracion, 'Profiler started, interval (ms): ', str(int(interval * 1000)))
+	return profiler
+
+def stop_profiler(configuracion, profiler):
+	"""
+	Stops a profiler created by create_profiler and writes its report.
+	"""
+	if profiler is None:
+		return
+	try:
+		profiler.stop()
+		debug(configuracion, 'Profile written: ', profiler.path)
+	except (IOError, OSError) as e:
+		debug(configuracion, 'ERROR: Could not write the profile: ', str(e))
+
+# =============================================
+# Run Manifest
+# =============================================
+class RunManifest(object):
+	"""
+	Completion manifest of a plate ('run_manifest.csv' in OutputFolder). A row is appended as soon
+	as each AVI is written, so after a crash a new run with Resume=True skips the points whose
+	inputs and settings did not change and whose video is still valid, and only does the rest.
+
+	Row format: well,point,fingerprint,bytes,frames,seconds,finished,output
+	"""
+	HEADER = 'well,point,fingerprint,bytes,frames,seconds,finished,output'
+
+	def __init__(self, path):
+		self.path = path
+		self.entries = {}
+		self.lock = threading.Lock()
+		self.load()
+
+	def load(self):
+		if not os.path.exists(self.path):
+			return
+		with codecs.open(self.path, 'r', 'utf-8') as manifest:
+			for line in manifest:
+				line = line.rstrip('\r\n')
+				if not line or line.startswith('#') or line == self.HEADER:
+					continue
+				try:
+					well, point, fingerprint, size, frames, seconds, finished, output = line.split(',', 7)
+					# A later row of the same point replaces the earlier ones
+					self.entries[(well, point)] = {'fingerprint': fingerprint, 'bytes': long(size), 'frames': int(frames), 'output': output}
+				except ValueError:
+					# A row cut by a crash is ignored and its point is processed again
+					continue
+
+	def complete(self, well, point, fingerprint, output):
+		"""
+		Returns the manifest entry of a point if its video can be reused, otherwise None.
+		"""
+		entry = self.entries.get((well, point))
+		if entry is None or entry['fingerprint'] != fingerprint or entry['output'] != output:
+			return None
+		if not valid_avi(output, entry['bytes']):
+			return None
+		return entry
+
+	def record(self, result, fingerprint):
+		size = os.path.getsize(result['output'])
+		line = '%s,%s,%s,%d,%d,%.2f,%s,%s\n' % (result['well'], result['point'], fingerprint, size, result['frames'],
+			result['seconds'], datetime.now().strftime('%Y-%m-%d %H:%M:%S'), result['output'])
+		with self.lock:
+			new_file = not os.path.exists(self.path)
+			with codecs.open(self.path, 'a', 'utf-8') as manifest:
+				if new_file:
+					manifest.write('# AutoStabilizer run manifest\n')
+					manifest.write(self.HEADER + '\n')
+				manifest.write(line)
+			self.entries[(result['well'], result['point'])] = {'fingerprint': fingerprint, 'bytes': size,
+															   'frames': result['frames'], 'output': result['output']}
+
+def create_run_manifest(configuracion):
+	"""
+	Creates the completion manifest of the run from the optional 'Resume' key (default False).
+
+	Returns:
+		RunManifest: Manifest loaded from OutputFolder, or None if Resume is not enabled.
+
+	Example:
+		run_manifests[configuration.get('OutputFolder')] = create_run_manifest(configuration)
+	"""
+	if configuracion.get('Resume') != 'True':
+		return None
+	manifest = RunManifest(os.path.join(configuracion.get('OutputFolder'), 'run_manifest.csv'))
+	debug(configuracion, 'Run manifest: ', '%s (%d points recorded)' % (manifest.path, len(manifest.entries)))
+	return manifest
+
+def valid_avi(path, size):
+	"""
+	Checks that a video exists, has the size recorded in the manifest and starts with an AVI header.
+	"""
+	try:
+		if os.path.getsize(path) != size:
+			return False
+		with open(path, 'rb') as video:
+			header = video.read(12)
+	except (IOError, OSError):
+		return False
+	return header[:4] == 'RIFF' and header[8:12] == 'AVI '
+
+def input_fingerprint(configuracion, NewDire, frames=None):
+	"""
+	Fingerprint of a point: number, total size and latest date of its frames, plus a hash of
+	the settings that change the video (compression, frame rate, stabilization, crop and streaming,
+	which converts, flips and stabilizes the frames one at a time, so its video is not identical).
+	The frames already listed by the caller (see frame_entries) can be passed in 'frames'.
+
+	Returns:
+		str: Fingerprint such as '120:125829120:1712345678000:3f2a9c1b'.
+	"""
+	if frames is None:
+		frames = frame_entries(NewDire)
+	settings = '|'.join([str(configuracion.get(key, '')).strip() for key in
+						 ('Compression', 'FrameRate', 'Stabilize', 'RegistrationSize', 'PyramidLevels', 'Crop', 'Streaming')])
+	return '%d:%d:%d:%s' % (len(frames), sum([entry[2] for entry in frames]),
+							max([entry[3] for entry in frames] or [0]), hashlib.md5(settings).hexdigest()[:8])
+
+def skip_point(configuracion, point, result):
+	"""
+	Fills the result record of a point whose video was already completed by a previous run.
+	"""
+	result['status'] = 'skipped'
+	result['output'] = point['output']
+	result['frames'] = point['resumed']['frames']
+	debug(configuracion, 'Already completed, skipped: ', point['output'])
+
+def record_point(configuracion, point, result):
+	"""
+	Appends a finished point to the run manifest (only with Resume=True).
+	"""
+	run_manifest = run_manifests.get(configuracion.get('OutputFolder'))
+	if run_manifest is None or point is None or result['status'] != 'done':
+		return
+	try:
+		run_manifest.record(result, point['fingerprint'])
+	except (IOError, OSError) as e:
+		debug(configuracion, 'ERROR: Could not update the run manifest: ', str(e))
+
+# =============================================
+# Plate Index
+# =============================================
+def list_entries(path):
+	"""
+	Lists a folder in a single pass, like os.scandir: java.nio returns the entries together with
+	their attributes (on Windows they come from the directory listing itself), so no extra stat
+	call is made per file, which matters on network shares.
+
+	Parameters:
+		path (str): Folder to list.
+
+	Returns:
+		list: (name, is_directory, size, modified_millis) tuples.
+	"""
+	entries = []
+	stream = Files.newDirectoryStream(Paths.get(path))
+	try:
+		for entry in stream:
+			attributes = Files.readAttributes(entry, BasicFileAttributes)
+			entries.append((str(entry.getFileName()), attributes.isDirectory(), attributes.size(),
+							attributes.lastModifiedTime().toMillis()))
+	finally:
+		stream.close()
+	return entries
+
+def frame_entries(point_dir):
+	"""
+	Lists the TIFF frames of a point folder with their size and date (see list_entries).
+	"""
+	return [entry for entry in list_entries(point_dir)
+			if not entry[1] and (entry[0].lower().endswith('.tif') or entry[0].lower().endswith('.tiff'))]
+
+def point_bytes(configuracion, newFolderName, BrightName):
+	"""
+	Returns the total size of the frames of a point, or None if its folder does not exist (yet).
+	"""
+	if input_readiness is not None and not input_readiness.is_ready(newFolderName):
+		# With CopyOverlap the folders of a well are created before its files are copied
+		return None
+	point_dir = os.path.normpath(os.path.join(configuracion.get('InputFolder'), newFolderName, BrightName))
+	if not os.path.isdir(point_dir):
+		return None
+	return sum([entry[2] for entry in frame_entries(point_dir)])
+
+def channel_names(configuracion):
+	"""
+	Returns the channel folders of BrightFoldersPoint (e.g., set(['BRIGHT']) for 'POINT 00001\\BRIGHT'),
+	or an empty set when the points have no channel folder.
+	"""
+	names = [name.strip() for name in configuracion.get('BrightFoldersPoint').split(',')]
+	return set([os.path.basename(name) for name in names if os.sep in name])
+
+def point_folders(well_dir, name, modified, channels):
+	"""
+	Returns the points of a subfolder of a well as (point, modified_millis) pairs: one per channel
+	folder it contains (e.g., 'POINT 00001\\BRIGHT'), or the subfolder itself when there are no channels.
+	"""
+	if not channels:
+		return [(name, modified)]
+	return [(os.path.join(name, channel), channel_modified)
+			for channel, channel_dir, channel_size, channel_modified in list_entries(os.path.join(well_dir, name))
+			if channel_dir and channel in channels]
+
+def format_frame_files(entries):
+	"""
+	Encodes the frames of a point for plate_index.csv as 'name/size/modified' items separated by '|'
+	(characters that Windows does not allow in file names), or '' if a name contains them.
+	"""
+	if [entry for entry in entries if '/' in entry[0] or '|' in entry[0] or ',' in entry[0]]:
+		return ''
+	return '|'.join(['%s/%d/%d' % (entry[0], entry[2], entry[3]) for entry in entries])
+
+def parse_frame_files(text):
+	"""
+	Decodes the frames written by format_frame_files as frame_entries tuples, or None if they were not stored.
+	"""
+	if not text:
+		return None
+	entries = []
+	for item in text.split('|'):
+		name, size, modified = item.split('/')
+		entries.append((name, False, long(size), long(modified)))
+	return entries
+
+def plate_index_path(configuracion):
+	"""
+	Returns the path of the plate index manifest ('plate_index.csv' in LogFolder).
+	"""
+	return os.path.join(configuracion.get('LogFolder'), 'plate_index.csv')
+
+def read_plate_index(configuracion, path):
+	"""
+	Reads a plate index manifest written by write_plate_index.
+
+	Returns:
+		dict: (well, point) -> (modified_millis, frames, bytes, frame entries), or an empty dict if the
+		      manifest does not exist, cannot be read or was written for another InputFolder.
+	"""
+	cached = {}
+	if not os.path.exists(path):
+		return cached
+	try:
+		with codecs.open(path, 'r', 'utf-8') as index_file:
+			for line in index_file:
+				line = line.rstrip('\r\n')
+				if line.startswith('# InputFolder='):
+					if line[len('# InputFolder='):] != configuracion.get('InputFolder'):
+						return {}
+				elif line and not line.startswith('#') and line != 'well,point,frames,bytes,modified,frame_files':
+					# An index written before the frame files were stored fails here and is scanned again
+					well, point, frames, size, modified, frame_files = line.split(',')
+					cached[(well, point)] = (long(modified), int(frames), long(size), parse_frame_files(frame_files))
+	except (IOError, ValueError) as e:
+		debug(configuracion, 'Plate index could not be read, scanning again: ', str(e))
+		return {}
+	return cached
+
+def write_plate_index(configuracion, path, index):
+	"""
+	Writes the plate index as a CSV manifest (one row per point, with its frame files), so that the
+	next scan only has to list the point folders whose modification time changed.
+	"""
+	with codecs.open(path, 'w', 'utf-8') as index_file:
+		index_file.write('# AutoStabilizer plate index\n')
+		index_file.write('# InputFolder=%s\n' % configuracion.get('InputFolder'))
+		index_file.write('well,point,frames,bytes,modified,frame_files\n')
+		for point in index:
+			index_file.write('%s,%s,%d,%d,%d,%s\n' % (point['well'], point['point'], point['frames'], point['bytes'],
+													 point['modified'], format_frame_files(point['entries'])))
+
+def scan_input(configuracion):
+	"""
+	Walks InputFolder once and builds the index of wells -> points -> frame files that drives the
+	processing when DiscoverPoints=True. The frame files of each point are handed to prepare_point
+	(see scanned_frames), so the point folders are not listed again when they are processed.
+
+	The wells are the ReadFolders that exist in InputFolder. The points are every subfolder of a
+	well that contains the channel folder of BrightFoldersPoint (e.g., 'BRIGHT' for
+	'POINT 00001\\BRIGHT'), including points that are not listed in BrightFoldersPoint. The index
+	is cached in plate_index.csv in LogFolder and a point folder is only listed again when its
+	modification time changed.
+
+	Parameters:
+		configuracion (dict): Configuration dictionary.
+
+	Returns:
+		list: One dict per point with the keys 'well', 'point', 'dir', 'frames', 'bytes', 'modified' and
+		      'entries' (frame_entries tuples), in ReadFolders order and then by point name. For a well
+		      still being copied (CopyOverlap) 'frames', 'bytes', 'modified' and 'entries' are None.
+
+	Example:
+		index = scan_input(configuration)
+	"""
+	start = time.time()
+	inputFolder = configuracion.get('InputFolder')
+	path = plate_index_path(configuracion)
+	cached = read_plate_index(configuracion, path)
+	BrightNames = [name.strip() for name in configuracion.get('BrightFoldersPoint').split(',')]
+	channels = channel_names(configuracion)
+	wells = dict([(name, is_dir) for name, is_dir, size, modified in list_entries(inputFolder)])
+	index = []
+	listed = 0
+	for well in [name.strip() for name in configuracion.get('ReadFolders').split(',')]:
+		well_dir = os.path.join(inputFolder, well)
+		if input_readiness is not None and not input_readiness.is_ready(well):
+			# Waiting for the copy here would hold back every point until the whole plate is copied.
+			# The Copy ingestion creates the folders of a well before its files, so the well is planned
+			# from them (or from BrightFoldersPoint) and prepare_point waits for its copy
+			copying = []
+			if wells.get(well):
+				for name, is_dir, size, modified in sorted(list_entries(well_dir)):
+					if is_dir:
+						copying.extend([entry[0] for entry in point_folders(well_dir, name, modified, channels)])
+			for point in copying or BrightNames:
+				index.append({'well': well, 'point': point, 'dir': os.path.normpath(os.path.join(well_dir, point)),
+							  'frames': None, 'bytes': None, 'modified': None, 'entries': None})
+			continue
+		if not wells.get(well):
+			debug(configuracion, 'Well folder does not exist: ', well)
+			continue
+		points = []
+		for name, is_dir, size, modified in sorted(list_entries(well_dir)):
+			if is_dir:
+				points.extend(point_folders(well_dir, name, modified, channels))
+		for point, modified in points:
+			point_dir = os.path.normpath(os.path.join(well_dir, point))
+			if (well, point) in cached and cached[(well, point)][0] == modified and cached[(well, point)][3] is not None:
+				frames, size, entries = cached[(well, point)][1:]
+			else:
+				listed = listed + 1
+				entries = sorted(frame_entries(point_dir))
+				frames = len(entries)
+				size = sum([entry[2] for entry in entries])
+			if frames:
+				scanned_frames[point_dir] = entries
+				index.append({'well': well, 'point': point, 'dir': point_dir, 'frames': frames, 'bytes': size,
+							  'modified': modified, 'entries': entries})
+	unlisted = sorted(set([point['point'] for point in index]) - set(BrightNames))
+	if unlisted:
+		debug(configuracion, 'Points found that are not listed in BrightFoldersPoint: ', ', '.join(unlisted))
+	# The wells still being copied are listed again by the next scan
+	write_plate_index(configuracion, path, [point for point in index if point['frames'] is not None])
+	debug(configuracion, 'Plate index: ', '%d points, %d frames, %.1f MB (%d folders listed, %.2f s)' % (
+		len(index), sum([point['frames'] or 0 for point in index]), sum([point['bytes'] or 0 for point in index]) / 1048576.0,
+		listed, time.time() - start))
+	return index
+
+# =============================================
+# Watch Folder
+# =============================================
+class FolderWatcher(object):
+	"""
+	Follows a live acquisition in InputFolder (Watch=True). A poll lists the root folder, lists a
+	well again only when its date changed (a new point folder appeared) and then lists only the
+	points that are still pending, so its cost does not grow with the points already processed.
+	A point is ready when its frames (count, bytes and latest date) did not change for 'settle' seconds.
+	"""
+	def __init__(self, configuracion, settle):
+		self.input_folder = configuracion.get('InputFolder')
+		self.wells = [name.strip() for name in configuracion.get('ReadFolders').split(',')]
+		self.channels = channel_names(configuracion)
+		self.settle = settle
+		self.well_modified = {}   # well -> date of its last listing
+		self.found = set()   # (well, point folder) already found
+		self.pending = {}   # (well, point folder) -> (frames signature, unchanged since)
+		self.last_change = time.time()
+
+	def poll(self):
+		"""
+		Returns the (well, point) pairs that stopped growing since the previous polls.
+		"""
+		now = time.time()
+		wells = dict([(name, (is_dir, modified)) for name, is_dir, size, modified in list_entries(self.input_folder)])
+		for well in self.wells:
+			is_dir, modified = wells.get(well, (False, None))
+			if not is_dir or self.well_modified.get(well) == modified:
+				continue
+			self.well_modified[well] = modified
+			for name, entry_dir, size, entry_modified in list_entries(os.path.join(self.input_folder, well)):
+				if entry_dir and (well, name) not in self.found:
+					self.found.add((well, name))
+					self.pending[(well, name)] = (None, now)
+					self.last_change = now
+		ready = []
+		for well, name in sorted(self.pending.keys()):
+			well_dir = os.path.join(self.input_folder, well)
+			try:
+				signature = []
+				for point, point_modified in point_folders(well_dir, name, None, self.channels):
+					frames = frame_entries(os.path.normpath(os.path.join(well_dir, point)))
+					signature.append((point, len(frames), sum([entry[2] for entry in frames]), max([entry[3] for entry in frames] or [0])))
+			except IOException:
+				# The folder was removed or renamed
+				del self.pending[(well, name)]
+				continue
+			previous, since = self.pending[(well, name)]
+			if signature != previous:
+				self.pending[(well, name)] = (signature, now)
+				self.last_change = now
+			elif [entry for entry in signature if entry[1]] and now - since >= self.settle:
+				del self.pending[(well, name)]
+				ready.extend([(well, entry[0]) for entry in signature if entry[1]])
+		return ready
+
+def watch_input(configuracion, folderNames, BrightNames, workers):
+	"""
+	Daemon mode (Watch=True): polls InputFolder every WatchInterval seconds (default 30) and submits
+	each point that did not grow for WatchSettle seconds (default 120) to the worker pool, so the
+	videos are written while the microscope is still imaging. The watch ends when the run is
+	cancelled or, if WatchIdle is set, after that many minutes without new frames (default 0, no limit).
+
+	Parameters:
+		configuracion (dict): Configuration dictionary.
+		folderNames (list): All wells of the run (used to compute the progress).
+		BrightNames (list): All points of the run (used to compute the progress).
+		workers (int): Number of points processed at the same time.
+
+	Returns:
+		list: Result records of the processed points, in the order they became ready.
+
+	Example:
+		results = watch_input(configuration, folderNames, BrightNames, 2)
+	"""
+	global total_avance
+	interval = max(1.0, get_config_float(configuracion, 'WatchInterval', 30.0))
+	idle = get_config_float(configuracion, 'WatchIdle', 0.0) * 60
+	watcher = FolderWatcher(configuracion, get_config_float(configuracion, 'WatchSettle', 120.0))
+	debug(configuracion, 'Watching InputFolder: ', '%s (every %.0f s)' % (watcher.input_folder, interval))
+	pool = Executors.newFixedThreadPool(workers)
+	futures = []
+	try:
+		while not cancel_event.isSet():
+			try:
+				ready = watcher.poll()
+			except IOException as e:
+				debug(configuracion, 'ERROR: Could not list InputFolder, retrying: ', str(e))
+				ready = []
+			for newFolderName, BrightName in ready:
+				debug(configuracion, 'Point ready: ', '%s\\%s' % (newFolderName, BrightName))
+				with lock_avance:
+					total_avance = total_avance + 1
+				progress_tracker.add_jobs(configuracion.get('OutputFolder'), [(newFolderName, BrightName)],
+										  [point_bytes(configuracion, newFolderName, BrightName)])
+				futures.append(pool.submit(PointJob(configuracion, newFolderName, BrightName, folderNames, BrightNames)))
+			if idle and time.time() - watcher.last_change >= idle:
+				debug(configuracion, 'No new frames, end of the watch after minutes: ', '%.0f' % (idle / 60))
+				break
+			# Returns at once when the run is cancelled
+			cancel_event.wait(interval)
+		# The points already submitted are finished (or marked as cancelled) before returning
+		return [future.get() for future in futures]
+	finally:
+		pool.shutdown()
+
+# =============================================
+# Prefetching Pipeline
+# =============================================
+class OrientationTask(Callable):
+	"""
+	Task that resolves the orientation of a point on the orientation pool, so the
+	Custom Vision request is in flight while the frames of the point are being loaded.
+	"""
+	def __init__(self, configuracion, point):
+		self.configuracion = configuracion
+		self.point = point
+
+	def call(self):
+		return point_orientation(self.configuracion, self.point)
+
+class LoaderStage(Callable):
+	"""
+	First stage of the pipeline: for each job, starts the orientation request, reads the
+	frames from disk and puts the loaded point (with its 'prepare' and 'open' timings) in the bounded queue. Because put() blocks
+	when the queue is full, at most PrefetchDepth points wait in memory for an encoder.
+	"""
+	def __init__(self, configuracion, jobs, loaded, orientation_pool, encoders):
+		self.configuracion = configuracion
+		self.jobs = jobs
+		self.loaded = loaded
+		self.orientation_pool = orientation_pool
+		self.encoders = encoders
+
+	def call(self):
+		try:
+			for index, (newFolderName, BrightName) in enumerate(self.jobs):
+				start = time.time()
+				point = imp = orientation = None
+				error = ''
+				timings = {}
+				try:
+					# After a cancel the remaining jobs are not loaded, the encoders mark them as cancelled
+					if not cancel_event.isSet():
+						point = prepare_point(self.configuracion, newFolderName, BrightName)
+					add_timing(timings, 'prepare', start)
+					if point is not None and point['resumed'] is None:
+						orientation = self.orientation_pool.submit(OrientationTask(self.configuracion, point))
+						# The orientation is only known later, so streaming stacks start without flip
+						stage_start = time.time()
+						imp = open_point(self.configuracion, point, False)
+						add_timing(timings, 'open', stage_start)
+				except Exception as e:
+					error = str(e)
+				self.loaded.put((index, newFolderName, BrightName, point, imp, orientation, error, start, timings))
+		finally:
+			# One end marker per encoder, so every encoder stops after the last job
+			for i in range(self.encoders):
+				self.loaded.put((None, None, None, None, None, None, '', 0, None))
+		return None
+
+class EncoderStage(Callable):
+	"""
+	Second stage of the pipeline: takes loaded points from the queue, waits for their
+	orientation and converts, flips, stabilizes and writes them (see encode_point).
+	"""
+	def __init__(self, configuracion, loaded, results, folderNames, BrightNames):
+		self.configuracion = configuracion
+		self.loaded = loaded
+		self.results = results
+		self.folderNames = folderNames
+		self.BrightNames = BrightNames
+
+	def call(self):
+		while True:
+			index, newFolderName, BrightName, point, imp, orientation, error, start, timings = self.loaded.take()
+			if index is None:
+				return None
+			result = new_result(newFolderName, BrightName)
+			result['timings'] = timings
+			try:
+				check_cancel()
+				if error:
+					raise Exception(error)
+				if point is None:
+					result['status'] = 'missing'
+					debug(self.configuracion, 'Directory does not exist for %s\\%s.' % (newFolderName, BrightName), '')
+				elif point['resumed'] is not None:
+					skip_point(self.configuracion, point, result)
+				else:
+					# Only the time the encoder waits for the answer is counted
+					stage_start = time.time()
+					flip_required = orientation.get()
+					result['flip'] = flip_required
+					add_timing(timings, 'orientation', stage_start)
+					if imp:
+						encode_point(self.configuracion, point, imp, flip_required, result)
+					else:
+						result['error'] = 'ERROR: Could not open the image sequence from folder %s' % point['dir']
+						debug(self.configuracion, result['error'], '')
+			except ProcessingCancelled:
+				result['status'] = 'cancelled'
+				debug(self.configuracion, 'Cancelled: ', '%s\\%s' % (newFolderName, BrightName))
+			except Exception as e:
+				result['error'] = str(e)
+				debug(self.configuracion, 'ERROR: Processing failed for %s\\%s: ' % (newFolderName, BrightName), str(e))
+			if imp and result['status'] != 'done' and self.configuracion.get('Visor') != 'True':
+				# A loaded point that is cancelled or fails is not closed by encode_point
+				imp.close()
+			result['seconds'] = time.time() - start
+			record_point(self.configuracion, point, result)
+			self.results[index] = result
+			update_progress(self.folderNames, self.BrightNames, result, self.configuracion.get('OutputFolder'))
+
+def run_pipeline(configuracion, jobs, folderNames, BrightNames, workers):
+	"""
+	Processes the jobs as a producer/consumer pipeline: one loader reads the next points
+	(and starts their orientation requests) while 'workers' encoders convert and write
+	the current ones. The queue between both stages holds at most PrefetchDepth points.
+
+	Parameters:
+		configuracion (dict): Configuration dictionary ('PrefetchDepth' is optional, default 2).
+		jobs (list): (well, point) pairs to process.
+		folderNames (list): All wells of the run (used to compute the progress).
+		BrightNames (list): All points of the run (used to compute the progress).
+		workers (int): Number of encoder threads.
+
+	Returns:
+		list: Result records of all jobs, in job order.
+
+	Example:
+		results = run_pipeline(configuration, jobs, folderNames, BrightNames, 2)
+	"""
+	depth = max(1, get_config_int(configuracion, 'PrefetchDepth', 2))
+	debug(configuracion, 'Pipeline enabled. Prefetch depth: ', str(depth))
+	loaded = ArrayBlockingQueue(depth)
+	results = [None] * len(jobs)
+	# The orientation requests can run ahead of the encoders, up to MaxInFlight at a time
+	orientation_pool = Executors.newFixedThreadPool(max(workers, get_config_int(configuracion, 'MaxInFlight', 4)))
+	pool = Executors.newFixedThreadPool(workers + 1)
+	try:
+		stages = [pool.submit(LoaderStage(configuracion, jobs, loaded, orientation_pool, workers))]
+		for i in range(workers):
+			stages.append(pool.submit(EncoderStage(configuracion, loaded, results, folderNames, BrightNames)))
+		for stage in stages:
+			stage.get()
+	finally:
+		pool.shutdown()
+		orientation_pool.shutdown()
+	return results
+
+def plan_plate(configuracion):
+	"""
+	Prepares a plate for processing: creates its orientation policy and run manifest and
+	lists its (well, point) jobs, from 'ReadFolders' x 'BrightFoldersPoint' or, with
+	DiscoverPoints=True, from a single scan of InputFolder (see scan_input). With Watch=True
+	the job list is empty, the points are found while the acquisition writes them.
+
+	Parameters:
+		configuracion (dict): Configuration dictionary of the plate.
+
+	Returns:
+		tuple: (jobs, folderNames, BrightNames).
+
+	Example:
+		jobs, folderNames, BrightNames = plan_plate(configuration)
+	"""
+	folderNames = configuracion.get('ReadFolders').split(',')
+	BrightNames = configuracion.get('BrightFoldersPoint').split(',')
+	outputFolder = configuracion.get('OutputFolder')
+	orientation_policies[outputFolder] = create_orientation_policy(configuracion)
+	run_manifests[outputFolder] = create_run_manifest(configuracion)
+	start = time.time()
+	if configuracion.get('Watch') == 'True':
+		jobs = sizes = []
+	elif configuracion.get('DiscoverPoints') == 'True':
+		points = scan_input(configuracion)
+		jobs = [(point['well'], point['point']) for point in points]
+		sizes = [point['bytes'] for point in points]
+	else:
+		jobs = [(newFolderName, BrightName) for newFolderName in folderNames for BrightName in BrightNames]
+		# The size of each point weights the progress (see ProgressTracker)
+		sizes = [point_bytes(configuracion, newFolderName, BrightName) for newFolderName, BrightName in jobs]
+	progress_tracker.add_jobs(outputFolder, jobs, sizes)
+	plate_metrics[outputFolder] = {'start': start, 'discovery': time.time() - start}
+	return jobs, folderNames, BrightNames
+
+def finish_plate(configuracion, results):
+	"""
+	Writes the summary and the metrics of a plate in its log (see report_results and report_metrics)
+	and releases its orientation policy and run manifest.
+	"""
+	report_results(configuracion, results)
+	outputFolder = configuracion.get('OutputFolder')
+	report_metrics(configuracion, results, plate_metrics.pop(outputFolder, None))
+	orientation_policy = orientation_policies.pop(outputFolder, None)
+	run_manifests.pop(outputFolder, None)
+	if orientation_policy is not None:
+		debug(configuracion, 'Orientation classifications: ', '%d of %d points' % (orientation_policy.calls, len(results)))
+
+def finish_run(configuracion, results):
+	"""
+	Saves the orientation cache and, with TrainLocalModel=True, trains the local orientation
+	model once all the plates of the run are processed.
+	"""
+	cache = get_orientation_cache(configuracion)
+	if cache is not None:
+		# Rewrites the cache file without the evicted entries
+		cache.save()
+	if configuracion.get('TrainLocalModel') == 'True':
+		train_local_model(configuracion, results)
+
+def process_images(configuracion):
+	"""
+	Processes every (well, point) combination of 'ReadFolders' x 'BrightFoldersPoint', or with
+	DiscoverPoints=True every point found in InputFolder by a single scan (see plan_plate).
+
+	Each combination is an independent job. With Workers=1 (default) the jobs run one after
+	the other; with more workers they are scheduled on a fixed thread pool. With Pipeline=True
+	the next points are loaded (and their orientation requested) while the current ones are encoded.
+	With Resume=True the points recorded as completed in the run manifest are skipped. With
+	Watch=True the points are processed as the acquisition writes them (see watch_input).
+
+	Parameters:
+		configuracion (dict): Configuration dictionary.
+
+	Returns:
+		list: Result records of all jobs (see process_point).
+
+	Example:
+		results = process_images(configuration)
+	"""
+	global total_avance, inicio_avance
+	results = []
+	inputFolder = configuracion.get('InputFolder')
+	if inputFolder:
+		jobs, folderNames, BrightNames = plan_plate(configuracion)
+		watch = configuracion.get('Watch') == 'True'
+		total_avance = len(jobs)
+		inicio_avance = time.time()
+		progress_tracker.begin()
+		workers = min(get_workers(configuracion), len(jobs)) if jobs else 1
+		if watch:
+			workers = get_workers(configuracion)
+		debug(configuracion, 'Workers: ', str(workers))
+		if watch:
+			results = watch_input(configuracion, folderNames, BrightNames, workers)
+		elif configuracion.get('Pipeline') == 'True' and jobs:
+			results = run_pipeline(configuracion, jobs, folderNames, BrightNames, workers)
+		elif workers > 1:
+			pool = Executors.newFixedThreadPool(workers)
+			try:
+				futures = [pool.submit(PointJob(configuracion, newFolderName, BrightName, folderNames, BrightNames))
+						   for newFolderName, BrightName in jobs]
+				# Results are collected in submission order to keep the report deterministic
+				results = [future.get() for future in futures]
+			finally:
+				pool.shutdown()
+		else:
+			for newFolderName, BrightName in jobs:
+				results.append(process_point(configuracion, newFolderName, BrightName, folderNames, BrightNames))
+		finish_plate(configuracion, results)
+		finish_run(configuracion, results)
+	return results
+
+# =============================================
+# Command Line
+# =============================================
+def run_program(configuracion, workspace_path, copy_dir):
+	"""
+	Ingests the source folder into the workspace and processes it. Shared by the Accept
+	button of the GUI and the headless command line.
+
+	Parameters:
+		configuracion (dict): Configuration dictionary (the ingestion mode is read from 'Ingest').
+		workspace_path (str): Workspace created by setup_workspace.
+		copy_dir (str): Folder with the wells to process.
+
+	Returns:
+		list: Result records of all jobs (see process_images).
+
+	Example:
+		results = run_program(configuration, workspace_path, copy_dir)
+	"""
+	global iteracion_avance, cuadros_avance
+	iteracion_avance = 0  # Reset counter
+	cuadros_avance = 0
+	progress_tracker.reset()
+	scanned_frames.clear()   # Listings of a previous run may be out of date
+	if configuracion.get('Watch') == 'True':
+		# A live acquisition is read where the microscope writes it (see watch_input)
+		configuracion['Ingest'] = 'InPlace'
+	# The configuration is loaded first because it selects the ingestion mode (Ingest)
+	ingest_thread = start_ingest(configuracion, os.path.join(workspace_path, "InputFolder"), copy_dir)
+	start_program(configuracion)
+	create_destination_folders(configuracion)
+	profiler = create_profiler(configuracion)
+	try:
+		results = process_images(configuracion)
+	finally:
+		stop_profiler(configuracion, profiler)
+	if ingest_thread is not None:
+		# After a cancel the ingestion stops at its next file, so the wait for it is bounded
+		while ingest_thread.isAlive() and not cancel_event.isSet():
+			ingest_thread.join(1.0)
+		ingest_thread.join(30.0)
+		if ingest_thread.isAlive():
+			debug(configuracion, 'Ingestion still stopping after the cancel: ', copy_dir)
+	debug(configuracion, 'END OF PROGRAM.', '')
+	log_writer.flush()
+	return results
+
+def plate_folders(plate_size):
+	"""
+	Returns the well folders of a plate size in the order used by the GUI (e.g., '2 x 3' ->
+	A01, A02, B01, B02, C01, C02).
+
+	Parameters:
+		plate_size (str): Plate size as 'rows x columns' (e.g., '8 x 12').
+
+	Returns:
+		list: Well folder names.
+	"""
+	rows, cols = map(int, plate_size.strip().split("x"))
+	folders = []
+	for col in range(cols):
+		for row in range(1, rows + 1):
+			folders.append("{}{:02d}".format(chr(65 + col), row))  # 65 is the ASCII code for 'A'
+	return folders
+
+def config_override(value):
+	"""
+	Parses a KEY=VALUE argument of --set.
+	"""
+	if '=' not in value:
+		raise argparse.ArgumentTypeError("expected KEY=VALUE, got '%s'" % value)
+	key, value = value.split('=', 1)
+	return (key.strip(), value.strip())
+
+def plate_list(value):
+	"""
+	Parses the plate sizes of --bench-plates ('all' selects every size of the GUI dropdown).
+	"""
+	if value.strip().lower() == 'all':
+		return list(PLATE_SIZES)
+	plates = [plate.strip() for plate in value.split(',') if plate.strip()]
+	for plate in plates:
+		try:
+			rows, cols = map(int, plate.split('x'))
+		except ValueError:
+			raise argparse.ArgumentTypeError("expected 'rows x columns', got '%s'" % plate)
+	return plates
+
+def int_list(value):
+	"""
+	Parses a comma separated list of integers of the --bench-* arguments.
+	"""
+	try:
+		return [int(item) for item in value.split(',') if item.strip()]
+	except ValueError:
+		raise argparse.ArgumentTypeError("expected integers separated by ',', got '%s'" % value)
+
+def float_list(value):
+	"""
+	Parses a comma separated list of numbers of the --bench-* arguments.
+	"""
+	try:
+		return [float(item) for item in value.split(',') if item.strip()]
+	except ValueError:
+		raise argparse.ArgumentTypeError("expected numbers separated by ',', got '%s'" % value)
+
+def size_list(value):
+	"""
+	Parses the WIDTHxHEIGHT frame sizes of --bench-sizes.
+	"""
+	try:
+		sizes = []
+		for size in value.split(','):
+			if size.strip():
+				width, height = map(int, size.lower().split('x'))
+				sizes.append((width, height))
+		return sizes
+	except ValueError:
+		raise argparse.ArgumentTypeError("expected WIDTHxHEIGHT sizes separated by ',', got '%s'" % value)
+
+def parse_arguments(argv):
+	"""
+	Parses the arguments of the headless command line.
+
+	Example:
+		options = parse_arguments(['--work-dir', '/data/work', '--source', '/data/plate1', '--plate', '8 x 12'])
+	"""
+	parser = argparse.ArgumentParser(prog='AutoStabilizer', description='Processes a Muvicyte plate without the graphical interface.')
+	parser.add_argument('--work-dir', help='Folder where the AutoStabilizer workspace is created.')
+	parser.add_argument('--source', help='Folder with the wells to process.')
+	parser.add_argument('--batch', metavar='MANIFEST', help='CSV file with several plates (source, output, plate, wells, points) '
+						'processed with a single worker pool; replaces --work-dir and --source.')
+	parser.add_argument('--benchmark', metavar='DIR', help='Generates synthetic plates in DIR and processes each configuration '
+						'of the --bench-* lists against a local Custom Vision stand-in; replaces --work-dir and --source.')
+	parser.add_argument('--bench-plates', default='2 x 2', type=plate_list,
+						help="Plate sizes of the benchmark, e.g. '2 x 2,8 x 6', or 'all' for the sizes of the GUI (default '2 x 2').")
+	parser.add_argument('--bench-points', default='1', type=int_list, help='Points per well of the benchmark (default 1).')
+	parser.add_argument('--bench-frames', default='24', type=int_list, help='Frames per point of the benchmark (default 24).')
+	parser.add_argument('--bench-sizes', default='512x512', type=size_list, help="Frame sizes of the benchmark, e.g. '512x512,2048x2048' (default 512x512).")
+	parser.add_argument('--bench-depths', default='8', type=int_list, help='Bit depths of the benchmark frames, 8 and/or 16 (default 8).')
+	parser.add_argument('--bench-drift', default='0', type=float_list, help='Drift of the benchmark frames in pixels per frame (default 0).')
+	parser.add_argument('--bench-latency', default=0.0, type=float, help='Milliseconds the Custom Vision stand-in waits before answering (default 0).')
+	parser.add_argument('--selftest', action='store_true', help='Checks the Custom Vision client (retries, timeouts, '
+						'MaxInFlight) against a local stand-in and exits.')
+	parser.add_argument('--plate', help="Plate size as 'rows x columns', e.g. '8 x 12' (sets ReadFolders and CreateFolders).")
+	parser.add_argument('--wells', help="Wells to process, e.g. 'A01,A02' (sets ReadFolders and CreateFolders).")
+	parser.add_argument('--points', help="Points to process, e.g. 'POINT 00001\\BRIGHT' or 'POINT 00001/BRIGHT' (sets BrightFoldersPoint).")
+	parser.add_argument('--watch', action='store_true', help='Processes the points while the acquisition writes them (sets Watch=True).')
+	parser.add_argument('--config', default='Config.txt', help='Base configuration file (default Config.txt).')
+	parser.add_argument('--set', dest='overrides', action='append', default=[], type=config_override, metavar='KEY=VALUE',
+						help='Replaces a key of the configuration file, e.g. --set Workers=4 (can be repeated).')
+	options = parser.parse_args(argv)
+	if not options.batch and not options.benchmark and not options.selftest and not (options.work_dir and options.source):
+		parser.error('--work-dir and --source are required unless --batch, --benchmark or --selftest is given')
+	if [depth for depth in options.bench_depths if depth not in (8, 16)]:
+		parser.error('--bench-depths only accepts 8 and 16')
+	return options
+
+def run_headless(argv):
+	"""
+	Headless entry point: creates the workspace, builds the configuration from the base
+	configuration file and the arguments, and processes the plate without the Swing GUI.
+
+	Parameters:
+		argv (list): Command line arguments (see parse_arguments).
+
+	Example:
+		ImageJ-linux64 --headless --jython AutoStabilizer_v1.4.4_EN.ijm.py --work-dir /data/work --source /data/plate1 --plate "8 x 12"
+		ImageJ-linux64 --headless --jython AutoStabilizer_v1.4.4_EN.ijm.py --batch /data/batch.csv --set Workers=8
+		ImageJ-linux64 --headless --jython AutoStabilizer_v1.4.4_EN.ijm.py --benchmark /data/bench --bench-frames 24,96
+		ImageJ-linux64 --headless --jython AutoStabilizer_v1.4.4_EN.ijm.py --selftest
+	"""
+	global configuracion
+	options = parse_arguments(argv)
+	if options.selftest:
+		if not run_selftest():
+			sys.exit(1)
+		return
+	if options.batch:
+		run_batch(options.batch, options.config, dict(options.overrides))
+		return
+	if options.benchmark:
+		run_benchmark(options)
+		return
+	workspace_path = setup_workspace(options.work_dir)
+	if not workspace_path:
+		sys.exit(1)
+	overrides = {}
+	for subdir in ["LogFolder", "InputFolder", "OutputFolder"]:
+		overrides[subdir] = os.path.join(workspace_path, subdir)
+	folders = None
+	if options.wells:
+		folders = [well.strip() for well in options.wells.split(',')]
+	elif options.plate:
+		folders = plate_folders(options.plate)
+	if folders:
+		overrides['ReadFolders'] = overrides['CreateFolders'] = ','.join(folders)
+	if options.points:
+		overrides['BrightFoldersPoint'] = options.points
+	if options.watch:
+		overrides['Watch'] = 'True'
+	overrides.update(dict(options.overrides))
+	configuracion = load_config_file(options.config, overrides)
+	run_program(configuracion, workspace_path, options.source)
+
+# =============================================
+# Batch of Plates
+# =============================================
+def read_batch_manifest(path):
+	"""
+	Reads a batch manifest: a CSV file with one plate per row and the columns 'source' (folder
+	with the wells), 'output' (folder where the workspace of the plate is created) and optionally
+	'plate' (e.g. '8 x 12'), 'wells' and 'points' (lists separated by ';'). Empty lines and lines
+	starting with '#' are ignored.
+
+	Parameters:
+		path (str): Path of the manifest.
+
+	Returns:
+		list: One dictionary per plate with the keys of the header.
+
+	Example:
+		plates = read_batch_manifest('/data/batch.csv')
+	"""
+	with open(path, 'r') as manifest:
+		lines = [line for line in manifest if line.strip() and not line.lstrip().startswith('#')]
+	plates = []
+	for row in csv.DictReader(lines):
+		plate = dict([(key.strip().lower(), (value or '').strip()) for key, value in row.items() if key])
+		if not plate.get('source') or not plate.get('output'):
+			raise ValueError("every row of the batch manifest needs 'source' and 'output': %s" % row)
+		plates.append(plate)
+	return plates
+
+def plate_overrides(plate, workspace_path):
+	"""
+	Returns the configuration values of a plate of the batch manifest (workspace folders,
+	wells and points).
+	"""
+	overrides = {}
+	for subdir in ["LogFolder", "InputFolder", "OutputFolder"]:
+		overrides[subdir] = os.path.join(workspace_path, subdir)
+	folders = None
+	if plate.get('wells'):
+		folders = [well.strip() for well in plate['wells'].split(';')]
+	elif plate.get('plate'):
+		folders = plate_folders(plate['plate'])
+	if folders:
+		overrides['ReadFolders'] = overrides['CreateFolders'] = ','.join(folders)
+	if plate.get('points'):
+		overrides['BrightFoldersPoint'] = ','.join([point.strip() for point in plate['points'].split(';')])
+	return overrides
+
+def run_batch(manifest_path, ruta_config='Config.txt', overrides=None):
+	"""
+	Processes all the plates of a batch manifest (see read_batch_manifest) in one run. The points
+	of every plate are submitted to a single worker pool, so the pool never drains between
+	plates, and the Custom Vision client, the orientation cache and the local model are shared.
+	Each plate keeps its own workspace, log, run manifest and orientation policy.
+
+	Parameters:
+		manifest_path (str): Path of the batch manifest.
+		ruta_config (str): Base configuration file (default 'Config.txt').
+		overrides (dict): Values that replace those of the file for every plate (--set).
+
+	Returns:
+		list: Result records of all the plates.
+
+	Example:
+		results = run_batch('/data/batch.csv', 'Config.txt', {'Workers': '8'})
+	"""
+	global configuracion, iteracion_avance, cuadros_avance, total_avance, inicio_avance
+	iteracion_avance = 0  # Reset counter
+	cuadros_avance = 0
+	progress_tracker.reset()
+	scanned_frames.clear()   # Listings of a previous run may be out of date
+	plates = []
+	for plate in read_batch_manifest(manifest_path):
+		workspace_path = setup_workspace(plate['output'])
+		if not workspace_path:
+			sys.exit(1)
+		values = plate_overrides(plate, workspace_path)
+		values.update(overrides or {})
+		plate_config = load_config_file(ruta_config, values)
+		# A batch only reads acquisitions that are already complete
+		plate_config['Watch'] = 'False'
+		if plates:
+			# The orientation cache and the local model of the first plate serve the whole batch
+			for key, value in (('OrientationCacheFolder', plates[0][0].get('OrientationCacheFolder') or plates[0][0].get('LogFolder')),
+							   ('LocalModel', local_model_path(plates[0][0]))):
+				if not plate_config.get(key):
+					plate_config[key] = value
+		plates.append((plate_config, workspace_path, plate['source']))
+	if not plates:
+		IJ.log("The batch manifest has no plates: {}".format(manifest_path))
+		return []
+	configuracion = plates[0][0]
+	planned = []
+	for plate_config, workspace_path, source_dir in plates:
+		start_program(plate_config)
+		ingest_input(plate_config, os.path.join(workspace_path, "InputFolder"), source_dir)
+		create_destination_folders(plate_config)
+		jobs, folderNames, BrightNames = plan_plate(plate_config)
+		debug(plate_config, 'Batch plate: ', '%s (%d points)' % (source_dir, len(jobs)))
+		planned.append((plate_config, jobs, folderNames, BrightNames))
+	total_avance = sum([len(plan[1]) for plan in planned])
+	inicio_avance = time.time()
+	progress_tracker.begin()
+	workers = max(1, min(get_workers(configuracion), total_avance))
+	debug(configuracion, 'Workers: ', str(workers))
+	profiler = create_profiler(configuracion)
+	pool = Executors.newFixedThreadPool(workers)
+	try:
+		futures = []
+		for plate_config, jobs, folderNames, BrightNames in planned:
+			futures.append([pool.submit(PointJob(plate_config, newFolderName, BrightName, folderNames, BrightNames))
+							for newFolderName, BrightName in jobs])
+		results = []
+		for (plate_config, jobs, folderNames, BrightNames), plate_futures in zip(planned, futures):
+			# Each plate is reported in its own log as soon as its points are finished
+			plate_results = [future.get() for future in plate_futures]
+			for result in plate_results:
+				result['input'] = plate_config.get('InputFolder')
+			finish_plate(plate_config, plate_results)
+			results.extend(plate_results)
+	finally:
+		pool.shutdown()
+		stop_profiler(configuracion, profiler)
+	finish_run(configuracion, results)
+	for plate_config, workspace_path, source_dir in plates:
+		debug(plate_config, 'END OF PROGRAM.', '')
+	log_writer.flush()
+	return results
+
+# =============================================
+# Benchmark
+# =============================================
+def synthetic_scene(width, height, top, random):
+	"""
+	Returns the scene from which the frames of a synthetic point are cut: a smooth illumination
+	gradient with random cells (blurred disks), with values between 0 and top.
+	"""
+	corners = FloatProcessor(2, 2, jarray.array([0.25 + 0.1 * random.nextDouble() for i in range(4)], 'f'))
+	corners.setInterpolationMethod(ImageProcessor.BILINEAR)
+	scene = corners.resize(width, height)
+	scene.multiply(top)
+	for i in range(width * height // 2000):
+		radius = 3 + random.nextInt(10)
+		scene.setValue(top * (0.5 + 0.4 * random.nextDouble()))
+		scene.fillOval(random.nextInt(width) - radius, random.nextInt(height) - radius, 2 * radius, 2 * radius)
+	scene.blurGaussian(2.0)
+	return scene
+
+def generate_point(point_dir, frames, width, height, bit_depth, drift, seed):
+	"""
+	Writes the frames of a synthetic point as 00000.TIFF, 00001.TIFF, ... in point_dir. Every frame is
+	a window of the same scene moved 'drift' pixels per frame (diagonally, with one pixel of jitter),
+	plus noise, so Stabilize has a real translation to recover. Frames that already exist are kept,
+	so a benchmark can be repeated without generating its plates again.
+
+	Parameters:
+		point_dir (str): BRIGHT folder of the point.
+		frames (int): Number of frames.
+		width (int), height (int): Frame size in pixels.
+		bit_depth (int): 8 or 16.
+		drift (float): Translation in pixels per frame.
+		seed (int): Seed of the scene, the jitter and the noise.
+	"""
+	if not os.path.isdir(point_dir):
+		os.makedirs(point_dir)
+	random = Random(seed)
+	top = 255.0 if bit_depth == 8 else 4095.0
+	margin = int(math.ceil(drift * max(0, frames - 1))) + 2
+	scene = None
+	for i in range(frames):
+		x = min(margin, max(0, 1 + int(round(drift * i)) + random.nextInt(3) - 1)) if drift else 1
+		y = min(margin, max(0, 1 + int(round(drift * i * 0.5)) + random.nextInt(3) - 1)) if drift else 1
+		path = os.path.join(point_dir, '%05d.TIFF' % i)
+		if os.path.exists(path):
+			continue
+		if scene is None:
+			scene = synthetic_scene(width + margin, height + margin, top, Random(seed))
+		scene.setRoi(x, y, width, height)
+		frame = scene.crop()
+		frame.noise(top * 0.02)
+		if bit_depth == 8:
+			frame = frame.convertToByteProcessor(False)
+		else:
+			frame = frame.convertToShortProcessor(False)
+		FileSaver(ImagePlus('%05d' % i, frame)).saveAsTiff(path)
+
+def generate_plate(source_dir, plate_size, points, frames, width, height, bit_depth, drift):
+	"""
+	Writes a synthetic Muvicyte plate in source_dir with the layout of the acquisition,
+	<well>/POINT 0000N/BRIGHT/00000.TIFF, for the wells of plate_size (see plate_folders).
+
+	Returns:
+		tuple: (wells, BrightNames) to use as ReadFolders and BrightFoldersPoint.
+
+	Example:
+		wells, BrightNames = generate_plate('/data/bench/plates/2x2', '2 x 2', 1, 24, 512, 512, 8, 1.0)
+	"""
+	wells = plate_folders(plate_size)
+	BrightNames = [os.path.join('POINT %05d' % (point + 1), 'BRIGHT') for point in range(points)]
+	for index, well in enumerate(wells):
+		for point in range(points):
+			point_dir = os.path.join(source_dir, well, 'POINT %05d' % (point + 1), 'BRIGHT')
+			generate_point(point_dir, frames, width, height, bit_depth, drift, index * points + point)
+	return wells, BrightNames
+
+def heap_pools():
+	"""
+	Returns the memory pools of the Java heap, whose peak usage is the peak memory of a benchmark configuration.
+	"""
+	return [pool for pool in ManagementFactory.getMemoryPoolMXBeans() if pool.getType() == MemoryType.HEAP]
+
+def write_benchmark(path, rows):
+	"""
+	Appends the benchmark rows to a CSV file, with a header when the file is new.
+	"""
+	new_file = not os.path.exists(path)
+	with open(path, 'a') as benchmark:
+		writer = csv.writer(benchmark, lineterminator='\n')
+		if new_file and rows:
+			writer.writerow([key for key, value in rows[0]])
+		for row in rows:
+			writer.writerow([value for key, value in row])
+
+def run_benchmark(options):
+	"""
+	Measures the throughput of the pipeline on synthetic plates. Every combination of the --bench-*
+	lists (plate size, points, frames, frame size, bit depth, drift) is generated once in
+	DIR/plates (see generate_plate) and processed headless in place, with its workspace in DIR/runs,
+	against a local Custom Vision stand-in (see CustomVisionStandIn). The configuration file and
+	--set apply to every run, so e.g. --set Workers=4 or --set Stabilize=True can be compared.
+
+	For each configuration the frames/s, MB/s, peak heap and the share of the per-point wall time spent
+	in the 'stabilize' stage are logged and appended to DIR/benchmark.csv.
+	If a configuration does not finish all its points, the benchmark stops with an error instead of
+	reporting the throughput of an incomplete run.
+	The peak heap is the sum of the peaks of the heap pools, measured after a garbage collection.
+	The frames were just written, so they are usually read from the operating system cache.
+
+	Parameters:
+		options: Arguments of the command line (see parse_arguments).
+
+	Returns:
+		list: One row per configuration, as (column, value) pairs.
+
+	Example:
+		ImageJ-linux64 --headless --jython AutoStabilizer_v1.4.4_EN.ijm.py --benchmark /data/bench --bench-plates all --set Workers=4
+	"""
+	global configuracion
+	base_dir = options.benchmark
+	configurations = [(plate_size, points, frames, size, bit_depth, drift)
+					  for plate_size in options.bench_plates for points in options.bench_points
+					  for frames in options.bench_frames for size in options.bench_sizes
+					  for bit_depth in options.bench_depths for drift in options.bench_drift]
+	server, endpoint = start_stand_in(CustomVisionStandIn(options.bench_latency / 1000.0))
+	rows = []
+	failed = None
+	try:
+		for plate_size, points, frames, (width, height), bit_depth, drift in configurations:
+			label = '%s_%dpt_%df_%dx%d_%dbit_drift%g' % (plate_size.replace(' ', ''), points, frames, width, height, bit_depth, drift)
+			source_dir = os.path.join(base_dir, 'plates', label)
+			IJ.log("Benchmark: generating {}".format(source_dir))
+			wells, BrightNames = generate_plate(source_dir, plate_size, points, frames, width, height, bit_depth, drift)
+			workspace_path = setup_workspace(os.path.join(base_dir, 'runs', label))
+			if not workspace_path:
+				sys.exit(1)
+			overrides = {'ReadFolders': ','.join(wells), 'CreateFolders': ','.join(wells),
+						 'BrightFoldersPoint': ','.join(BrightNames), 'Ingest': 'InPlace',
+						 'ENDPOINT': endpoint, 'PREDICTION_KEY': 'benchmark'}
+			for subdir in ["LogFolder", "InputFolder", "OutputFolder"]:
+				overrides[subdir] = os.path.join(workspace_path, subdir)
+			overrides.update(dict(options.overrides))
+			configuracion = load_config_file(options.config, overrides)
+			pools = heap_pools()
+			System.gc()
+			for pool in pools:
+				pool.resetPeakUsage()
+			start = time.time()
+			results = run_program(configuracion, workspace_path, source_dir)
+			seconds = time.time() - start
+			peak_mb = sum([pool.getPeakUsage().getUsed() for pool in pools]) / 1048576.0
+			done = len([result for result in results if result['status'] == 'done'])
+			if not results or done != len(results):
+				failed = label
+				IJ.log("ERROR: Benchmark {}: {} of {} points done, see the log in {}".format(
+					label, done, len(wells) * points, configuracion.get('LogFolder')))
+				break
+			total_frames = sum([result['frames'] for result in results])
+			read_mb = sum([result['bytes_read'] for result in results]) / 1048576.0
+			# Share of the per-point wall time spent registering and translating the frames
+			point_seconds = sum([result['seconds'] for result in results])
+			stabilize_seconds = sum([result['timings'].get('stabilize', 0.0) for result in results])
+			stabilize_percent = 100.0 * stabilize_seconds / point_seconds if point_seconds else 0.0
+			row = [('configuration', label), ('plate', plate_size), ('points', points), ('jobs', len(results)), ('done', done),
+				   ('frames', total_frames), ('width', width), ('height', height), ('bit_depth', bit_depth), ('drift', drift),
+				   ('workers', get_workers(configuracion)), ('seconds', round(seconds, 3)),
+				   ('frames_per_second', round(total_frames / seconds, 2) if seconds else 0.0),
+				   ('read_mb_per_second', round(read_mb / seconds, 2) if seconds else 0.0),
+				   ('peak_heap_mb', round(peak_mb, 1)), ('stabilize_percent', round(stabilize_percent, 1))]
+			IJ.log("Benchmark {}: {} frames in {:.1f} s ({:.1f} frames/s, {:.1f} MB/s), peak heap {:.0f} MB, stabilize {:.1f}% of the point time".format(
+				label, total_frames, seconds, total_frames / seconds if seconds else 0.0,
+				read_mb / seconds if seconds else 0.0, peak_mb, stabilize_percent))
+			rows.append(row)
+	finally:
+		server.stop(0)
+		server.getExecutor().shutdown()
+	path = os.path.join(base_dir, 'benchmark.csv')
+	write_benchmark(path, rows)
+	IJ.log("Benchmark results: {}".format(path))
+	if failed:
+		sys.exit(1)
+	return rows
+
+# =============================================
+# Main Execution
+# =============================================
+# Only this runs at the start
+if __name__ == "__main__":
+	if HEADLESS:
+		run_headless(sys.argv[1:])
+	else:
+		setup_gui()
 
 # =============================================
 # End of Program
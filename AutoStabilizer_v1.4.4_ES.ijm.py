@@ -7,6 +7,15 @@
 from ij import IJ                       								# Funciones principales de ImageJ (logging, apertura de imágenes, etc.)
 from ij.plugin import FolderOpener        								# Permite abrir una carpeta como secuencia de imágenes
 from ij.process import ImageConverter    	 							# Conversión de imágenes entre distintos formatos
+from ij import ImagePlus, VirtualStack  								# Contenedor de imágenes y pila cuyos cuadros se leen bajo demanda
+from ij.io import Opener                								# Abre un único archivo de imagen (un cuadro a la vez)
+from ij.io import FileSaver             								# Calidad JPEG configurada en ImageJ
+# Importaciones para la estabilización de imágenes (correlación de fase por FFT)
+from ij.process import FHT, FloatProcessor, ImageProcessor, Blitter, ImageStatistics	# Transformada de Hartley y aritmética sobre imágenes completas
+from ij.measure import Measurements     								# Selección de las estadísticas a calcular
+from ij.plugin.filter import MaximumFinder								# Localiza el pico de correlación
+import math                             								# Funciones trigonométricas para la ventana de la FFT
+import jarray                           								# Arreglos de Java para construir procesadores desde listas de Python
 # Importaciones para manejo de fechas y tiempos
 from datetime import datetime             								# Formateo y manipulación de fechas y horas
 # Importaciones relacionadas a las preferencias de ImageJ
@@ -14,36 +23,82 @@ import ij.Prefs                         								# Manejo de las preferencias y c
 # Importaciones para interacción con el sistema operativo
 import os                               								# Operaciones con rutas, directorios y archivos
 import sys                             								 	# Acceso a funciones y parámetros del sistema
+import time                             								# Medición del tiempo transcurrido de cada trabajo
+import threading                        								# Locks para proteger contadores compartidos entre workers
+import hashlib                          								# Hash del primer cuadro usado como clave de la caché de orientación
+import atexit                           								# Escribe las líneas de log pendientes al cerrar Fiji
 # Importaciones para realizar conexiones de red
 from java.net import URL  							# Para realizar peticiones a servicios web y APIs
 # Importaciones para operaciones de entrada/salida de datos
 from java.io import BufferedReader, InputStreamReader, DataOutputStream # Manejo de streams para lectura y escritura de datos
+from java.io import IOException          								# Errores de conexión y tiempos agotados de las consultas HTTP
+from java.io import ByteArrayOutputStream 								# Buffer en memoria para el JPEG enviado a Custom Vision
+from javax.imageio import ImageIO, IIOImage, ImageWriteParam			# Codificación JPEG sin escribir un archivo
 # Importaciones para operaciones de codificación
 # Importación para manejar datos en formato JSON
 from org.json import JSONObject         								# Creación y análisis de objetos JSON
-# Importaciones para la interfaz gráfica y manejo de diálogos
-import javax.swing.JDialog as JDialog     								# Componente de diálogo para ventanas modales
-import java.awt.Dialog.ModalityType as ModalityType  					# Define el tipo de modalidad de los diálogos
+# Importaciones para el pool de workers que procesa trabajos (pocillo, punto) en paralelo
+from java.lang import Runtime             								# Número de procesadores disponibles
+from java.lang import Thread as JavaThread								# Trazas de pila de los workers muestreadas por el perfilador
+from java.util.concurrent import Executors, Callable   					# Pool de hilos y tareas que retornan un resultado
+from java.util.concurrent import ArrayBlockingQueue   					# Cola acotada entre las etapas del pipeline
+from java.util.concurrent import Semaphore   							# Limita las consultas a Custom Vision en curso
+from java.util.concurrent import LinkedBlockingQueue, TimeUnit		# Líneas de log en espera del escritor de log
 # Importación para copiar directorios de forma recursiva
-from shutil import copytree             								# Copia completa de una carpeta a otra
-# Importaciones para seleccionar archivos y directorios mediante un diálogo
-import javax.swing.JFileChooser as JFileChooser  						# Componente para abrir diálogos de selección de archivos o directorios
+from java.nio.file import Files, Paths, StandardCopyOption				# Copias y enlaces de los archivos de entrada
+from java.nio.file.attribute import BasicFileAttributes					# Tamaño y fechas leídos con el listado del directorio
 import codecs                           								# Manejo de archivos con codificación específica
-# Importaciones adicionales de Swing para construir la GUI
-from javax.swing import JPanel, JButton, JLabel, JTextField, BoxLayout, BorderFactory, SwingConstants
-from javax.swing import JComboBox, JCheckBox, JScrollPane
-# Importaciones de AWT para configuraciones de layouts, fuentes y colores
-from java.awt import BorderLayout, FlowLayout, Font, Color, GridLayout, Insets, Dimension
-from javax.swing import SwingUtilities   								# Para asegurar que la GUI se ejecute en el hilo de eventos
+# Importaciones para la línea de comandos sin GUI
+import argparse                         								# Argumentos de la línea de comandos (ver ejecuta_sin_gui)
+import csv                              								# Manifiesto de lote con varias placas y archivo de métricas (ver ejecuta_lote, guarda_metricas)
+# Importaciones para el banco de pruebas con placas sintéticas (ver ejecuta_banco_pruebas)
+from java.util import Random             								# Células y deriva de los cuadros sintéticos con semilla
+from java.net import InetSocketAddress   								# Dirección local del sustituto de Custom Vision
+from com.sun.net.httpserver import HttpServer, HttpHandler				# Servidor HTTP del sustituto de Custom Vision
+from java.lang import System, String     								# Recolección de basura antes de cada configuración y respuestas UTF-8 del sustituto
+from java.lang.management import ManagementFactory, MemoryType			# Uso máximo de los pools de memoria del heap
+from java.awt import GraphicsEnvironment   								# Detecta Fiji --headless y equipos sin pantalla
 # Importaciones para manejo de eventos en la ventana
 from java.awt.event import WindowAdapter   								# Adaptador para eventos de cierre y otros eventos de ventana
+# Los argumentos de línea de comandos o una JVM sin pantalla activan el modo sin GUI, que nunca carga las clases de la GUI
+HEADLESS = len(sys.argv) > 1 or GraphicsEnvironment.isHeadless()
+if not HEADLESS:
+	# Importaciones para la interfaz gráfica y manejo de diálogos
+	import javax.swing.JDialog as JDialog     							# Componente de diálogo para ventanas modales
+	import java.awt.Dialog.ModalityType as ModalityType  				# Define el tipo de modalidad de los diálogos
+	# Importaciones para seleccionar archivos y directorios mediante un diálogo
+	import javax.swing.JFileChooser as JFileChooser  					# Componente para abrir diálogos de selección de archivos o directorios
+	# Importaciones adicionales de Swing para construir la GUI
+	from javax.swing import JPanel, JButton, JLabel, JTextField, BoxLayout, BorderFactory, SwingConstants
+	from javax.swing import JComboBox, JCheckBox, JScrollPane
+	# Importaciones de AWT para configuraciones de layouts, fuentes y colores
+	from java.awt import BorderLayout, FlowLayout, Font, Color, GridLayout, Insets, Dimension
+	from javax.swing import SwingUtilities   							# Para asegurar que la GUI se ejecute en el hilo de eventos
+	from javax.swing import Timer           							# Actualización periódica de la vista de avance
 
 # =============================================
 # Variables Globales
 # =============================================
 configuracion = {}  # No inicializar aquí (se carga después de la GUI)
+TAMANOS_PLACA = ["1 x 1", "2 x 2", "3 x 2", "4 x 3", "8 x 6", "12 x 8"]   # Tamaños de placa del menú desplegable de la GUI (también generados por ejecuta_banco_pruebas)
 iteracion_avance = 0
+total_avance = 0   # Número de trabajos de la ejecución (ver procesamiento_imagenes)
+cuadros_avance = 0   # Cuadros escritos en la ejecución (mostrados por la vista de avance)
+inicio_avance = 0   # Hora de inicio del procesamiento (ver procesamiento_imagenes)
+evento_cancelacion = threading.Event()   # Activado por el botón Cancelar de la vista de avance (ver verifica_cancelacion)
 custom_plate_size = None   # Nueva variable global para almacenar el tamaño ingresado en Edit
+lock_avance = threading.Lock()   # Protege iteracion_avance cuando varios workers terminan al mismo tiempo
+cache_orientacion = None   # Caché de orientación de la ejecución (ver obtiene_cache_orientacion)
+cliente_clasificador = None   # Cliente de Custom Vision de la ejecución (ver obtiene_cliente_clasificador)
+clasificador_local = None   # (ruta del modelo, ClasificadorOrientacionLocal) de la ejecución (ver obtiene_clasificador_local)
+politicas_orientacion = {}   # Orientación compartida de cada placa de la ejecución, por OutputFolder (ver crea_politica_orientacion)
+input_readiness = None   # Pocillos ya copiados cuando la copia se superpone con el procesamiento (ver start_ingest)
+manifiestos_ejecucion = {}   # Manifiesto de finalización de cada placa de la ejecución, por OutputFolder (ver crea_manifiesto_ejecucion)
+metricas_placa = {}   # Inicio y tiempo de descubrimiento de cada placa de la ejecución, por OutputFolder (ver planifica_placa)
+cuadros_escaneados = {}   # Cuadros de cada punto listados por escanea_entrada, por carpeta de punto (ver prepara_punto)
+lock_cliente = threading.Lock()   # Protege la creación de cliente_clasificador
+lock_cache = threading.Lock()   # Protege la creación de cache_orientacion
+archivo_script = sys._getframe().f_code.co_filename   # Archivo de código de este script, como aparece en las pilas de Java (ver PerfiladorMuestreo)
 
 # ==========================================================================
 # Interfaz Gráfica
@@ -191,7 +246,7 @@ def _build_gui_dropdown():
 	lbl_placa = JLabel("Tamaño de placa de cultivo:")
 	lbl_placa.setFont(Font("Arial", Font.PLAIN, 14))
 	lbl_placa.setForeground(Color(85, 85, 85))
-	sizes = ["1 x 1", "2 x 2", "3 x 2", "4 x 3", "8 x 6", "12 x 8", "Edit"]
+	sizes = TAMANOS_PLACA + ["Edit"]
 	combo_sizes = JComboBox(sizes)
 	combo_sizes.setFont(Font("Arial", Font.PLAIN, 12))
 	combo_sizes.setBackground(Color(255, 255, 255))
@@ -224,8 +279,8 @@ def _on_accept(frame, work_dir, copy_dir):
 	Maneja la acción del botón Aceptar.
 	
 	Valida que ambos directorios sean proporcionados, crea la estructura de carpetas en
-	el directorio de trabajo, actualiza el archivo Config.txt, copia la carpeta indicada,
-	carga la configuración y da inicio al procesamiento de imágenes.
+	el directorio de trabajo, actualiza el archivo Config.txt, carga la configuración,
+	copia (o enlaza) la carpeta indicada y da inicio al procesamiento de imágenes.
 	
 	Parámetros:
 		frame (JDialog): La ventana actual de la GUI.
@@ -240,20 +295,116 @@ def _on_accept(frame, work_dir, copy_dir):
 	workspace_path = setup_workspace(work_dir)
 	if workspace_path:
 		update_config(workspace_path)
-		copy_to_input(os.path.join(workspace_path, "InputFolder"), copy_dir)
 
 		# Cerrar GUI y cargar la configuración del sistema
 		frame.dispose()
-		global configuracion, iteracion_avance
+		global configuracion
 		configuracion = abre_archivo_config()
-		iteracion_avance = 0  # Reiniciar contador
 
-		# Ejecutar la lógica principal del programa
-		inicio_programa(configuracion)
-		creacion_carpetas_destino(configuracion)
-		procesamiento_imagenes(configuracion)
-		debug(configuracion, 'FIN DEL PROGRAMA.', '')
+		# Ejecutar la lógica principal en un hilo en segundo plano, para que la GUI responda y la ejecución se pueda cancelar
+		start_background_run(configuracion, workspace_path, copy_dir)
 		
+# =============================================
+# Vista de Avance
+# =============================================
+class ProgressView(object):
+	"""
+	Ventana no modal que muestra el avance de una ejecución en segundo plano (puntos terminados,
+	cuadros por segundo y tiempo restante, ver SeguimientoAvance) y permite cancelarla. Un timer de Swing la actualiza en
+	el hilo de eventos.
+	"""
+	def __init__(self):
+		self.frame = JDialog(None, "AutoStabilizer - v1.4.4 - Avance", ModalityType.MODELESS)
+		self.frame.setLayout(BorderLayout())
+		self.frame.setDefaultCloseOperation(JDialog.DO_NOTHING_ON_CLOSE)
+		panel = JPanel(GridLayout(4, 1, 5, 5))
+		panel.setBorder(BorderFactory.createEmptyBorder(15, 15, 15, 15))
+		panel.setBackground(Color(255, 255, 255))
+		self.lbl_points = JLabel("Puntos: 0 / 0")
+		self.lbl_rate = JLabel("Cuadros/s: -")
+		self.lbl_eta = JLabel("Tiempo restante: -")
+		self.lbl_status = JLabel("Procesando...")
+		for label in [self.lbl_points, self.lbl_rate, self.lbl_eta, self.lbl_status]:
+			label.setFont(Font("Arial", Font.PLAIN, 14))
+			panel.add(label)
+		btn_panel = JPanel(FlowLayout(FlowLayout.RIGHT, 10, 10))
+		self.btn_cancel = JButton("Cancelar", background=Color(220, 53, 69), foreground=Color.WHITE)
+		self.btn_cancel.setFont(Font("Arial", Font.BOLD, 12))
+		self.btn_cancel.addActionListener(lambda e: self.cancel())
+		btn_panel.add(self.btn_cancel)
+		self.frame.add(panel, BorderLayout.CENTER)
+		self.frame.add(btn_panel, BorderLayout.SOUTH)
+		self.timer = Timer(500, lambda e: self.refresh())
+
+	def show(self):
+		self.frame.setSize(400, 220)
+		self.frame.setLocationRelativeTo(None)  # Centrar ventana
+		self.frame.setVisible(True)
+		self.timer.start()
+
+	def refresh(self):
+		transcurrido = time.time() - inicio_avance if inicio_avance else 0
+		fraccion, tasa, restante = seguimiento_avance.estado()
+		self.lbl_points.setText("Puntos: %d / %d (%.0f%%)" % (iteracion_avance, total_avance, fraccion * 100))
+		if transcurrido > 0:
+			self.lbl_rate.setText("Cuadros/s: %.1f" % (cuadros_avance / transcurrido) + ("  (%.1f MB/s)" % (tasa / 1048576.0) if tasa else ""))
+		if restante is not None:
+			self.lbl_eta.setText("Tiempo restante: %s" % formato_duracion(restante))
+
+	def cancel(self):
+		# Los workers se detienen después del cuadro que están leyendo (ver verifica_cancelacion)
+		evento_cancelacion.set()
+		self.btn_cancel.setEnabled(False)
+		self.lbl_status.setText("Cancelando después del cuadro actual...")
+		IJ.log("Cancelación solicitada.")
+
+	def finish(self, mensaje):
+		self.timer.stop()
+		self.refresh()
+		self.lbl_status.setText(mensaje)
+		self.btn_cancel.setText("Cerrar")
+		for listener in self.btn_cancel.getActionListeners():
+			self.btn_cancel.removeActionListener(listener)
+		self.btn_cancel.addActionListener(lambda e: self.frame.dispose())
+		self.btn_cancel.setEnabled(True)
+
+def formato_duracion(segundos):
+	"""
+	Formatea una cantidad de segundos como H:MM:SS.
+	"""
+	segundos = int(segundos)
+	return "%d:%02d:%02d" % (segundos // 3600, segundos % 3600 // 60, segundos % 60)
+
+def start_background_run(configuracion, workspace_path, copy_dir):
+	"""
+	Ejecuta ejecuta_programa en un hilo en segundo plano y muestra su avance, para que el hilo de
+	eventos quede libre y la ejecución se pueda cancelar. Debe llamarse en el hilo de eventos.
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración.
+	workspace_path (str): Espacio de trabajo creado por setup_workspace.
+	copy_dir (str): Carpeta con los pocillos a procesar.
+
+	Retorno:
+	Thread: El hilo que procesa la placa.
+	"""
+	evento_cancelacion.clear()
+	view = ProgressView()
+	view.show()
+	def run():
+		mensaje = "Terminado."
+		try:
+			ejecuta_programa(configuracion, workspace_path, copy_dir)
+			if evento_cancelacion.isSet():
+				mensaje = "Cancelado. Se conservaron los videos terminados."
+		except Exception as e:
+			mensaje = "Error: %s" % str(e)
+			IJ.log("Error durante el procesamiento: {}".format(str(e)))
+		SwingUtilities.invokeLater(lambda: view.finish(mensaje))
+	worker = threading.Thread(target=run, name="AutoStabilizer processing")
+	worker.start()
+	return worker
+
 # ==============================================
 # Funciones de adaptadores y manejo de ventana
 # =============================================
@@ -306,17 +457,312 @@ def update_config(workspace_path):
 	except Exception as e:
 		IJ.log("Error actualizando Config.txt: {}".format(str(e)))
 
-def copy_to_input(dest_dir, source_dir):
+class CopyTask(Callable):
+	"""
+	Copia un archivo para copy_to_input. Los datos se escriben en '<archivo>.part' y se renombran al
+	terminar, para que una copia interrumpida nunca deje un archivo que parezca completo, y se conserva
+	la fecha de modificación del origen para que la siguiente sincronización pueda omitir el archivo.
+	on_done, si se indica, se llama al terminar la tarea, se haya copiado el archivo o no.
+	"""
+	def __init__(self, source, target, on_done=None):
+		self.source = source
+		self.target = target
+		self.on_done = on_done
+
+	def call(self):
+		try:
+			partial = Paths.get(self.target + '.part')
+			Files.copy(Paths.get(self.source), partial, StandardCopyOption.REPLACE_EXISTING, StandardCopyOption.COPY_ATTRIBUTES)
+			Files.move(partial, Paths.get(self.target), StandardCopyOption.REPLACE_EXISTING)
+			return os.path.getsize(self.target)
+		finally:
+			if self.on_done is not None:
+				self.on_done()
+
+def file_md5(path, prefix=''):
+	"""
+	Retorna el resumen MD5 hexadecimal de un archivo, opcionalmente precedido por un prefijo de texto.
+	"""
+	digest = hashlib.md5()
+	digest.update(prefix)
+	with open(path, 'rb') as data_file:
+		block = data_file.read(1 << 20)
+		while block:
+			digest.update(block)
+			block = data_file.read(1 << 20)
+	return digest.hexdigest()
+
+def file_unchanged(source, target, compare):
+	"""
+	Retorna True si target ya es una copia actualizada de source: mismo tamaño y fecha de modificación
+	(compare 'SizeMtime'), o mismo tamaño y hash MD5 (compare 'Hash').
+	"""
+	if not os.path.isfile(target) or os.path.getsize(source) != os.path.getsize(target):
+		return False
+	if compare == 'Hash':
+		return file_md5(source) == file_md5(target)
+	# Dos segundos de tolerancia para sistemas de archivos con fechas poco precisas (FAT, carpetas de red)
+	return abs(os.path.getmtime(source) - os.path.getmtime(target)) <= 2
+
+def copy_to_input(dest_dir, source_dir, configuracion=None, readiness=None):
+	"""
+	Sincroniza cada carpeta de source_dir en dest_dir.
+
+	Solo se copian los archivos nuevos o modificados (ver file_unchanged; SyncCompare 'SizeMtime' por
+	defecto o 'Hash'), en CopyStreams hilos de copia paralelos (por defecto 4). Las carpetas que ya existen
+	se completan en lugar de abortar la copia, por lo que una copia interrumpida se retoma ejecutándola de nuevo.
+	El número de archivos, el volumen y la velocidad se informan en el log de ImageJ.
+	Los pocillos se recorren y copian en el orden de ReadFolders, para que los primeros en procesarse lleguen
+	primero, y cada pocillo empieza a copiarse apenas se recorre.
+	Una cancelación desde la vista de progreso detiene el recorrido, descarta las copias en cola e
+	interrumpe las que están en curso; la siguiente ejecución completa la copia.
+
+	Parámetros:
+		dest_dir (str): InputFolder del workspace.
+		source_dir (str): Carpeta seleccionada en la GUI.
+		configuracion (dict): Diccionario de configuración (claves opcionales CopyStreams y SyncCompare).
+		readiness (InputReadiness): Opcional, recibe cada carpeta una vez copiados todos sus archivos.
+	"""
+	configuracion = configuracion or {}
+	compare = configuracion.get('SyncCompare') or 'SizeMtime'
+	streams = max(1, obtiene_config_entero(configuracion, 'CopyStreams', 4))
+	start = time.time()
 	try:
-		for item in os.listdir(source_dir):
-			src_path = os.path.join(source_dir, item)
-			if os.path.isdir(src_path):
+		copied = {}
+		skipped = {}
+		pending = {}
+		lock = threading.Lock()
+		def release(item):
+			# Se llama una vez por archivo copiado y una vez al terminar el recorrido del pocillo
+			with lock:
+				pending[item] = pending[item] - 1
+				complete = not pending[item]
+			if complete and readiness is not None:
+				readiness.mark_ready(item)
+		futures = []
+		total_bytes = 0
+		errors = 0
+		order = [folder.strip() for folder in (configuracion.get('ReadFolders') or '').split(',')]
+		items = sorted(os.listdir(source_dir), key=lambda item: (order.index(item) if item in order else len(order), item))
+		pool = Executors.newFixedThreadPool(streams)
+		try:
+			for item in items:
+				if evento_cancelacion.isSet():
+					break
+				src_path = os.path.join(source_dir, item)
+				if not os.path.isdir(src_path):
+					continue
+				copied[item] = 0
+				skipped[item] = 0
+				pending[item] = 1
 				dest_path = os.path.join(dest_dir, item)
-				copytree(src_path, dest_path)
-				IJ.log("Carpeta copiada: {}".format(item))
+				# Los archivos de cada pocillo se encolan apenas se recorre, así su copia empieza (y con
+				# CopyOverlap su procesamiento) mientras los siguientes pocillos todavía se comparan
+				for root, dirs, files in os.walk(src_path):
+					if evento_cancelacion.isSet():
+						break
+					target_root = os.path.normpath(os.path.join(dest_path, os.path.relpath(root, src_path)))
+					if not os.path.exists(target_root):
+						os.makedirs(target_root)
+					for name in files:
+						source = os.path.join(root, name)
+						target = os.path.join(target_root, name)
+						if file_unchanged(source, target, compare):
+							skipped[item] = skipped[item] + 1
+						else:
+							with lock:
+								pending[item] = pending[item] + 1
+							task = CopyTask(source, target, lambda item=item: release(item))
+							futures.append((item, task, pool.submit(task)))
+				release(item)
+			for item, task, future in futures:
+				# Se consulta periódicamente para que una cancelación no espere la copia de los archivos restantes
+				while not future.isDone() and not evento_cancelacion.isSet():
+					evento_cancelacion.wait(0.5)
+				if evento_cancelacion.isSet():
+					break
+				try:
+					total_bytes = total_bytes + future.get()
+					copied[item] = copied[item] + 1
+				except Exception as e:
+					errors = errors + 1
+					IJ.log("Error copiando {}: {}".format(task.source, str(e)))
+			if evento_cancelacion.isSet():
+				# Las copias en cola se descartan y las en curso se interrumpen; una copia parcial queda en su .part
+				dropped = len([future for item, task, future in futures if future.cancel(True)])
+				IJ.log("Copia cancelada: {} archivos sin copiar".format(dropped))
+		finally:
+			pool.shutdown()
+		for item in sorted(copied):
+			IJ.log("Carpeta copiada: {} ({} archivos nuevos o modificados, {} sin cambios)".format(item, copied[item], skipped[item]))
+		seconds = max(time.time() - start, 0.001)
+		IJ.log("Copia finalizada: {} archivos, {:.1f} MB en {:.1f} s ({:.1f} MB/s, {} hilos), {} sin cambios, {} errores".format(
+			sum(copied.values()), total_bytes / 1048576.0, seconds, total_bytes / 1048576.0 / seconds, streams,
+			sum(skipped.values()), errors))
 	except Exception as e:
 		IJ.log("Error copiando archivos: {}".format(str(e)))
 
+def ingest_input(configuracion, dest_dir, source_dir, readiness=None):
+	"""
+	Deja la adquisición de origen disponible como entrada de la ejecución, según Ingest:
+	  - 'Copy' (por defecto): copia los archivos nuevos o modificados de cada carpeta en InputFolder (ver copy_to_input).
+	  - 'InPlace': procesa directamente la carpeta de origen; InputFolder apunta a ella en esta ejecución.
+	  - 'Symlink': crea un enlace simbólico por carpeta en InputFolder.
+	  - 'Hardlink': recrea las carpetas en InputFolder y crea un enlace duro por archivo (solo en la
+	    misma unidad; los archivos que no se pueden enlazar se copian).
+
+	Parámetros:
+		configuracion (dict): Diccionario de configuración.
+		dest_dir (str): InputFolder del workspace.
+		source_dir (str): Carpeta seleccionada en la GUI.
+		readiness (InputReadiness): Opcional, recibe cada carpeta de pocillo una vez completa.
+	"""
+	mode = configuracion.get('Ingest') or 'Copy'
+	if mode == 'InPlace':
+		configuracion['InputFolder'] = source_dir
+		IJ.log("Procesando la carpeta de origen sin copiarla: {}".format(source_dir))
+	elif mode in ('Symlink', 'Hardlink'):
+		link_to_input(dest_dir, source_dir, mode == 'Hardlink', readiness)
+	else:
+		if mode != 'Copy':
+			IJ.log("Valor de Ingest invalido, se copiaran los archivos: {}".format(mode))
+		copy_to_input(dest_dir, source_dir, configuracion, readiness)
+
+def hardlink_folder(src_path, dest_path):
+	"""
+	Recrea las carpetas de src_path en dest_path y crea un enlace duro por archivo. Los enlaces duros
+	solo funcionan dentro de una unidad, así que los archivos que no se pueden enlazar se copian.
+
+	Retorno:
+	int: Número de archivos copiados en lugar de enlazados.
+	"""
+	copied = 0
+	for root, dirs, files in os.walk(src_path):
+		target_root = os.path.join(dest_path, os.path.relpath(root, src_path))
+		if not os.path.exists(target_root):
+			os.makedirs(target_root)
+		for name in files:
+			source = Paths.get(os.path.join(root, name))
+			target = Paths.get(os.path.join(target_root, name))
+			try:
+				Files.createLink(target, source)
+			except Exception:
+				Files.copy(source, target, StandardCopyOption.COPY_ATTRIBUTES)
+				copied = copied + 1
+	return copied
+
+def link_to_input(dest_dir, source_dir, hardlink, readiness=None):
+	"""
+	Enlaza las carpetas de source_dir en dest_dir en lugar de copiar su contenido.
+
+	Cada pocillo se enlaza por separado: un pocillo que falla se registra y los demás se enlazan igual.
+	Cuando no se puede crear un enlace simbólico (en Windows requiere el Modo de desarrollador o el
+	privilegio SeCreateSymbolicLink), los archivos de ese pocillo se enlazan con enlaces duros o se copian.
+
+	Parámetros:
+		dest_dir (str): InputFolder del workspace.
+		source_dir (str): Carpeta seleccionada en la GUI.
+		hardlink (bool): True para crear un enlace duro por archivo, False para un enlace simbólico por carpeta.
+		readiness (InputReadiness): Opcional, recibe cada carpeta una vez enlazada, o cuando falló su enlace.
+	"""
+	try:
+		items = os.listdir(source_dir)
+	except OSError as e:
+		IJ.log("Error enlazando archivos: {}".format(str(e)))
+		return
+	for item in items:
+		if evento_cancelacion.isSet():
+			IJ.log("Enlace cancelado antes de: {}".format(item))
+			break
+		src_path = os.path.join(source_dir, item)
+		if not os.path.isdir(src_path):
+			continue
+		dest_path = os.path.join(dest_dir, item)
+		try:
+			if os.path.exists(dest_path):
+				IJ.log("La carpeta ya existe en la entrada, no se enlaza: {}".format(item))
+				continue
+			if not hardlink:
+				try:
+					Files.createSymbolicLink(Paths.get(dest_path), Paths.get(os.path.abspath(src_path)))
+					IJ.log("Carpeta enlazada: {}".format(item))
+					continue
+				except Exception as e:
+					IJ.log("No se pudo crear un enlace simbólico para {} ({}), se enlazan sus archivos".format(item, str(e)))
+			copied = hardlink_folder(src_path, dest_path)
+			if copied:
+				IJ.log("Carpeta enlazada: {} ({} archivos copiados porque no se pudieron enlazar)".format(item, copied))
+			else:
+				IJ.log("Carpeta enlazada: {}".format(item))
+		except Exception as e:
+			IJ.log("Error enlazando la carpeta {}: {}".format(item, str(e)))
+		finally:
+			# También tras un error, para que ningún worker espere un pocillo que no se enlazará
+			if readiness is not None:
+				readiness.mark_ready(item)
+
+class InputReadiness(object):
+	"""
+	Registra las carpetas de pocillo cuya copia en InputFolder está completa, para que el procesamiento
+	pueda comenzar en un pocillo mientras los siguientes todavía se copian (ver start_ingest).
+	"""
+	def __init__(self):
+		self.ready = set()
+		self.finished = False
+		self.condition = threading.Condition()
+
+	def mark_ready(self, item):
+		with self.condition:
+			self.ready.add(item)
+			self.condition.notifyAll()
+
+	def finish(self):
+		with self.condition:
+			self.finished = True
+			self.condition.notifyAll()
+
+	def is_ready(self, item):
+		with self.condition:
+			return item in self.ready or self.finished
+
+	def wait_for(self, item):
+		with self.condition:
+			while item not in self.ready and not self.finished:
+				self.condition.wait()
+
+def start_ingest(configuracion, dest_dir, source_dir):
+	"""
+	Ejecuta ingest_input. Con CopyOverlap=True y una ingesta 'Copy' o 'Hardlink', se ejecuta en un hilo
+	en segundo plano, y cada pocillo pasa a procesamiento_imagenes apenas sus archivos están en
+	InputFolder, de modo que la copia de los pocillos restantes se superpone con el procesamiento.
+
+	Parámetros:
+		configuracion (dict): Diccionario de configuración.
+		dest_dir (str): InputFolder del workspace.
+		source_dir (str): Carpeta seleccionada en la GUI.
+
+	Retorno:
+		threading.Thread: El hilo de ingesta en curso, que se espera después del procesamiento, o None
+		                  si la ingesta ya terminó.
+	"""
+	global input_readiness
+	input_readiness = None
+	mode = configuracion.get('Ingest') or 'Copy'
+	if configuracion.get('CopyOverlap') != 'True' or mode not in ('Copy', 'Hardlink'):
+		ingest_input(configuracion, dest_dir, source_dir)
+		return None
+	readiness = InputReadiness()
+	input_readiness = readiness
+	def run():
+		try:
+			ingest_input(configuracion, dest_dir, source_dir, readiness)
+		finally:
+			# Libera a los workers que aún esperan un pocillo que no se copió
+			readiness.finish()
+	thread = threading.Thread(target=run, name='AutoStabilizer ingest')
+	thread.start()
+	return thread
+
 def _update_config_checkbox(config_key, is_selected):
 	"""
 	Actualiza el archivo Config.txt cuando se marca o desmarca una casilla de selección.
@@ -570,27 +1016,140 @@ def _on_accept(frame, work_dir, copy_dir):
 	workspace_path = setup_workspace(work_dir)
 	if workspace_path:
 		update_config(workspace_path)
-		copy_to_input(os.path.join(workspace_path, "InputFolder"), copy_dir)
 
 		# Cerrar GUI y cargar configuración
 		frame.dispose()
-		global configuracion, iteracion_avance
+		global configuracion
 		configuracion = abre_archivo_config()
-		iteracion_avance = 0  # Reiniciar contador
 
-		# Ejecutar lógica principal
-		inicio_programa(configuracion)
-		creacion_carpetas_destino(configuracion)
-		procesamiento_imagenes(configuracion)
-		debug(configuracion, 'FIN DEL PROGRAMA.', '')
+		# Ejecutar lógica principal en un hilo en segundo plano
+		start_background_run(configuracion, workspace_path, copy_dir)
 
 # =============================================
 # Funciones de Ricardo
 # =============================================
 
+class EscritorLog(object):
+	"""
+	Escribe las líneas de log() desde un único hilo en segundo plano, así los workers solo las encolan.
+
+	El archivo de log de cada LogFolder se mantiene abierto y se vacía a disco después de cada lote de
+	líneas (a lo sumo SEGUNDOS_VACIADO después de encolar una línea). Al cambiar la fecha se pasa al
+	archivo del nuevo día, y el hilo se detiene, cerrando los archivos, tras SEGUNDOS_INACTIVO sin
+	líneas; la siguiente línea lo vuelve a iniciar.
+	"""
+	SEGUNDOS_VACIADO = 1
+	SEGUNDOS_INACTIVO = 30
+
+	def __init__(self):
+		self.cola = LinkedBlockingQueue()
+		self.lock = threading.Lock()
+		self.hilo = None
+		self.archivos = {}   # LogFolder -> (ruta del archivo de log, archivo abierto)
+
+	def escribe(self, log_folder, message):
+		"""
+		Encola una línea del archivo de log de log_folder. Se puede llamar desde cualquier hilo.
+		"""
+		self.cola.put((log_folder, datetime.now(), message))
+		if self.hilo is None:
+			self.inicia()
+
+	def vacia(self, espera=10):
+		"""
+		Espera a que las líneas encoladas hasta ahora estén escritas en disco (a lo sumo espera segundos).
+		"""
+		escrito = threading.Event()
+		self.cola.put(escrito)
+		if self.hilo is None:
+			self.inicia()
+		escrito.wait(espera)
+
+	def inicia(self):
+		with self.lock:
+			if self.hilo is None:
+				self.hilo = threading.Thread(target=self.ejecuta, name='AutoStabilizer log')
+				self.hilo.setDaemon(True)
+				self.hilo.start()
+
+	def ejecuta(self):
+		try:
+			self.procesa_cola()
+		finally:
+			with self.lock:
+				# Tras un error inesperado un hilo nuevo se encarga de las líneas que siguen en la cola
+				if self.hilo is threading.current_thread():
+					self.hilo = None
+			if self.hilo is None and not self.cola.isEmpty():
+				self.inicia()
+
+	def procesa_cola(self):
+		inactivo = 0
+		while True:
+			item = self.cola.poll(self.SEGUNDOS_VACIADO, TimeUnit.SECONDS)
+			if item is None:
+				inactivo += self.SEGUNDOS_VACIADO
+				if inactivo < self.SEGUNDOS_INACTIVO:
+					continue
+				with self.lock:
+					# Se limpia antes de la verificación: una línea encolada después inicia un hilo nuevo
+					hilo, self.hilo = self.hilo, None
+					if self.cola.isEmpty():
+						self.cierra_archivos()
+						return
+					self.hilo = hilo
+				continue
+			inactivo = 0
+			# Todo lo ya encolado se escribe como un lote con un solo vaciado por archivo
+			marcas = []
+			while item is not None:
+				if isinstance(item, tuple):
+					self.escribe_linea(*item)
+				else:
+					marcas.append(item)
+				item = self.cola.poll()
+			for ruta, log_file in self.archivos.values():
+				try:
+					log_file.flush()
+				except IOError:
+					pass
+			for marca in marcas:
+				marca.set()
+
+	def escribe_linea(self, log_folder, ahora, message):
+		try:
+			ruta = os.path.join(log_folder, "Log_%s.txt" % ahora.strftime("%Y_%m_%d"))
+			actual = self.archivos.get(log_folder)
+			if actual is None or actual[0] != ruta:
+				if actual is not None:
+					# Cambio de día: se cierra el archivo del día anterior
+					actual[1].close()
+					del self.archivos[log_folder]
+				# Crear LogFolder si no existe
+				if not os.path.exists(log_folder):
+					os.makedirs(log_folder)
+				actual = (ruta, open(ruta, 'a'))
+				self.archivos[log_folder] = actual
+			actual[1].write("%s || %s\n" % (ahora.strftime('%Y-%m-%d %H:%M:%S'), message))
+		except Exception as e:
+			# Cualquier error (un LogFolder ausente, una línea que no se puede codificar) pierde solo esa línea
+			print("%s || ERROR: No se pudo escribir en el archivo de log: %s" % (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), e))
+
+	def cierra_archivos(self):
+		for ruta, log_file in self.archivos.values():
+			try:
+				log_file.close()
+			except IOError:
+				pass
+		self.archivos = {}
+
+escritor_log = EscritorLog()   # Escritor de log compartido por todos los hilos (ver log)
+atexit.register(escritor_log.vacia)
+
 def log(config, message):
 	"""
-	Registra un mensaje en el archivo de log definido en la configuración.
+	Registra un mensaje en el archivo de log definido en la configuración. La línea la escribe el
+	escritor de log en segundo plano (ver EscritorLog), así la llamada no espera al disco.
 
 	Parámetros:
 	config (dict): Diccionario con la configuración del sistema. Debe contener la clave 'LogFolder'.
@@ -602,20 +1161,7 @@ def log(config, message):
 	Ejemplo de uso:
 		log(config, "Proceso iniciado correctamente.")
 	"""
-	log_folder = config.get('LogFolder')
-	
-	# Genera un nombre de archivo con la fecha actual en formato Log_AAAA_MM_DD.txt.
-	log_file_name = "Log_%s.txt" % datetime.now().strftime("%Y_%m_%d")
-	log_file_path = os.path.join(log_folder, log_file_name)
-	
-	try:
-		# Crear LogFolder si no existe
-		if not os.path.exists(log_folder):
-			os.makedirs(log_folder)
-		with open(log_file_path, 'a') as log_file:
-			log_file.write("%s || %s\n" % (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), message))
-	except IOError:
-		print("%s || ERROR: No se pudo escribir en el archivo de log." % datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+	escritor_log.escribe(config.get('LogFolder'), message)
 
 def valida_datos(config):
 	"""
@@ -632,17 +1178,31 @@ def valida_datos(config):
 	"""
 	# Definir Claves presentes en Config
 	variables= ['LogFolder','InputFolder','OutputFolder','ReadFolders','CreateFolders','BrightFoldersPoint','Debug','Avance','Visor','Dev','ENDPOINT','PREDICTION_KEY']
+	# El backend de orientación local no usa el servicio de Custom Vision
+	if config.get('OrientationBackend') == 'Local':
+		variables = variables[:-2]
 	for variable in variables:
 		if variable not in config or not config[variable]:
 			print("\n%s || ERROR: La variable '%s' no existe o no contiene datos." % (datetime.now(),variable))
 			sys.exit(1)
+	# Sin modelo el backend local dejaría todos los puntos sin invertir
+	if config.get('OrientationBackend') == 'Local':
+		ruta = ruta_modelo_local(config)
+		try:
+			ClasificadorOrientacionLocal.carga(ruta)
+		except (IOError, OSError, KeyError, ValueError) as e:
+			print("\n%s || ERROR: OrientationBackend=Local necesita un modelo local, no se puede leer '%s' (%s). "
+				  "Créelo con una ejecución CustomVision y TrainLocalModel=True, o defina LocalModel." % (datetime.now(), ruta, e))
+			sys.exit(1)
 
-def abre_archivo_config():
+def abre_archivo_config(ruta_config='Config.txt', reemplazos=None):
 	"""
 	Lee el archivo 'Config.txt', parsea sus líneas y retorna un diccionario con los parámetros.
 
 	Parámetros:
-	(No recibe parámetros, utiliza ruta fija 'Config.txt'.)
+	ruta_config (str): Ruta del archivo de configuración (por defecto 'Config.txt').
+	reemplazos (dict): Valores que reemplazan a los del archivo antes de la validación
+	                   (usado por la línea de comandos sin GUI, que no reescribe Config.txt).
 
 	Retorno:
 	dict: Diccionario con los valores de configuración cargados.
@@ -653,7 +1213,6 @@ def abre_archivo_config():
 	config = {}
 
 	# Abrir el archivo de configuración
-	ruta_config = 'Config.txt'
 	try:
 		with open(ruta_config, 'r') as archivo:
 			for linea in archivo:   
@@ -664,11 +1223,16 @@ def abre_archivo_config():
 					valor = valor.strip()
 					# Almacenar en el diccionario
 					config[clave] = valor
+			if reemplazos:
+				config.update(reemplazos)
 			valida_datos(config)
 			#si 'DEV' está habilitado, sobreescribe valores de 'ReadFolders' y 'BrightFoldersPoint'
 			if config.get('Dev') == 'True':
 				config.update({"BrightFoldersPoint": "POINT 00001\\BRIGHT,POINT 00002\\BRIGHT"})
 				config.update({'ReadFolders':'A01'})
+			# Los puntos se escriben con separadores de Windows ('POINT 00001\\BRIGHT'); se convierten a los
+			# del sistema, así el mismo Config.txt también funciona en Linux (ej. nodos de render sin GUI)
+			config['BrightFoldersPoint'] = config['BrightFoldersPoint'].replace('\\', os.sep).replace('/', os.sep)
 			return config
 	except IOError:
 		print('Error: no se encontro el archivo %s o no se pudo abrir.' % (ruta_config))
@@ -747,201 +1311,3313 @@ def debug(configuracion,mensaje,variable):
 		print('%s || %s %s' % (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), mensaje, variable))
 	log(configuracion, mensaje + variable)
 
-def avance(folderNames,BrightNames):
+class SeguimientoAvance(object):
+	"""
+	Avance de una ejecución ponderado por los bytes de cada punto, medidos por el escaneo previo al
+	procesamiento, para que una carpeta inexistente o un video reanudado no cuente como un punto con
+	cientos de cuadros. El rendimiento es un promedio móvil exponencial (SUAVIZADO) de muestras de al
+	menos SEGUNDOS_MUESTRA, y el tiempo restante son los bytes restantes divididos por él.
+	"""
+	SUAVIZADO = 0.3
+	SEGUNDOS_MUESTRA = 1.0
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.reinicia()
+
+	def reinicia(self):
+		with self.lock:
+			self.planificados = {}   # (OutputFolder, pocillo, punto) -> bytes esperados
+			self.esperado = 0
+			self.hecho = 0
+			self.tasa = None
+			self.bytes_muestra = 0
+			self.inicio_muestra = time.time()
+
+	def agrega_trabajos(self, placa, trabajos, tamanos):
+		"""
+		Agrega los trabajos (pocillo, punto) de una placa con su tamaño en bytes (None si aún no se conoce).
+		"""
+		conocidos = [tamano for tamano in tamanos if tamano is not None]
+		# Un punto que aún no se pudo listar (ej. todavía se está copiando) cuenta como uno promedio
+		promedio = sum(conocidos) / len(conocidos) if conocidos else 1
+		with self.lock:
+			for (newFolderName, BrightName), tamano in zip(trabajos, tamanos):
+				peso = promedio if tamano is None else tamano
+				self.planificados[(placa, newFolderName, BrightName)] = peso
+				self.esperado += peso
+
+	def comienza(self):
+		with self.lock:
+			self.inicio_muestra = time.time()
+
+	def termina(self, placa, resultado):
+		"""
+		Reemplaza el tamaño esperado de un trabajo terminado por los bytes que realmente procesó.
+		"""
+		procesados = resultado['bytes_read'] if resultado['status'] == 'done' else 0
+		ahora = time.time()
+		with self.lock:
+			self.esperado += procesados - self.planificados.pop((placa, resultado['well'], resultado['point']), 0)
+			self.hecho += procesados
+			if not procesados:
+				if self.tasa is None and not self.bytes_muestra:
+					# Los puntos omitidos antes del primero procesado no bajan el rendimiento
+					self.inicio_muestra = ahora
+				return
+			self.bytes_muestra += procesados
+			transcurrido = ahora - self.inicio_muestra
+			if transcurrido >= self.SEGUNDOS_MUESTRA:
+				muestra = self.bytes_muestra / transcurrido
+				self.tasa = muestra if self.tasa is None else self.SUAVIZADO * muestra + (1 - self.SUAVIZADO) * self.tasa
+				self.bytes_muestra = 0
+				self.inicio_muestra = ahora
+
+	def estado(self):
+		"""
+		Retorna (fracción terminada, rendimiento en bytes/s o None, segundos restantes o None).
+		"""
+		with self.lock:
+			if self.esperado:
+				fraccion = min(1.0, float(self.hecho) / self.esperado)
+			else:
+				fraccion = 0.0 if self.planificados else 1.0
+			restante = None
+			if self.tasa:
+				restante = max(0, self.esperado - self.hecho) / self.tasa
+			return fraccion, self.tasa, restante
+
+seguimiento_avance = SeguimientoAvance()   # Avance ponderado de la ejecución (ver avance)
+
+def avance(folderNames, BrightNames, resultado=None, placa=None):
 	"""
-	Incrementa un contador global para indicar el progreso del procesamiento y registra el porcentaje completado.
+	Incrementa un contador global para indicar el progreso del procesamiento y, con Avance=True, registra
+	e imprime el porcentaje completado (ponderado por bytes, ver SeguimientoAvance), el rendimiento y el
+	tiempo restante.
 
 	Parámetros:
 	folderNames (list): Lista de carpetas a procesar.
 	BrightNames (list): Lista de subcarpetas (ej. 'BRIGHT').
+	resultado (dict): Registro de resultado del trabajo terminado (ver procesa_punto).
+	placa (str): OutputFolder de la placa del trabajo.
 
 	Retorno:
 	None. (Efecto colateral: imprime el porcentaje de progreso por consola y en el log.)
 
 	Ejemplo de uso:
-	avance(folderNames, BrightNames)
+	avance(folderNames, BrightNames, resultado, configuracion.get('OutputFolder'))
 	"""
 	global iteracion_avance
-	if configuracion.get('Avance') == 'True':
+	# El contador es compartido por todos los workers, por lo que el incremento y la lectura se hacen bajo el lock.
+	# Siempre se actualiza porque la vista de avance lo lee
+	with lock_avance:
 		iteracion_avance = iteracion_avance + 1
-		porcentaje = float(iteracion_avance) / (len(folderNames)*len(BrightNames)) * 100
-		mensaje = '%.2f%% completado.' % porcentaje
-		debug(configuracion, mensaje, '')
+		puntos = iteracion_avance
+	if resultado is not None:
+		seguimiento_avance.termina(placa, resultado)
+	if configuracion.get('Avance') == 'True':
+		fraccion, tasa, restante = seguimiento_avance.estado()
+		mensaje = '%.2f%% completado (%d de %d puntos, %s MB/s, tiempo restante %s).' % (
+			fraccion * 100, puntos, total_avance or len(folderNames)*len(BrightNames),
+			'%.1f' % (tasa / 1048576.0) if tasa else '-', formato_duracion(restante) if restante is not None else '-')
+		# También se imprime sin Debug, para poder seguir por consola una ejecución sin GUI
+		print('%s || %s' % (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), mensaje))
+		log(configuracion, mensaje)
 
-def orientacion(configuracion,NewDire):
+class ProcesamientoCancelado(Exception):
 	"""
-	Verifica la orientación de la primera imagen en la carpeta y decide si se requiere un cambio de orientación.
+	Lanzada por verifica_cancelacion cuando la ejecución fue cancelada desde la vista de avance.
+	"""
+	pass
+
+def verifica_cancelacion():
+	"""
+	Detiene el trabajo actual cuando se presionó el botón Cancelar de la vista de avance. Se llama
+	antes de cada cuadro que se lee en streaming o se estabiliza, y antes de escribir cada AVI, por lo
+	que una ejecución cancelada se detiene después del cuadro en proceso. Abrir y convertir una pila
+	completa no se puede interrumpir. La ingesta lee evento_cancelacion por su cuenta (ver copy_to_input).
+
+	Ejemplo de uso:
+	verifica_cancelacion()
+	"""
+	if evento_cancelacion.isSet():
+		raise ProcesamientoCancelado('Procesamiento cancelado')
+
+# =============================================
+# Caché de Orientación
+# =============================================
+class CacheOrientacion(object):
+	"""
+	Caché persistente de predicciones de Custom Vision, indexada por un hash del primer cuadro de un punto.
+	Las entradas se mantienen en orden de uso menos reciente y las más antiguas se descartan cuando
+	la caché supera max_entradas. Las entradas nuevas se agregan al archivo apenas se conocen, y
+	guarda() reescribe el archivo con las entradas que quedan.
+	"""
+	def __init__(self, ruta, max_entradas):
+		self.ruta = ruta
+		self.max_entradas = max_entradas
+		self.entradas = {}
+		self.orden = []   # Claves desde la menos hasta la más recientemente usada
+		self.lock = threading.Lock()
+		self.carga()
+
+	def carga(self):
+		if not os.path.exists(self.ruta):
+			return
+		with open(self.ruta, 'r') as archivo:
+			for linea in archivo:
+				linea = linea.strip()
+				if not linea or linea.startswith('#'):
+					continue
+				try:
+					clave, valores = linea.split(',', 1)
+					predicciones = []
+					for valor in valores.split(';'):
+						if valor:
+							tag_name, probability = valor.rsplit(':', 1)
+							predicciones.append((tag_name, float(probability)))
+					self.recuerda(clave, predicciones)
+				except ValueError:
+					continue
+
+	def recuerda(self, clave, predicciones):
+		if clave in self.entradas:
+			self.orden.remove(clave)
+		self.entradas[clave] = predicciones
+		self.orden.append(clave)
+		while len(self.orden) > self.max_entradas:
+			del self.entradas[self.orden.pop(0)]
+
+	def formato(self, clave, predicciones):
+		return '%s,%s\n' % (clave, ';'.join(['%s:%.6f' % (tag_name, probability) for tag_name, probability in predicciones]))
+
+	def obtiene(self, clave):
+		with self.lock:
+			predicciones = self.entradas.get(clave)
+			if predicciones is not None:
+				self.recuerda(clave, predicciones)
+			return predicciones
+
+	def agrega(self, clave, predicciones):
+		with self.lock:
+			self.recuerda(clave, predicciones)
+			with open(self.ruta, 'a') as archivo:
+				archivo.write(self.formato(clave, predicciones))
+
+	def guarda(self):
+		with self.lock:
+			with open(self.ruta, 'w') as archivo:
+				archivo.write('# AutoStabilizer orientation cache\n')
+				for clave in self.orden:
+					archivo.write(self.formato(clave, self.entradas[clave]))
+
+def obtiene_cache_orientacion(configuracion):
+	"""
+	Retorna la caché de orientación de la ejecución, o None si OrientationCache no es 'True'.
+
+	El archivo de la caché es 'orientation_cache.csv' en OrientationCacheFolder (por defecto: LogFolder)
+	y guarda como máximo OrientationCacheSize entradas (por defecto 5000).
 
 	Parámetros:
-	configuracion (dict): Diccionario de configuración, que incluye datos para la conexión a la API (ENDPOINT, PREDICTION_KEY).
-	NewDire (str): Ruta de la carpeta que contiene la secuencia de imágenes.
+	configuracion (dict): Diccionario de configuración.
 
 	Retorno:
-	bool: True si se requiere cambio de orientación; False en caso contrario.
-	(En caso de error o falta de conclusividad, devuelve None o no hace cambio.)
+	CacheOrientacion: La caché compartida por todos los workers, o None.
 
 	Ejemplo de uso:
-   	necesita_flip = orientacion(configuracion, rutaCarpeta)
+	cache = obtiene_cache_orientacion(configuracion)
 	"""
-	ruta_tiff=NewDire + '\\00000.TIFF'
-	ruta_jpg=NewDire + '\\_TIFF_JPG.jpg'
-	imagen = IJ.openImage(ruta_tiff)
-	IJ.saveAs(imagen, 'JPG', ruta_jpg)
-	imagen.close()
-	cambiar_orientacion = conexion_custom_vision(configuracion,ruta_jpg)
-	return cambiar_orientacion
-		
-def conexion_custom_vision(configuracion,ruta_jpg):
+	global cache_orientacion
+	if configuracion.get('OrientationCache') != 'True':
+		return None
+	carpeta = configuracion.get('OrientationCacheFolder') or configuracion.get('LogFolder')
+	ruta = os.path.join(carpeta, 'orientation_cache.csv')
+	with lock_cache:
+		if cache_orientacion is None or cache_orientacion.ruta != ruta:
+			if not os.path.exists(carpeta):
+				os.makedirs(carpeta)
+			cache_orientacion = CacheOrientacion(ruta, max(1, obtiene_config_entero(configuracion, 'OrientationCacheSize', 5000)))
+			debug(configuracion, 'Cache de orientacion: ', '%s (%d entradas)' % (ruta, len(cache_orientacion.orden)))
+	return cache_orientacion
+
+def hash_primer_cuadro(configuracion, ruta_tiff):
 	"""
-	Envía la imagen a la API de Custom Vision, analiza la respuesta JSON y determina la orientación correcta.
+	Retorna el hash MD5 de un archivo de cuadro. El ENDPOINT se incluye en el hash, para que las
+	predicciones guardadas no se reutilicen al cambiar a otro modelo o iteración de Custom Vision.
 
 	Parámetros:
-	configuracion (dict): Configuración con 'ENDPOINT', 'PREDICTION_KEY', etc.
-	ruta_jpg (str): Ruta al archivo JPG que se enviará al servicio.
+	configuracion (dict): Diccionario de configuración.
+	ruta_tiff (str): Ruta al primer cuadro del punto.
 
 	Retorno:
-	bool: True si la imagen está invertida (etiquetada como 'Derecha') y la probabilidad es mayor al umbral.
-	False si está correctamente orientada ('Izquierda') con alta probabilidad.
-	None o no retorna nada en caso de error.
+	str: Resumen hexadecimal.
+	"""
+	return file_md5(ruta_tiff, configuracion.get('ENDPOINT') or '')
 
-	Ejemplo de uso:
-	flip_necesario = conexion_custom_vision(configuracion, "C:/ruta/imagen.jpg")
+# =============================================
+# Cliente de Custom Vision
+# =============================================
+class ClienteCustomVision(object):
 	"""
-	# Configuración de la API
-	ENDPOINT = configuracion.get('ENDPOINT')
-	PREDICTION_KEY = configuracion.get('PREDICTION_KEY')
-	IMAGE_PATH = ruta_jpg
-	
-	# Verificar si la imagen existe
-	if not os.path.exists(IMAGE_PATH):
-		debug(configuracion, 'La imagen de entrada no existe: ', IMAGE_PATH)  # Fix: use comma to separate message and variable.
-		return None
+	Cliente del endpoint de predicción de Custom Vision, compartido por todos los workers de una ejecución.
 
-	# Leer la imagen en binario
-	with open(IMAGE_PATH, "rb") as image_file:
-		image_data = image_file.read()
-	
-	# Crear la conexión HTTP
-	url = URL(ENDPOINT)
-	connection = url.openConnection()
-	connection.setRequestMethod("POST")
-	connection.setRequestProperty("Content-Type", "application/octet-stream")
-	connection.setRequestProperty("Prediction-Key", PREDICTION_KEY)
-	connection.setDoOutput(True)
-	
-	# Enviar los datos de la imagen
-	output_stream = DataOutputStream(connection.getOutputStream())
-	output_stream.write(image_data)
-	output_stream.flush()
-	output_stream.close()
-	
-	# Leer la respuesta de la API
-	response_code = connection.getResponseCode()
-	if response_code == 200:
-		debug(configuracion, "Conexion a modelo custom vision correcta.", "")
-		reader = BufferedReader(InputStreamReader(connection.getInputStream()))
-		response = ""
-		line = reader.readLine()
-		while line is not None:
-			response += line
+	Se envían como máximo max_en_curso consultas al mismo tiempo. Cada consulta tiene un tiempo límite
+	de conexión y de lectura, y los tiempos agotados, errores de conexión y respuestas 429 y 5xx se
+	reintentan hasta 'reintentos' veces con espera exponencial. Las respuestas siempre se leen completas,
+	para que el JDK devuelva la conexión keep-alive a su caché y la siguiente consulta la reutilice.
+	"""
+	def __init__(self, endpoint, prediction_key, max_en_curso=4, tiempo_conexion=10, tiempo_lectura=30, reintentos=2, espera=1.0):
+		self.endpoint = endpoint
+		self.prediction_key = prediction_key
+		self.url = URL(endpoint)
+		self.tiempo_conexion = tiempo_conexion
+		self.tiempo_lectura = tiempo_lectura
+		self.reintentos = reintentos
+		self.espera = espera
+		self.en_curso = Semaphore(max_en_curso)
+
+	def lee_respuesta(self, stream):
+		if stream is None:
+			return ''
+		reader = BufferedReader(InputStreamReader(stream, 'UTF-8'))
+		lineas = []
+		try:
 			line = reader.readLine()
-		reader.close()
-
-		# Parsear el JSON de la respuesta
-		json_response = JSONObject(response)
-		predictions = json_response.getJSONArray("predictions")
-
-		# Confirma orientacion
-		for i in range(predictions.length()):
-			prediction = predictions.getJSONObject(i)
-			tag_name = prediction.getString("tagName")
-			probability = prediction.getDouble("probability")
-			if tag_name == 'Derecha' and probability > 0.7:
-				debug(configuracion, 'Imagen requiere cambio de orientacion debido a que se encuentra orientada de derecha a izquierda. Probabilidad:', "{0:.2f}%".format(probability * 100))
-				return True
-			elif tag_name == 'Izquierda' and probability > 0.7:
-				debug(configuracion, 'Orientacion correcta. Probabilidad:', "{0:.2f}%".format(probability * 100))
-				return False
+			while line is not None:
+				lineas.append(line)
+				line = reader.readLine()
+		finally:
+			reader.close()
+		return ''.join(lineas)
+
+	def envia(self, image_data):
+		connection = self.url.openConnection()
+		connection.setConnectTimeout(int(self.tiempo_conexion * 1000))
+		connection.setReadTimeout(int(self.tiempo_lectura * 1000))
+		connection.setRequestMethod("POST")
+		connection.setRequestProperty("Content-Type", "application/octet-stream")
+		connection.setRequestProperty("Prediction-Key", self.prediction_key)
+		connection.setDoOutput(True)
+		connection.setFixedLengthStreamingMode(len(image_data))
+		output_stream = DataOutputStream(connection.getOutputStream())
+		try:
+			output_stream.write(image_data)
+			output_stream.flush()
+		finally:
+			output_stream.close()
+		response_code = connection.getResponseCode()
+		if response_code == 200:
+			cuerpo = self.lee_respuesta(connection.getInputStream())
+		else:
+			cuerpo = self.lee_respuesta(connection.getErrorStream())
+		return response_code, cuerpo, connection.getHeaderField("Retry-After")
+
+	def predice(self, configuracion, image_data):
+		"""
+		Envía una imagen y retorna sus predicciones como pares (tagName, probability), o None si
+		la consulta sigue fallando después de los reintentos.
+		"""
+		intento = 0
+		while True:
+			self.en_curso.acquire()
+			try:
+				try:
+					response_code, cuerpo, retry_after = self.envia(image_data)
+				except IOException as e:
+					# Incluye los tiempos agotados de conexión y de lectura (SocketTimeoutException)
+					response_code, cuerpo, retry_after = None, str(e), None
+			finally:
+				self.en_curso.release()
+			if response_code == 200:
+				debug(configuracion, "Conexion a modelo custom vision correcta.", "")
+				predictions = JSONObject(cuerpo).getJSONArray("predictions")
+				resultado = []
+				for i in range(predictions.length()):
+					prediction = predictions.getJSONObject(i)
+					resultado.append((prediction.getString("tagName"), prediction.getDouble("probability")))
+				return resultado
+			if response_code is None:
+				debug(configuracion, 'Error de conexion a custom vision: ', cuerpo)
 			else:
-				debug(configuracion, 'Orientacion no concluyente. Probabilidad:', "{0:.2f}%".format(probability * 100))
-		return None
-	else:
-		debug(configuracion, 'Error de conexion a custom vision. Codigo de error:', str(response_code))
-		reader = BufferedReader(InputStreamReader(connection.getErrorStream()))
-		error_response = []
-		line = reader.readLine()
-		while line is not None:
-			error_response.append(line)
-			line = reader.readLine()
-		reader.close()
-		debug(configuracion, 'Tipo de error', str(error_response))
-		return None
+				debug(configuracion, 'Error de conexion a custom vision. Codigo de error:', str(response_code))
+				debug(configuracion, 'Tipo de error', cuerpo)
+			# Los demás errores 4xx (clave o imagen inválida) no se resuelven reintentando
+			reintentable = response_code is None or response_code == 429 or response_code >= 500
+			if not reintentable or intento >= self.reintentos:
+				return None
+			demora = self.espera * (2 ** intento)
+			if retry_after:
+				try:
+					demora = max(demora, float(retry_after))
+				except ValueError:
+					pass
+			debug(configuracion, 'Se reintentara la consulta a custom vision en segundos: ', '%.1f' % demora)
+			time.sleep(demora)
+			intento = intento + 1
 
-def cambio_orientacion(imp):
+def obtiene_cliente_clasificador(configuracion):
 	"""
-	Recorre todos los fotogramas de una pila (stack) y aplica un flip horizontal para invertir la orientación.
+	Retorna el cliente de Custom Vision de la ejecución, creado a partir de ENDPOINT, PREDICTION_KEY y las
+	claves opcionales MaxInFlight (por defecto 4), ConnectTimeout (por defecto 10 s), ReadTimeout
+	(por defecto 30 s), Retries (por defecto 2) y RetryBackoff (por defecto 1 s).
 
 	Parámetros:
-	imp (ImagePlus): Objeto de imagen (pila) abierto en ImageJ.
+	configuracion (dict): Diccionario de configuración.
 
 	Retorno:
-	None. (Efecto colateral: Modifica la pila en memoria.)
+	ClienteCustomVision: El cliente compartido por todos los workers.
 
 	Ejemplo de uso:
-	cambio_orientacion(imp)
+	predicciones = obtiene_cliente_clasificador(configuracion).predice(configuracion, image_data)
 	"""
-	stack = imp.getStack()  # Acceder a los cuadros del video
-	for i in range(1, stack.getSize() + 1):
-		frame = stack.getProcessor(i)
-		frame.flipHorizontal()  # Cambiar orientación horizontalmente
-	debug(configuracion, "Cambio de orientacion realizado en el video.", "")
+	global cliente_clasificador
+	endpoint = configuracion.get('ENDPOINT')
+	prediction_key = configuracion.get('PREDICTION_KEY')
+	with lock_cliente:
+		if (cliente_clasificador is None or cliente_clasificador.endpoint != endpoint
+				or cliente_clasificador.prediction_key != prediction_key):
+			cliente_clasificador = ClienteCustomVision(endpoint, prediction_key,
+				max(1, obtiene_config_entero(configuracion, 'MaxInFlight', 4)),
+				max(0.0, obtiene_config_decimal(configuracion, 'ConnectTimeout', 10.0)),
+				max(0.0, obtiene_config_decimal(configuracion, 'ReadTimeout', 30.0)),
+				max(0, obtiene_config_entero(configuracion, 'Retries', 2)),
+				max(0.0, obtiene_config_decimal(configuracion, 'RetryBackoff', 1.0)))
+	return cliente_clasificador
 
-def procesamiento_imagenes(configuracion):
-	inputFolder = configuracion.get('InputFolder')
-	if inputFolder:
-		folderNames = configuracion.get('ReadFolders').split(',')
-		for newFolderName in folderNames:
-			BrightNames = configuracion.get('BrightFoldersPoint').split(',')
-			for BrightName in BrightNames:
-				# Normalize directory path to remove extra backslashes
-				raw_new_dire = os.path.join(inputFolder, newFolderName, BrightName)
-				NewDire = os.path.normpath(raw_new_dire)
-				debug(configuracion, 'Directorio a abrir: ', NewDire)
-				if os.path.exists(NewDire):
-					cambiar_orientacion = orientacion(configuracion, NewDire)
-					imp = FolderOpener.open(NewDire)
-					if imp:
-						if configuracion.get('Visor') == 'True':
-							imp.show()
-						ij.Prefs.set("options.scaleConversions", True)
-						ic = ImageConverter(imp)
-						ic.setDoScaling(True)
-						ic.convertToGray8()
-						NombreVideo = BrightName[:11] + '.avi'
-						# Normalize output path and create directory if needed
-						output_path = os.path.normpath(os.path.join(configuracion.get('OutputFolder'), newFolderName, NombreVideo))
-						out_dir = os.path.dirname(output_path)
-						if not os.path.exists(out_dir):
-							os.makedirs(out_dir)
-						debug(configuracion, 'Directorio donde se grabara el archivo avi: ', output_path)
-						if cambiar_orientacion:
-							cambio_orientacion(imp)
-						IJ.run(imp, "AVI... ", "compression=None frame=7 save=[" + output_path + "]")
-						debug(configuracion, 'Guardado de archivo finalizado: ', NombreVideo)
-					else:
-						mensaje_error = 'ERROR: No se pudo abrir la secuencia de imagenes de la carpeta %s' % NewDire
-						debug(configuracion, mensaje_error, '')
-				else:
-					mensaje_no_dir = 'No existe directorio para %s\\%s.' % (newFolderName, BrightName)
-					debug(configuracion, mensaje_no_dir, '')
-				avance(folderNames, BrightNames)
+# =============================================
+# Sustituto de Custom Vision
+# =============================================
+class SustitutoCustomVision(HttpHandler):
+	"""
+	Sustituto local del endpoint de predicción de Custom Vision, usado por la autoprueba y el banco de
+	pruebas. Lee la imagen enviada, espera 'latencia' segundos y responde con un arreglo 'predictions'
+	como el servicio real. La orientación depende del tamaño de la imagen enviada, así se prueban ambas
+	orientaciones. 'respuestas' define las primeras respuestas como pares (estado, espera), ej. [(503, 0)],
+	para reproducir errores y tiempos de espera. Se cuentan las solicitudes recibidas y el máximo atendido
+	a la vez.
+	"""
+	def __init__(self, latencia=0.0, respuestas=None):
+		self.latencia = latencia
+		self.respuestas = list(respuestas or [])
+		self.solicitudes = 0
+		self.en_curso = 0
+		self.max_en_curso = 0
+		self.lock = threading.Lock()
+
+	def handle(self, intercambio):
+		with self.lock:
+			self.solicitudes = self.solicitudes + 1
+			self.en_curso = self.en_curso + 1
+			self.max_en_curso = max(self.max_en_curso, self.en_curso)
+			estado, espera = self.respuestas.pop(0) if self.respuestas else (200, self.latencia)
+		try:
+			stream = intercambio.getRequestBody()
+			buffer = jarray.zeros(65536, 'b')
+			tamano = 0
+			leidos = stream.read(buffer)
+			while leidos != -1:
+				tamano = tamano + leidos
+				leidos = stream.read(buffer)
+			if espera:
+				time.sleep(espera)
+			if estado == 200:
+				probabilidad = 0.95 if tamano % 2 == 0 else 0.05
+				cuerpo = ('{"predictions": [{"tagName": "Derecha", "probability": %.2f}, '
+						  '{"tagName": "Izquierda", "probability": %.2f}]}' % (probabilidad, 1.0 - probabilidad))
+			else:
+				cuerpo = '{"error": {"code": "StandIn", "message": "HTTP %d"}}' % estado
+				if estado == 429:
+					intercambio.getResponseHeaders().set("Retry-After", "0")
+			cuerpo = String(cuerpo).getBytes("UTF-8")
+			intercambio.getResponseHeaders().set("Content-Type", "application/json")
+			intercambio.sendResponseHeaders(estado, len(cuerpo))
+			output_stream = intercambio.getResponseBody()
+			try:
+				output_stream.write(cuerpo)
+			finally:
+				output_stream.close()
+		except IOException:
+			# El cliente dejó de esperar (tiempo de lectura) antes de enviar la respuesta
+			pass
+		finally:
+			with self.lock:
+				self.en_curso = self.en_curso - 1
+			intercambio.close()
+
+def inicia_sustituto(manejador):
+	"""
+	Inicia un sustituto de Custom Vision (ver SustitutoCustomVision) en un puerto local libre.
+
+	Retorno:
+	tuple: (servidor, endpoint); se detiene con servidor.stop(0).
+
+	Ejemplo de uso:
+	servidor, endpoint = inicia_sustituto(SustitutoCustomVision(0.2))
+	"""
+	servidor = HttpServer.create(InetSocketAddress("127.0.0.1", 0), 0)
+	servidor.createContext("/", manejador)
+	servidor.setExecutor(Executors.newCachedThreadPool())
+	servidor.start()
+	endpoint = "http://127.0.0.1:%d/customvision/v3.0/Prediction/standin/classify/iterations/standin/image" % servidor.getAddress().getPort()
+	return servidor, endpoint
+
+def ejecuta_autoprueba():
+	"""
+	Prueba el cliente de Custom Vision contra sustitutos locales, sin red: una respuesta normal,
+	respuestas 503 y 429 que se reintentan, un 401 que no, respuestas 5xx y tiempos de lectura que se
+	abandonan tras los reintentos, y MaxInFlight limitando las solicitudes simultáneas. Cada prueba se
+	registra como OK o FALLÓ, con las solicitudes que recibió el sustituto.
+
+	Retorno:
+	bool: True si todas las pruebas pasaron.
+
+	Ejemplo de uso:
+	ImageJ-linux64 --headless --jython AutoStabilizer_v1.4.4_ES.ijm.py --selftest
+	"""
+	configuracion = {'Debug': 'True', 'LogFolder': str(Files.createTempDirectory('autostabilizer_selftest'))}
+	image_data = jarray.zeros(1000, 'b')
+
+	def prueba(nombre, respuestas, solicitudes_esperadas, responde, tiempo_lectura=5.0, max_en_curso=4, simultaneas=1):
+		manejador = SustitutoCustomVision(0.0, respuestas)
+		servidor, endpoint = inicia_sustituto(manejador)
+		predicciones = []
+		try:
+			# Dos reintentos con una espera corta, como los valores por defecto pero más rápido
+			cliente = ClienteCustomVision(endpoint, 'selftest', max_en_curso, 2.0, tiempo_lectura, 2, 0.05)
+			hilos = [threading.Thread(target=lambda: predicciones.append(cliente.predice(configuracion, image_data)))
+					 for i in range(simultaneas)]
+			for hilo in hilos:
+				hilo.start()
+			for hilo in hilos:
+				hilo.join()
+		finally:
+			servidor.stop(0)
+			servidor.getExecutor().shutdown()
+		respondidas = len([prediccion for prediccion in predicciones if prediccion])
+		paso = (manejador.solicitudes == solicitudes_esperadas and manejador.max_en_curso <= max_en_curso
+				and respondidas == (simultaneas if responde else 0))
+		IJ.log("Autoprueba {}: {} ({} solicitudes, máximo {} a la vez, {} de {} respondidas)".format(
+			nombre, 'OK' if paso else 'FALLÓ', manejador.solicitudes, manejador.max_en_curso, respondidas, simultaneas))
+		return paso
+
+	resultados = [prueba('respuesta', [], 1, True),
+				  prueba('503 se reintenta', [(503, 0)], 2, True),
+				  prueba('429 se reintenta', [(429, 0), (429, 0)], 3, True),
+				  prueba('401 no se reintenta', [(401, 0)], 1, False),
+				  prueba('5xx se abandona tras los reintentos', [(500, 0)] * 3, 3, False),
+				  prueba('tiempo de lectura se reintenta', [(200, 1.5)], 2, True, tiempo_lectura=0.5),
+				  prueba('tiempo de lectura se abandona tras los reintentos', [(200, 1.5)] * 3, 3, False, tiempo_lectura=0.5),
+				  prueba('MaxInFlight limita las solicitudes', [(200, 0.3)] * 6, 6, True, max_en_curso=2, simultaneas=6)]
+	IJ.log("Autoprueba: {} de {} pruebas pasaron (log en {})".format(len([resultado for resultado in resultados if resultado]),
+		len(resultados), configuracion['LogFolder']))
+	escritor_log.vacia()
+	return all(resultados)
 
 # =============================================
-# Ejecución Principal
+# Clasificador de Orientación Local
 # =============================================
-# Solo esto se ejecuta al inicio
-if __name__ == "__main__":
-	setup_gui()
+class ClasificadorOrientacionLocal(object):
+	"""
+	Clasificador de orientación sin conexión: una regresión logística sobre el perfil horizontal de
+	intensidad del primer cuadro. El cuadro se promedia a 'bins' columnas y se normaliza, y las
+	características son las diferencias entre cada columna y su columna espejo, de modo que invertir
+	una imagen cambia el signo de cada característica (y de la suma ponderada, pero no del sesgo).
+	Los pesos se aprenden de las decisiones de una ejecución con Custom Vision (ver entrena_modelo_local)
+	y se guardan como un modelo de texto pequeño.
+	"""
+	def __init__(self, pesos, sesgo=0.0, bins=32):
+		self.pesos = pesos
+		self.sesgo = sesgo
+		self.bins = bins
+
+	@staticmethod
+	def carga(ruta):
+		valores = {}
+		with open(ruta, 'r') as archivo:
+			for linea in archivo:
+				linea = linea.strip()
+				if '=' in linea and not linea.startswith('#'):
+					clave, valor = linea.split('=', 1)
+					valores[clave.strip()] = valor.strip()
+		pesos = [float(peso) for peso in valores['weights'].split(',')]
+		return ClasificadorOrientacionLocal(pesos, float(valores.get('bias', 0.0)), int(valores.get('bins', 2 * len(pesos))))
+
+	def guarda(self, ruta):
+		with open(ruta, 'w') as archivo:
+			archivo.write('# AutoStabilizer local orientation model\n')
+			archivo.write('bins=%d\n' % self.bins)
+			archivo.write('bias=%.8f\n' % self.sesgo)
+			archivo.write('weights=%s\n' % ','.join(['%.8f' % peso for peso in self.pesos]))
+
+	def caracteristicas(self, ip):
+		# Promedio de la imagen completa en ImageJ en lugar de un ciclo por pixel en Python
+		perfil = ip.convertToFloat().resize(self.bins, 1, True)
+		valores = [perfil.getf(i, 0) for i in range(self.bins)]
+		media = sum(valores) / len(valores)
+		desviacion = math.sqrt(sum([(valor - media) ** 2 for valor in valores]) / len(valores)) or 1.0
+		valores = [(valor - media) / desviacion for valor in valores]
+		return [valores[i] - valores[self.bins - 1 - i] for i in range(self.bins // 2)]
+
+	def puntaje(self, caracteristicas):
+		return self.sesgo + sum([peso * caracteristica for peso, caracteristica in zip(self.pesos, caracteristicas)])
+
+	def predice(self, configuracion, ruta_tiff):
+		"""
+		Retorna las predicciones de un archivo de cuadro como pares (tagName, probability), o None si no se puede leer.
+		"""
+		imagen = IJ.openImage(ruta_tiff)
+		if imagen is None:
+			debug(configuracion, 'La imagen de entrada no existe: ', ruta_tiff)
+			return None
+		caracteristicas = self.caracteristicas(imagen.getProcessor())
+		imagen.close()
+		probabilidad = 1.0 / (1.0 + math.exp(-max(-50.0, min(50.0, self.puntaje(caracteristicas)))))
+		predicciones = [('Derecha', probabilidad), ('Izquierda', 1.0 - probabilidad)]
+		predicciones.sort(key=lambda prediccion: -prediccion[1])
+		return predicciones
+
+def ruta_modelo_local(configuracion):
+	"""
+	Retorna la ruta del modelo de orientación local: LocalModel, o 'orientation_model.txt' en la carpeta
+	de Fiji (junto a Config.txt), así el modelo es compartido por todos los directorios de trabajo.
+	"""
+	return configuracion.get('LocalModel') or os.path.join(IJ.getDirectory('imagej') or os.getcwd(), 'orientation_model.txt')
+
+def obtiene_clasificador_local(configuracion):
+	"""
+	Retorna el clasificador de orientación local de la ejecución, cargado una vez desde ruta_modelo_local.
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración.
+
+	Retorno:
+	ClasificadorOrientacionLocal: El modelo cargado, o None si no existe o no se puede leer.
+
+	Ejemplo de uso:
+	predicciones = obtiene_clasificador_local(configuracion).predice(configuracion, ruta_tiff)
+	"""
+	global clasificador_local
+	ruta = ruta_modelo_local(configuracion)
+	with lock_cliente:
+		if clasificador_local is None or clasificador_local[0] != ruta:
+			try:
+				clasificador_local = (ruta, ClasificadorOrientacionLocal.carga(ruta))
+			except (IOError, KeyError, ValueError) as e:
+				debug(configuracion, 'ERROR: No se pudo cargar el modelo de orientacion local %s: ' % ruta, str(e))
+				return None
+	return clasificador_local[1]
+
+def entrena_modelo_local(configuracion, resultados):
+	"""
+	Ajusta el clasificador de orientación local con las decisiones de la ejecución actual y lo guarda en
+	ruta_modelo_local. Solo se usan los puntos con una decisión concluyente (flip True o False).
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración.
+	resultados (list): Registros de resultado retornados por procesamiento_imagenes (en una ejecución por
+	lote, los de todas las placas, cada uno con el InputFolder de su placa en 'input').
+
+	Retorno:
+	ClasificadorOrientacionLocal: El modelo entrenado, o None si no hay suficientes muestras.
+
+	Ejemplo de uso:
+	entrena_modelo_local(configuracion, resultados)
+	"""
+	modelo = ClasificadorOrientacionLocal([0.0] * 16)
+	muestras = []
+	for resultado in resultados:
+		if resultado['status'] != 'done' or resultado['flip'] not in (True, False):
+			continue
+		ruta_tiff = os.path.join(resultado.get('input') or configuracion.get('InputFolder'), resultado['well'], resultado['point'], '00000.TIFF')
+		imagen = IJ.openImage(ruta_tiff)
+		if imagen is None:
+			continue
+		muestras.append((modelo.caracteristicas(imagen.getProcessor()), 1.0 if resultado['flip'] else 0.0))
+		imagen.close()
+	etiquetas = set([etiqueta for caracteristicas, etiqueta in muestras])
+	if len(etiquetas) < 2:
+		debug(configuracion, 'Modelo de orientacion local no entrenado: se necesitan ambas orientaciones. Muestras: ', str(len(muestras)))
+		return None
+	# Descenso de gradiente por lotes sobre la pérdida logística con regularización L2
+	tasa = 0.5
+	penalizacion = 0.01
+	for iteracion in range(500):
+		gradiente = [0.0] * len(modelo.pesos)
+		gradiente_sesgo = 0.0
+		for caracteristicas, etiqueta in muestras:
+			error = 1.0 / (1.0 + math.exp(-max(-50.0, min(50.0, modelo.puntaje(caracteristicas))))) - etiqueta
+			for i in range(len(gradiente)):
+				gradiente[i] += error * caracteristicas[i]
+			gradiente_sesgo += error
+		for i in range(len(gradiente)):
+			modelo.pesos[i] -= tasa * (gradiente[i] / len(muestras) + penalizacion * modelo.pesos[i])
+		modelo.sesgo -= tasa * gradiente_sesgo / len(muestras)
+	correctas = len([1 for caracteristicas, etiqueta in muestras if (modelo.puntaje(caracteristicas) > 0) == (etiqueta == 1.0)])
+	ruta = ruta_modelo_local(configuracion)
+	modelo.guarda(ruta)
+	debug(configuracion, 'Modelo de orientacion local guardado en %s. Aciertos en entrenamiento: ' % ruta, '%d/%d' % (correctas, len(muestras)))
+	return modelo
+
+# =============================================
+# Backends de Orientación
+# =============================================
+def codifica_jpeg(configuracion, ip):
+	"""
+	Codifica un cuadro como JPEG en memoria, con la calidad JPEG configurada en ImageJ. Si UploadSize está
+	definido, el cuadro primero se reduce para que su lado más largo tenga como máximo UploadSize pixeles.
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración.
+	ip (ImageProcessor): Cuadro a codificar (se convierte a 8 bits con su rango de visualización).
+
+	Retorno:
+	byte[]: Los datos JPEG.
+
+	Ejemplo de uso:
+	image_data = codifica_jpeg(configuracion, imagen.getProcessor())
+	"""
+	ip = ip.convertToByte(True)
+	tamano = obtiene_config_entero(configuracion, 'UploadSize', 0)
+	ancho = ip.getWidth()
+	alto = ip.getHeight()
+	if tamano > 0 and max(ancho, alto) > tamano:
+		escala = float(tamano) / max(ancho, alto)
+		ip = ip.resize(max(1, int(round(ancho * escala))), max(1, int(round(alto * escala))), True)
+	buffer = ByteArrayOutputStream()
+	writer = ImageIO.getImageWritersByFormatName('jpeg').next()
+	param = writer.getDefaultWriteParam()
+	param.setCompressionMode(ImageWriteParam.MODE_EXPLICIT)
+	param.setCompressionQuality(FileSaver.getJpegQuality() / 100.0)
+	salida = ImageIO.createImageOutputStream(buffer)
+	try:
+		writer.setOutput(salida)
+		writer.write(None, IIOImage(ip.getBufferedImage(), None, None), param)
+	finally:
+		salida.close()
+		writer.dispose()
+	return buffer.toByteArray()
+
+def orientacion_custom_vision(configuracion, NewDire):
+	"""
+	Backend Custom Vision: codifica el primer cuadro como JPEG en memoria y lo envía al endpoint de predicción.
+	"""
+	ruta_tiff = os.path.join(NewDire, '00000.TIFF')
+	imagen = IJ.openImage(ruta_tiff)
+	if imagen is None:
+		debug(configuracion, 'La imagen de entrada no existe: ', ruta_tiff)
+		return None
+	image_data = codifica_jpeg(configuracion, imagen.getProcessor())
+	imagen.close()
+	# Versiones anteriores dejaban este archivo en la carpeta de entrada, donde se abría como un cuadro más
+	ruta_jpg = os.path.join(NewDire, '_TIFF_JPG.jpg')
+	if os.path.exists(ruta_jpg):
+		try:
+			os.remove(ruta_jpg)
+		except OSError:
+			pass
+	return conexion_custom_vision(configuracion, image_data)
+
+def orientacion_local(configuracion, NewDire):
+	"""
+	Backend local: clasifica el primer cuadro en la CPU, sin red (ver ClasificadorOrientacionLocal).
+	"""
+	clasificador = obtiene_clasificador_local(configuracion)
+	if clasificador is None:
+		return None
+	return clasificador.predice(configuracion, os.path.join(NewDire, '00000.TIFF'))
+
+# Backends de orientación seleccionables con OrientationBackend en Config.txt. Cada uno recibe la
+# carpeta del punto y retorna pares (tagName, probability), o None en caso de error.
+backends_orientacion = {'CustomVision': orientacion_custom_vision, 'Local': orientacion_local}
+
+def obtiene_backend_orientacion(configuracion):
+	"""
+	Retorna el nombre del backend de orientación configurado (OrientationBackend, por defecto 'CustomVision').
+	"""
+	backend = configuracion.get('OrientationBackend') or 'CustomVision'
+	if backend not in backends_orientacion:
+		debug(configuracion, 'Valor de OrientationBackend invalido, se usara el valor por defecto: ', 'CustomVision')
+		backend = 'CustomVision'
+	return backend
+
+# =============================================
+# Política de Orientación
+# =============================================
+class PoliticaOrientacion(object):
+	"""
+	Comparte la decisión de orientación entre los puntos de un pocillo ('Well') o de toda la placa
+	('Plate'), ya que se adquieren con la misma orientación de la platina.
+
+	El primer punto de cada ámbito se clasifica mientras sus hermanos esperan. Un resultado concluyente
+	con una probabilidad de al menos 'confianza' se reutiliza luego para el resto del ámbito; hasta
+	encontrar uno, se clasifica cada punto. Con verificar_cada > 0, cada verificar_cada-ésima
+	reutilización se clasifica de todos modos, y si discrepa con confianza el ámbito vuelve a la
+	clasificación por punto.
+	"""
+	def __init__(self, ambito, confianza, verificar_cada=0):
+		self.ambito = ambito
+		self.confianza = confianza
+		self.verificar_cada = verificar_cada
+		self.decisiones = {}       # Ámbito -> decisión de inversión compartida
+		self.reutilizaciones = {}  # Ámbito -> número de puntos que reutilizaron la decisión
+		self.probados = set()      # Ámbitos cuyo primer punto ya fue clasificado
+		self.desactivados = set()  # Ámbitos donde una verificación discrepó
+		self.locks = {}
+		self.lock = threading.Lock()
+		self.consultas = 0
+
+	def clave(self, pocillo):
+		if self.ambito == 'Well':
+			return pocillo
+		return 'plate'
+
+	def clasifica(self, configuracion, clave, NewDire):
+		predicciones = predicciones_orientacion(configuracion, NewDire)
+		cambiar_orientacion = decision_orientacion(configuracion, predicciones)
+		confiable = cambiar_orientacion is not None and confianza_prediccion(predicciones) >= self.confianza
+		with self.lock:
+			self.consultas = self.consultas + 1
+			compartida = self.decisiones.get(clave)
+			if confiable and compartida is None and clave not in self.desactivados:
+				self.decisiones[clave] = cambiar_orientacion
+			elif confiable and compartida is not None and compartida != cambiar_orientacion:
+				debug(configuracion, 'La orientacion discrepa con la decision compartida, se clasificara cada punto de: ', clave)
+				del self.decisiones[clave]
+				self.desactivados.add(clave)
+			elif not confiable and compartida is not None:
+				# Una verificación no concluyente no reemplaza la decisión compartida
+				cambiar_orientacion = compartida
+		return cambiar_orientacion
+
+	def orientacion(self, configuracion, pocillo, NewDire):
+		clave = self.clave(pocillo)
+		with self.lock:
+			lock_ambito = self.locks.setdefault(clave, threading.Lock())
+		# Los hermanos esperan la primera clasificación del ámbito en lugar de enviar la suya
+		with lock_ambito:
+			if clave not in self.probados:
+				self.probados.add(clave)
+				return self.clasifica(configuracion, clave, NewDire)
+		with self.lock:
+			compartida = self.decisiones.get(clave)
+			if compartida is not None:
+				self.reutilizaciones[clave] = self.reutilizaciones.get(clave, 0) + 1
+				if not (self.verificar_cada and self.reutilizaciones[clave] % self.verificar_cada == 0):
+					debug(configuracion, 'Orientacion reutilizada de %s para: ' % clave, NewDire)
+					return compartida
+		return self.clasifica(configuracion, clave, NewDire)
+
+def crea_politica_orientacion(configuracion):
+	"""
+	Crea la política de orientación de una ejecución a partir de OrientationPolicy ('Point', 'Well' o 'Plate'),
+	OrientationConfidence (por defecto 0.9) y OrientationVerifyEvery (por defecto 0, sin verificación).
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración.
+
+	Retorno:
+	PoliticaOrientacion: La política, o None para la política 'Point' por defecto (se clasifica cada punto).
+
+	Ejemplo de uso:
+	politicas_orientacion[configuracion.get('OutputFolder')] = crea_politica_orientacion(configuracion)
+	"""
+	ambito = configuracion.get('OrientationPolicy') or 'Point'
+	if ambito not in ('Point', 'Well', 'Plate'):
+		debug(configuracion, 'Valor de OrientationPolicy invalido, se usara el valor por defecto: ', 'Point')
+		ambito = 'Point'
+	debug(configuracion, 'Politica de orientacion: ', ambito)
+	if ambito == 'Point':
+		return None
+	return PoliticaOrientacion(ambito, obtiene_config_decimal(configuracion, 'OrientationConfidence', 0.9),
+							   max(0, obtiene_config_entero(configuracion, 'OrientationVerifyEvery', 0)))
+
+def confianza_prediccion(predicciones):
+	"""
+	Retorna la mayor probabilidad de las etiquetas de orientación ('Derecha', 'Izquierda'), o 0 si no hay ninguna.
+	"""
+	probabilidades = [probability for tag_name, probability in (predicciones or []) if tag_name in ('Derecha', 'Izquierda')]
+	return max(probabilidades or [0.0])
+
+def orientacion(configuracion,NewDire):
+	"""
+	Verifica la orientación de la primera imagen en la carpeta y decide si se requiere un cambio de orientación.
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración, que incluye datos para la conexión a la API (ENDPOINT, PREDICTION_KEY).
+	NewDire (str): Ruta de la carpeta que contiene la secuencia de imágenes.
+
+	Retorno:
+	bool: True si se requiere cambio de orientación; False en caso contrario.
+	(En caso de error o falta de conclusividad, devuelve None o no hace cambio.)
+
+	Ejemplo de uso:
+   	necesita_flip = orientacion(configuracion, rutaCarpeta)
+	"""
+	cambiar_orientacion = decision_orientacion(configuracion, predicciones_orientacion(configuracion, NewDire))
+	return cambiar_orientacion
+
+def predicciones_orientacion(configuracion, NewDire):
+	"""
+	Retorna las predicciones de orientación de la primera imagen de la carpeta.
+	Las predicciones vienen del backend elegido con OrientationBackend: 'CustomVision' (por defecto)
+	o 'Local'. Con OrientationCache=True las predicciones de Custom Vision se buscan primero por el hash
+	del primer cuadro, y el servicio solo se consulta para los cuadros que no están en la caché.
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración.
+	NewDire (str): Ruta de la carpeta que contiene la secuencia de imágenes.
+
+	Retorno:
+	list: Pares (tagName, probability), o None en caso de error.
+
+	Ejemplo de uso:
+	predicciones = predicciones_orientacion(configuracion, rutaCarpeta)
+	"""
+	ruta_tiff=os.path.join(NewDire, '00000.TIFF')
+	backend = obtiene_backend_orientacion(configuracion)
+	# El backend local es más rápido que calcular el hash del cuadro, por eso solo Custom Vision usa la caché
+	cache = obtiene_cache_orientacion(configuracion) if backend == 'CustomVision' else None
+	if cache is not None:
+		clave = hash_primer_cuadro(configuracion, ruta_tiff)
+		predicciones = cache.obtiene(clave)
+		if predicciones is not None:
+			debug(configuracion, 'Orientacion obtenida de la cache para: ', NewDire)
+			return predicciones
+	predicciones = backends_orientacion[backend](configuracion, NewDire)
+	# Solo se guardan las consultas respondidas; los errores de conexión se reintentan en la siguiente ejecución
+	if cache is not None and predicciones is not None:
+		cache.agrega(clave, predicciones)
+	return predicciones
+		
+def conexion_custom_vision(configuracion,image_data):
+	"""
+	Envía la imagen a la API de Custom Vision y lee las predicciones de la respuesta JSON.
+	La consulta pasa por el cliente compartido (ver obtiene_cliente_clasificador), que limita las
+	consultas en curso, reutiliza las conexiones y reintenta las consultas fallidas.
+
+	Parámetros:
+	configuracion (dict): Configuración con 'ENDPOINT', 'PREDICTION_KEY', etc.
+	image_data (byte[]): Datos JPEG que se enviarán al servicio (ver codifica_jpeg).
+
+	Retorno:
+	list: Pares (tagName, probability) en el orden retornado por la API.
+	None en caso de error.
+
+	Ejemplo de uso:
+	predicciones = conexion_custom_vision(configuracion, codifica_jpeg(configuracion, ip))
+	"""
+	if image_data is None or len(image_data) == 0:
+		debug(configuracion, 'La imagen de entrada esta vacia.', '')
+		return None
+	return obtiene_cliente_clasificador(configuracion).predice(configuracion, image_data)
+
+def decision_orientacion(configuracion, predicciones):
+	"""
+	Determina la orientación correcta a partir de las predicciones de Custom Vision.
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración.
+	predicciones (list): Pares (tagName, probability) retornados por conexion_custom_vision, o None.
+
+	Retorno:
+	bool: True si la imagen está invertida (etiquetada como 'Derecha') y la probabilidad es mayor al umbral.
+	False si está correctamente orientada ('Izquierda') con alta probabilidad.
+	None en caso de error o resultado no concluyente.
+
+	Ejemplo de uso:
+	flip_necesario = decision_orientacion(configuracion, [('Derecha', 0.93), ('Izquierda', 0.07)])
+	"""
+	if predicciones is None:
+		return None
+	# Confirma orientacion
+	for tag_name, probability in predicciones:
+		if tag_name == 'Derecha' and probability > 0.7:
+			debug(configuracion, 'Imagen requiere cambio de orientacion debido a que se encuentra orientada de derecha a izquierda. Probabilidad:', "{0:.2f}%".format(probability * 100))
+			return True
+		elif tag_name == 'Izquierda' and probability > 0.7:
+			debug(configuracion, 'Orientacion correcta. Probabilidad:', "{0:.2f}%".format(probability * 100))
+			return False
+		else:
+			debug(configuracion, 'Orientacion no concluyente. Probabilidad:', "{0:.2f}%".format(probability * 100))
+	return None
+
+def cambio_orientacion(imp):
+	"""
+	Recorre todos los fotogramas de una pila (stack) y aplica un flip horizontal para invertir la orientación.
+
+	Parámetros:
+	imp (ImagePlus): Objeto de imagen (pila) abierto en ImageJ.
+
+	Retorno:
+	None. (Efecto colateral: Modifica la pila en memoria.)
+
+	Ejemplo de uso:
+	cambio_orientacion(imp)
+	"""
+	stack = imp.getStack()  # Acceder a los cuadros del video
+	for i in range(1, stack.getSize() + 1):
+		frame = stack.getProcessor(i)
+		frame.flipHorizontal()  # Cambiar orientación horizontalmente
+	debug(configuracion, "Cambio de orientacion realizado en el video.", "")
+
+# =============================================
+# Estabilización de Imágenes
+# =============================================
+ventanas_hann = {}  # Ventanas de Hann ya construidas, por tamaño de parche (solo dependen del tamaño)
+
+def obtiene_config_entero(configuracion, clave, defecto):
+	"""
+	Lee una clave entera opcional de la configuración.
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración.
+	clave (str): Clave en el archivo Config.txt (ej. 'RegistrationSize').
+	defecto (int): Valor usado cuando la clave no existe, está vacía o no es un número.
+
+	Retorno:
+	int: El valor configurado o el valor por defecto.
+
+	Ejemplo de uso:
+	tamano = obtiene_config_entero(configuracion, 'RegistrationSize', 512)
+	"""
+	valor = str(configuracion.get(clave, '')).strip()
+	if not valor:
+		return defecto
+	try:
+		return int(valor)
+	except ValueError:
+		debug(configuracion, 'Valor de %s invalido, se usara el valor por defecto: ' % clave, str(defecto))
+		return defecto
+
+def obtiene_config_decimal(configuracion, clave, defecto):
+	"""
+	Lee una clave decimal opcional de la configuración (ver obtiene_config_entero).
+	"""
+	valor = str(configuracion.get(clave, '')).strip()
+	if not valor:
+		return defecto
+	try:
+		return float(valor)
+	except ValueError:
+		debug(configuracion, 'Valor de %s invalido, se usara el valor por defecto: ' % clave, str(defecto))
+		return defecto
+
+def _ventana_hann(tamano):
+	"""
+	Retorna una ventana de Hann de tamano x tamano que atenúa los bordes de un parche antes de la FFT,
+	para que los bordes de la imagen no produzcan un falso pico de correlación en desplazamiento cero.
+	"""
+	ventana = ventanas_hann.get(tamano)
+	if ventana is None:
+		perfil = [0.5 - 0.5 * math.cos(2.0 * math.pi * i / (tamano - 1)) for i in range(tamano)]
+		ventana = FloatProcessor(tamano, tamano, jarray.array([wy * wx for wy in perfil for wx in perfil], 'f'))
+		ventanas_hann[tamano] = ventana
+	return ventana
+
+def _espejo(ip):
+	"""
+	Retorna una copia de un espectro de Hartley cuadrado donde el píxel (x, y) contiene el valor de
+	((N - x) % N, (N - y) % N), es decir, el coeficiente de la frecuencia opuesta.
+	"""
+	tamano = ip.getWidth()
+	invertido = ip.duplicate()
+	invertido.flipHorizontal()
+	invertido.flipVertical()
+	# Tras invertir, (x, y) contiene (N - 1 - x, N - 1 - y); desplazar un píxel de forma circular corrige la diferencia
+	espejo = FloatProcessor(tamano, tamano)
+	espejo.insert(invertido, 1, 1)
+	invertido.setRoi(tamano - 1, 0, 1, tamano)
+	espejo.insert(invertido.crop(), 0, 1)
+	invertido.setRoi(0, tamano - 1, tamano, 1)
+	espejo.insert(invertido.crop(), 1, 0)
+	espejo.setf(0, 0, invertido.getf(tamano - 1, tamano - 1))
+	return espejo
+
+def _blanquea(fht):
+	"""
+	Divide cada coeficiente de Hartley por la magnitud de su coeficiente de Fourier, de modo que solo
+	se conserva la fase (la magnitud de Fourier es sqrt((H(k)^2 + H(-k)^2) / 2)).
+	Todas las operaciones se ejecutan sobre procesadores completos de ImageJ, sin ciclos por píxel en Jython.
+	"""
+	magnitud = fht.duplicate()
+	magnitud.sqr()
+	espejo = _espejo(fht)
+	espejo.sqr()
+	magnitud.copyBits(espejo, 0, 0, Blitter.ADD)
+	magnitud.multiply(0.5)
+	magnitud.sqrt()
+	magnitud.add(1e-6)
+	fht.copyBits(magnitud, 0, 0, Blitter.DIVIDE)
+
+def _desplazamiento_parabolico(izquierda, centro, derecha):
+	"""
+	Retorna la posición sub-píxel (entre -0.5 y 0.5) del vértice de la parábola
+	que pasa por tres valores de correlación vecinos.
+	"""
+	denominador = izquierda - 2.0 * centro + derecha
+	if denominador == 0:
+		return 0.0
+	return max(-0.5, min(0.5, 0.5 * (izquierda - derecha) / denominador))
+
+def correlacion_fase(referencia, movil):
+	"""
+	Estima la traslación de un parche respecto de otro mediante correlación de fase.
+
+	Parámetros:
+	referencia (FHT): Espectro blanqueado del parche de referencia.
+	movil (FHT): Espectro blanqueado del parche a alinear, del mismo tamaño.
+
+	Retorno:
+	tuple: Desplazamiento (dx, dy) de 'movil' respecto de 'referencia', con precisión sub-píxel.
+
+	Ejemplo de uso:
+	dx, dy = correlacion_fase(espectro_anterior, espectro_actual)
+	"""
+	tamano = referencia.getWidth()
+	correlacion = movil.conjugateMultiply(referencia)
+	correlacion.inverseTransform()
+	correlacion.swapQuadrants()
+	correlacion.resetMinAndMax()
+	tolerancia = (correlacion.getMax() - correlacion.getMin()) * 0.1
+	maximos = MaximumFinder().getMaxima(correlacion, tolerancia, False)
+	if maximos.npoints == 0:
+		return (0.0, 0.0)
+	# Conservar el más alto de los picos candidatos
+	mejor = max(range(maximos.npoints), key=lambda i: correlacion.getf(maximos.xpoints[i], maximos.ypoints[i]))
+	x, y = maximos.xpoints[mejor], maximos.ypoints[mejor]
+	centro = correlacion.getf(x, y)
+	dx = dy = 0.0
+	if 0 < x < tamano - 1:
+		dx = _desplazamiento_parabolico(correlacion.getf(x - 1, y), centro, correlacion.getf(x + 1, y))
+	if 0 < y < tamano - 1:
+		dy = _desplazamiento_parabolico(correlacion.getf(x, y - 1), centro, correlacion.getf(x, y + 1))
+	return (x - tamano // 2 + dx, y - tamano // 2 + dy)
+
+class RegistradorCuadros(object):
+	"""
+	Alinea los cuadros de un punto con su primer cuadro.
+
+	Cada cuadro se compara con el anterior mediante correlación de fase sobre un parche cuadrado
+	centrado (potencia de dos, a lo más RegistrationSize píxeles) y los desplazamientos se acumulan,
+	así se eliminan tanto la deriva lenta como la vibración de la platina. Los cuadros deben pasarse en orden.
+
+	Con niveles de pirámide, el desplazamiento se estima primero sobre el cuadro reducido 2^niveles veces
+	(donde el parche cubre una parte mucho mayor del campo) y luego se refina en cada nivel más fino
+	con un parche desplazado según la estimación actual, así se detectan derivas grandes y cada
+	nivel solo cuesta una FFT del tamaño del parche.
+	"""
+	def __init__(self, ancho, alto, tamano, niveles=0):
+		# No bajar a niveles donde el cuadro es demasiado pequeño para correlacionar
+		while niveles > 0 and min(ancho >> niveles, alto >> niveles) < 32:
+			niveles = niveles - 1
+		self.niveles = niveles
+		self.geometria = []
+		for nivel in range(niveles + 1):
+			ancho_nivel = ancho >> nivel
+			alto_nivel = alto >> nivel
+			parche = 2
+			while parche * 2 <= min(ancho_nivel, alto_nivel, tamano):
+				parche = parche * 2
+			self.geometria.append((parche, (ancho_nivel - parche) // 2, (alto_nivel - parche) // 2, ancho_nivel, alto_nivel))
+		self.tamano = self.geometria[0][0]
+		self.reinicia()
+
+	def reinicia(self):
+		"""
+		Olvida los cuadros registrados, así el siguiente cuadro pasa a ser la referencia.
+		"""
+		self.anterior = None
+		self.dx = 0.0
+		self.dy = 0.0
+		self.desplazamientos = []
+
+	def piramide(self, ip):
+		"""
+		Retorna el cuadro seguido de sus versiones reducidas (promediadas) sucesivamente a la mitad.
+		"""
+		piramide = [ip]
+		for nivel in range(1, self.niveles + 1):
+			fino = piramide[-1]
+			fino.setInterpolationMethod(ImageProcessor.BILINEAR)
+			piramide.append(fino.resize(fino.getWidth() // 2, fino.getHeight() // 2, True))
+		return piramide
+
+	def limita_desplazamiento(self, nivel, ox, oy):
+		"""
+		Limita el desplazamiento de un parche para que permanezca dentro del cuadro de un nivel.
+		"""
+		parche, x0, y0, ancho_nivel, alto_nivel = self.geometria[nivel]
+		ox = max(-x0, min(ancho_nivel - parche - x0, ox))
+		oy = max(-y0, min(alto_nivel - parche - y0, oy))
+		return ox, oy
+
+	def espectro(self, ip, nivel=0, ox=0, oy=0):
+		"""
+		Retorna el espectro de Hartley blanqueado del parche de un cuadro en un nivel de la pirámide,
+		centrado o desplazado en (ox, oy) píxeles de ese nivel.
+		"""
+		tamano_parche, x0, y0, ancho_nivel, alto_nivel = self.geometria[nivel]
+		ip.setRoi(x0 + ox, y0 + oy, tamano_parche, tamano_parche)
+		parche = ip.crop().convertToFloat()
+		ip.resetRoi()
+		parche.subtract(ImageStatistics.getStatistics(parche, Measurements.MEAN, None).mean)
+		parche.copyBits(_ventana_hann(tamano_parche), 0, 0, Blitter.MULTIPLY)
+		fht = FHT(parche)
+		fht.transform()
+		_blanquea(fht)
+		return fht
+
+	def estima(self, ip):
+		"""
+		Retorna el desplazamiento (dx, dy) de un cuadro respecto del cuadro anterior, desde el
+		nivel más grueso de la pirámide hasta la resolución completa.
+		"""
+		piramide = self.piramide(ip)
+		actual = [self.espectro(piramide[nivel], nivel) for nivel in range(self.niveles + 1)]
+		anterior = self.anterior
+		# Los espectros centrados de este cuadro son la referencia del siguiente
+		self.anterior = actual
+		if anterior is None:
+			return (0.0, 0.0)
+		dx = dy = 0.0
+		for nivel in range(self.niveles, -1, -1):
+			escala = float(1 << nivel)
+			ox, oy = self.limita_desplazamiento(nivel, int(round(dx / escala)), int(round(dy / escala)))
+			if ox == 0 and oy == 0:
+				movil = actual[nivel]
+			else:
+				# Desplazar el parche según la estimación gruesa deja solo un pequeño residuo por medir
+				movil = self.espectro(piramide[nivel], nivel, ox, oy)
+			rx, ry = correlacion_fase(anterior[nivel], movil)
+			dx = (ox + rx) * escala
+			dy = (oy + ry) * escala
+		return (dx, dy)
+
+	def registra(self, ip):
+		"""
+		Estima la deriva del siguiente cuadro, la corrige en el mismo cuadro y retorna el (dx, dy) acumulado.
+		"""
+		dx, dy = self.estima(ip)
+		self.dx = self.dx + dx
+		self.dy = self.dy + dy
+		self.desplazamientos.append((self.dx, self.dy))
+		self.aplica(ip, self.dx, self.dy)
+		return (self.dx, self.dy)
+
+	def aplica(self, ip, dx, dy):
+		"""
+		Mueve un cuadro en (-dx, -dy) con interpolación bilineal para deshacer una deriva acumulada.
+		"""
+		traslada_cuadro(ip, dx, dy)
+
+	def deriva_maxima(self):
+		"""
+		Retorna la mayor deriva acumulada (en píxeles) entre los cuadros registrados.
+		"""
+		if not self.desplazamientos:
+			return 0.0
+		return max([math.sqrt(dx * dx + dy * dy) for dx, dy in self.desplazamientos])
+
+def estabiliza_pila(configuracion, imp):
+	"""
+	Registra cada cuadro de una pila de 8 bits en memoria respecto de su primer cuadro.
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración ('RegistrationSize' y 'PyramidLevels' son
+	                      opcionales, por defecto 512 y 0).
+	imp (ImagePlus): Pila ya convertida a 8 bits (e invertida si era necesario).
+
+	Retorno:
+	RegistradorCuadros: Registrador con el desplazamiento acumulado de cada cuadro.
+
+	Ejemplo de uso:
+	registrador = estabiliza_pila(configuracion, imp)
+	"""
+	pila = imp.getStack()
+	registrador = RegistradorCuadros(imp.getWidth(), imp.getHeight(), obtiene_config_entero(configuracion, 'RegistrationSize', 512),
+									 obtiene_config_entero(configuracion, 'PyramidLevels', 0))
+	for i in range(1, pila.getSize() + 1):
+		verifica_cancelacion()
+		registrador.registra(pila.getProcessor(i))
+	debug(configuracion, 'Estabilizacion aplicada. Deriva maxima (px): ', '%.2f' % registrador.deriva_maxima())
+	return registrador
+
+# =============================================
+# Archivo de Transformaciones y Opciones de Salida
+# =============================================
+def ruta_transformacion(output_path):
+	"""
+	Retorna la ruta del archivo de transformaciones de un video (ej. 'POINT 00001.avi' -> 'POINT 00001.shifts.csv').
+	"""
+	return os.path.splitext(output_path)[0] + '.shifts.csv'
+
+def guarda_transformacion(configuracion, ruta, cambiar_orientacion, desplazamientos):
+	"""
+	Guarda la decisión de orientación y el desplazamiento acumulado de cada cuadro junto al video.
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración.
+	ruta (str): Ruta del archivo de transformaciones (ver ruta_transformacion).
+	cambiar_orientacion (bool): Decisión de orientación usada para el video (True, False o None).
+	desplazamientos (list): (dx, dy) acumulado de cada cuadro, vacío si el video no fue estabilizado.
+
+	Retorno:
+	None. (Efecto colateral: escribe el archivo .shifts.csv.)
+
+	Ejemplo de uso:
+	guarda_transformacion(configuracion, ruta_transformacion(output_path), True, registrador.desplazamientos)
+	"""
+	try:
+		with open(ruta, 'w') as archivo:
+			archivo.write('# AutoStabilizer transform sidecar\n')
+			archivo.write('# flip=%s\n' % cambiar_orientacion)
+			archivo.write('frame,dx,dy\n')
+			for i, (dx, dy) in enumerate(desplazamientos):
+				archivo.write('%d,%.3f,%.3f\n' % (i + 1, dx, dy))
+		debug(configuracion, 'Archivo de transformaciones guardado: ', ruta)
+	except IOError as e:
+		debug(configuracion, 'ERROR: No se pudo guardar el archivo de transformaciones %s: ' % ruta, str(e))
+
+def lee_transformacion(configuracion, ruta):
+	"""
+	Lee un archivo de transformaciones escrito por guarda_transformacion.
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración.
+	ruta (str): Ruta del archivo de transformaciones.
+
+	Retorno:
+	dict: {'flip': True/False/None, 'shifts': lista de (dx, dy)}, o None si el archivo
+	      no existe o no se puede interpretar.
+
+	Ejemplo de uso:
+	transformacion = lee_transformacion(configuracion, ruta_transformacion(output_path))
+	"""
+	if not os.path.exists(ruta):
+		debug(configuracion, 'No existe archivo de transformaciones, el punto se analizara: ', ruta)
+		return None
+	transformacion = {'flip': None, 'shifts': []}
+	try:
+		with open(ruta, 'r') as archivo:
+			for linea in archivo:
+				linea = linea.strip()
+				if linea.startswith('# flip='):
+					transformacion['flip'] = {'True': True, 'False': False}.get(linea[len('# flip='):])
+				elif linea and not linea.startswith('#') and not linea.startswith('frame'):
+					cuadro, dx, dy = linea.split(',')
+					transformacion['shifts'].append((float(dx), float(dy)))
+	except (IOError, ValueError) as e:
+		debug(configuracion, 'ERROR: Archivo de transformaciones invalido %s: ' % ruta, str(e))
+		return None
+	debug(configuracion, 'Transformacion reutilizada desde: ', ruta)
+	return transformacion
+
+def traslada_cuadro(ip, dx, dy):
+	"""
+	Mueve un cuadro en (-dx, -dy) con interpolación bilineal para deshacer una deriva acumulada.
+	"""
+	if dx != 0 or dy != 0:
+		ip.setInterpolationMethod(ImageProcessor.BILINEAR)
+		ip.translate(-dx, -dy)
+
+def aplica_desplazamientos(configuracion, imp, desplazamientos):
+	"""
+	Aplica los desplazamientos leídos de un archivo de transformaciones a una pila en memoria, sin registrarla de nuevo.
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración.
+	imp (ImagePlus): Pila de 8 bits con un cuadro por desplazamiento.
+	desplazamientos (list): (dx, dy) acumulado de cada cuadro.
+
+	Retorno:
+	None. (Efecto colateral: Modifica la pila en memoria.)
+
+	Ejemplo de uso:
+	aplica_desplazamientos(configuracion, imp, transformacion['shifts'])
+	"""
+	pila = imp.getStack()
+	for i in range(1, pila.getSize() + 1):
+		verifica_cancelacion()
+		dx, dy = desplazamientos[i - 1]
+		traslada_cuadro(pila.getProcessor(i), dx, dy)
+	debug(configuracion, 'Desplazamientos guardados aplicados al video.', '')
+
+def obtiene_recorte(configuracion):
+	"""
+	Lee la clave opcional 'Crop' (x,y,ancho,alto en píxeles) de la configuración.
+
+	Retorno:
+	tuple: (x, y, ancho, alto), o None si la clave no existe, está vacía o es inválida.
+
+	Ejemplo de uso:
+	recorte = obtiene_recorte(configuracion)
+	"""
+	valor = str(configuracion.get('Crop', '')).strip()
+	if not valor:
+		return None
+	try:
+		x, y, ancho, alto = [int(parte) for parte in valor.split(',')]
+	except ValueError:
+		debug(configuracion, 'Valor de Crop invalido, el video no se recortara: ', valor)
+		return None
+	return (x, y, ancho, alto)
+
+def limita_recorte(recorte, ancho, alto):
+	"""
+	Limita un rectángulo de recorte al tamaño de los cuadros.
+	"""
+	x = max(0, min(recorte[0], ancho - 1))
+	y = max(0, min(recorte[1], alto - 1))
+	return (x, y, max(1, min(recorte[2], ancho - x)), max(1, min(recorte[3], alto - y)))
+
+def recorta_pila(imp, recorte):
+	"""
+	Recorta cada cuadro de una pila en memoria al rectángulo (x, y, ancho, alto).
+	"""
+	x, y, ancho, alto = limita_recorte(recorte, imp.getWidth(), imp.getHeight())
+	imp.setStack(imp.getStack().crop(x, y, 0, ancho, alto, imp.getStackSize()))
+
+def opciones_avi(configuracion, output_path):
+	"""
+	Construye las opciones del comando 'AVI...' de ImageJ a partir de las claves opcionales 'Compression'
+	(None, JPEG o PNG; por defecto None) y 'FrameRate' (por defecto 7).
+
+	Ejemplo de uso:
+	IJ.run(imp, "AVI... ", opciones_avi(configuracion, output_path))
+	"""
+	compresion = str(configuracion.get('Compression', '')).strip() or 'None'
+	cuadros_por_segundo = str(configuracion.get('FrameRate', '')).strip() or '7'
+	return "compression=" + compresion + " frame=" + cuadros_por_segundo + " save=[" + output_path + "]"
+
+def lista_cuadros(NewDire):
+	"""
+	Lista los cuadros TIFF de la carpeta de un punto en orden de adquisición.
+
+	Parámetros:
+	NewDire (str): Ruta de la carpeta que contiene la secuencia de imágenes.
+
+	Retorno:
+	list: Nombres de archivo ordenados que terminan en .tif o .tiff (otros archivos, como el JPG
+	      usado para verificar la orientación, se ignoran).
+
+	Ejemplo de uso:
+	cuadros = lista_cuadros(rutaCarpeta)
+	"""
+	return sorted([nombre for nombre in os.listdir(NewDire)
+				   if nombre.lower().endswith('.tif') or nombre.lower().endswith('.tiff')])
+
+class PilaStreaming(VirtualStack):
+	"""
+	Pila virtual que lee un TIFF a la vez, lo convierte a 8 bits y lo invierte si es necesario.
+
+	Solo el cuadro solicitado se mantiene en memoria, por lo que el escritor AVI puede guardar un punto
+	de cualquier largo con un consumo máximo de unos pocos cuadros. El escalado de 16 a 8 bits usa el
+	rango de visualización del primer cuadro para todos los cuadros, así el brillo es consistente en el video.
+	Los cuadros también pueden estabilizarse (tamano_registro), moverse según desplazamientos guardados
+	(desplazamientos) y recortarse (recorte).
+	"""
+	def __init__(self, NewDire, cuadros, cambiar_orientacion, tamano_registro=0, niveles_piramide=0, desplazamientos=None, recorte=None):
+		primero = Opener().openImage(NewDire, cuadros[0]).getProcessor()
+		self.recorte = None
+		if recorte is not None:
+			self.recorte = limita_recorte(recorte, primero.getWidth(), primero.getHeight())
+			VirtualStack.__init__(self, self.recorte[2], self.recorte[3], None, NewDire)
+		else:
+			VirtualStack.__init__(self, primero.getWidth(), primero.getHeight(), None, NewDire)
+		self.directorio = NewDire
+		self.cuadros = cuadros
+		self.cambiar_orientacion = cambiar_orientacion
+		self.desplazamientos = desplazamientos
+		self.cancelada = False
+		self.segundos_estabiliza = 0.0   # Tiempo dedicado a registrar y mover los cuadros (ver codifica_punto)
+		# Con un tamaño de registro los cuadros también se estabilizan mientras se leen
+		self.registrador = None
+		if tamano_registro > 0 and desplazamientos is None:
+			self.registrador = RegistradorCuadros(primero.getWidth(), primero.getHeight(), tamano_registro, niveles_piramide)
+		primero.resetMinAndMax()
+		self.minimo = primero.getMin()
+		self.maximo = primero.getMax()
+
+	def define_orientacion(self, cambiar_orientacion):
+		"""
+		Cambia la orientación de los cuadros que se lean desde ahora. Los cuadros ya registrados se
+		leyeron con la otra orientación, así que el registro comienza de nuevo desde el primer cuadro.
+		"""
+		if cambiar_orientacion != self.cambiar_orientacion:
+			self.cambiar_orientacion = cambiar_orientacion
+			if self.registrador is not None:
+				self.registrador.reinicia()
+
+	def getSize(self):
+		return len(self.cuadros)
+
+	def getBitDepth(self):
+		return 8
+
+	def getFileName(self, n):
+		return self.cuadros[n - 1]
+
+	def getSliceLabel(self, n):
+		return self.cuadros[n - 1]
+
+	def lee_cuadro(self, n):
+		ip = Opener().openImage(self.directorio, self.cuadros[n - 1]).getProcessor()
+		if ip.getBitDepth() != 8:
+			ip.setMinAndMax(self.minimo, self.maximo)
+			ip = ip.convertToByte(True)
+		if self.cambiar_orientacion:
+			ip.flipHorizontal()
+		return ip
+
+	def getProcessor(self, n):
+		if evento_cancelacion.isSet():
+			# Se recuerda por si el escritor AVI no propaga la excepción (ver codifica_punto)
+			self.cancelada = True
+		verifica_cancelacion()
+		ip = self.lee_cuadro(n)
+		inicio = time.time()
+		if self.registrador is not None:
+			registrados = len(self.registrador.desplazamientos)
+			if n <= registrados:
+				# Cuadro ya registrado (ej. solicitado nuevamente por el visor): se reutiliza su desplazamiento
+				dx, dy = self.registrador.desplazamientos[n - 1]
+				self.registrador.aplica(ip, dx, dy)
+			else:
+				# La deriva se acumula cuadro a cuadro, por lo que los cuadros omitidos se registran primero
+				for m in range(registrados + 1, n):
+					self.registrador.registra(self.lee_cuadro(m))
+				self.registrador.registra(ip)
+		elif self.desplazamientos is not None:
+			dx, dy = self.desplazamientos[n - 1]
+			traslada_cuadro(ip, dx, dy)
+		self.segundos_estabiliza += time.time() - inicio
+		if self.recorte is not None:
+			ip.setRoi(self.recorte[0], self.recorte[1], self.recorte[2], self.recorte[3])
+			ip = ip.crop()
+		return ip
+
+def abre_pila_streaming(configuracion, NewDire, cambiar_orientacion, estabilizar=False, desplazamientos=None, recorte=None, cuadros=None):
+	"""
+	Abre la carpeta de un punto como PilaStreaming en lugar de cargar todos los cuadros con FolderOpener.
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración.
+	NewDire (str): Ruta de la carpeta que contiene la secuencia de imágenes.
+	cambiar_orientacion (bool): True si los cuadros deben invertirse horizontalmente durante la lectura.
+	estabilizar (bool): True para registrar cada cuadro respecto del primero durante la lectura.
+	desplazamientos (list): (dx, dy) guardado de cada cuadro; si se entrega, se aplica en lugar de registrar.
+	recorte (tuple): Rectángulo opcional (x, y, ancho, alto) aplicado a cada cuadro.
+	cuadros (list): Archivos de cuadros ya listados (ver prepara_punto); si es None se lista la carpeta.
+
+	Retorno:
+	ImagePlus: Imagen de 8 bits respaldada por una PilaStreaming, o None si la carpeta no tiene cuadros TIFF.
+
+	Ejemplo de uso:
+	imp = abre_pila_streaming(configuracion, rutaCarpeta, True)
+	"""
+	if cuadros is None:
+		cuadros = lista_cuadros(NewDire)
+	if not cuadros:
+		return None
+	debug(configuracion, 'Leyendo cuadros en streaming desde: ', '%s (%d cuadros)' % (NewDire, len(cuadros)))
+	if desplazamientos is not None and len(desplazamientos) != len(cuadros):
+		debug(configuracion, 'Los desplazamientos guardados no coinciden con el numero de cuadros, se registrara nuevamente: ', NewDire)
+		desplazamientos = None
+	tamano_registro = obtiene_config_entero(configuracion, 'RegistrationSize', 512) if estabilizar else 0
+	niveles_piramide = obtiene_config_entero(configuracion, 'PyramidLevels', 0)
+	return ImagePlus(os.path.basename(os.path.dirname(NewDire)),
+					 PilaStreaming(NewDire, cuadros, cambiar_orientacion, tamano_registro, niveles_piramide, desplazamientos, recorte))
+
+def obtiene_workers(configuracion):
+	"""
+	Lee el número de workers desde la clave 'Workers' de la configuración.
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración. 'Workers' es opcional; un valor vacío,
+	                      una clave ausente o un número inválido equivale a 1 (procesamiento secuencial),
+	                      y 'Auto' o 0 usa un worker por cada procesador disponible.
+
+	Retorno:
+	int: Número de workers a utilizar (al menos 1).
+
+	Ejemplo de uso:
+	workers = obtiene_workers(configuracion)
+	"""
+	valor = str(configuracion.get('Workers', '1')).strip()
+	if valor.lower() == 'auto':
+		return Runtime.getRuntime().availableProcessors()
+	try:
+		workers = int(valor)
+	except ValueError:
+		debug(configuracion, 'Valor de Workers invalido, se usara 1 worker: ', valor)
+		return 1
+	if workers == 0:
+		return Runtime.getRuntime().availableProcessors()
+	return max(1, workers)
+
+def nuevo_resultado(newFolderName, BrightName):
+	"""
+	Retorna un registro de resultado vacío para un trabajo (pocillo, punto) (ver procesa_punto).
+	"""
+	return {'well': newFolderName, 'point': BrightName, 'status': 'error', 'output': None,
+			'frames': 0, 'flip': None, 'seconds': 0.0, 'error': '',
+			'timings': {}, 'bytes_read': 0, 'bytes_written': 0}
+
+def prepara_punto(configuracion, newFolderName, BrightName):
+	"""
+	Resuelve la carpeta de entrada y el video de salida de un trabajo (pocillo, punto), crea la carpeta
+	de salida y, en modo de re-exportación, lee el archivo de transformación de una ejecución anterior.
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración.
+	newFolderName (str): Carpeta del pocillo (ej. 'A01').
+	BrightName (str): Subcarpeta del punto (ej. 'POINT 00001\\BRIGHT').
+
+	Retorno:
+	dict: Descripción del punto ('well', 'dir', 'video', 'output', 'transform', 'streaming', 'stabilize',
+	      'shifts', 'crop', 'fingerprint', 'resumed', 'bytes', 'frame_names'), o None si la carpeta de entrada no existe.
+	      'resumed' es la entrada del manifiesto de ejecución cuando el video de una ejecución anterior se puede reutilizar.
+
+	Ejemplo de uso:
+	punto = prepara_punto(configuracion, 'A01', 'POINT 00001\\BRIGHT')
+	"""
+	# Normalize directory path to remove extra backslashes
+	raw_new_dire = os.path.join(configuracion.get('InputFolder'), newFolderName, BrightName)
+	NewDire = os.path.normpath(raw_new_dire)
+	if input_readiness is not None:
+		# El pocillo puede estar copiándose todavía (CopyOverlap)
+		input_readiness.wait_for(newFolderName)
+	debug(configuracion, 'Directorio a abrir: ', NewDire)
+	if not os.path.exists(NewDire):
+		return None
+	# Los cuadros listados por escanea_entrada se usan tal cual, así la carpeta no se vuelve a listar
+	cuadros = cuadros_escaneados.pop(NewDire, None)
+	if cuadros is None:
+		cuadros = entradas_cuadros(NewDire)
+	NombreVideo = BrightName[:11] + '.avi'
+	# Normalize output path and create directory if needed
+	output_path = os.path.normpath(os.path.join(configuracion.get('OutputFolder'), newFolderName, NombreVideo))
+	out_dir = os.path.dirname(output_path)
+	if not os.path.exists(out_dir):
+		try:
+			os.makedirs(out_dir)
+		except OSError:
+			# Otro worker pudo haberla creado mientras tanto
+			if not os.path.isdir(out_dir):
+				raise
+	# Con Resume=True un punto terminado por una ejecución anterior no se procesa de nuevo
+	huella = reanudado = None
+	manifiesto_ejecucion = manifiestos_ejecucion.get(configuracion.get('OutputFolder'))
+	if manifiesto_ejecucion is not None:
+		huella = huella_entrada(configuracion, NewDire, cuadros)
+		reanudado = manifiesto_ejecucion.completo(newFolderName, BrightName, huella, output_path)
+	# En modo de re-exportación la orientación y los desplazamientos de una ejecución anterior se reutilizan
+	transformacion = None
+	if configuracion.get('Rerender') == 'True':
+		transformacion = lee_transformacion(configuracion, ruta_transformacion(output_path))
+	estabilizar = configuracion.get('Stabilize') == 'True'
+	desplazamientos = None
+	if estabilizar and transformacion is not None and transformacion['shifts']:
+		desplazamientos = transformacion['shifts']
+	return {'well': newFolderName, 'dir': NewDire, 'video': NombreVideo, 'output': output_path, 'transform': transformacion,
+			'streaming': configuracion.get('Streaming') == 'True', 'stabilize': estabilizar,
+			'shifts': desplazamientos, 'crop': obtiene_recorte(configuracion), 'fingerprint': huella, 'resumed': reanudado,
+			'bytes': sum([entrada[2] for entrada in cuadros]), 'frame_names': sorted([entrada[0] for entrada in cuadros])}
+
+def orientacion_punto(configuracion, punto):
+	"""
+	Retorna la decisión de orientación de un punto: la guardada en su archivo de transformación en
+	modo de re-exportación, la compartida por su pocillo o placa (ver PoliticaOrientacion), o en otro
+	caso el resultado de orientacion.
+	"""
+	if punto['transform'] is not None:
+		return punto['transform']['flip']
+	politica_orientacion = politicas_orientacion.get(configuracion.get('OutputFolder'))
+	if politica_orientacion is not None:
+		return politica_orientacion.orientacion(configuracion, punto['well'], punto['dir'])
+	return orientacion(configuracion, punto['dir'])
+
+def abre_punto(configuracion, punto, cambiar_orientacion):
+	"""
+	Abre los cuadros de un punto: la pila completa con FolderOpener, o una PilaStreaming en modo streaming.
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración.
+	punto (dict): Descripción del punto retornada por prepara_punto.
+	cambiar_orientacion (bool): Decisión de orientación. En modo streaming puede actualizarse después
+	                            en la pila (ver PilaStreaming.define_orientacion) antes de leer los cuadros.
+
+	Retorno:
+	ImagePlus: La imagen abierta, o None si no se pudo abrir la secuencia.
+	"""
+	if punto['streaming']:
+		# En modo streaming los cuadros se convierten e invierten uno a uno mientras se escribe el AVI
+		return abre_pila_streaming(configuracion, punto['dir'], cambiar_orientacion, punto['stabilize'], punto['shifts'], punto['crop'],
+								   punto['frame_names'])
+	return FolderOpener.open(punto['dir'])
+
+def codifica_punto(configuracion, punto, imp, cambiar_orientacion, resultado):
+	"""
+	Convierte un punto abierto a 8 bits, lo invierte, estabiliza y recorta según la configuración,
+	escribe el video AVI y el archivo de transformación, y completa el registro de resultado.
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración.
+	punto (dict): Descripción del punto retornada por prepara_punto.
+	imp (ImagePlus): Imagen retornada por abre_punto.
+	cambiar_orientacion (bool): Decisión de orientación.
+	resultado (dict): Registro de resultado del trabajo (ver procesa_punto).
+	"""
+	global cuadros_avance
+	tiempos = resultado['timings']
+	streaming = punto['streaming']
+	desplazamientos = punto['shifts']
+	transformacion = punto['transform']
+	output_path = punto['output']
+	if streaming and imp.getStack().cambiar_orientacion != cambiar_orientacion:
+		imp.getStack().define_orientacion(cambiar_orientacion)
+		# El ImagePlus leyó el primer cuadro al crearse, con la orientación anterior
+		imp.setProcessor(imp.getStack().getProcessor(1))
+	if configuracion.get('Visor') == 'True':
+		imp.show()
+	if not streaming:
+		inicio = time.time()
+		ij.Prefs.set("options.scaleConversions", True)
+		ic = ImageConverter(imp)
+		ic.setDoScaling(True)
+		ic.convertToGray8()
+		suma_tiempo(tiempos, 'convert', inicio)
+	debug(configuracion, 'Directorio donde se grabara el archivo avi: ', output_path)
+	if cambiar_orientacion and not streaming:
+		inicio = time.time()
+		cambio_orientacion(imp)
+		suma_tiempo(tiempos, 'flip', inicio)
+	if punto['stabilize'] and not streaming:
+		inicio = time.time()
+		if desplazamientos is not None and len(desplazamientos) == imp.getStackSize():
+			aplica_desplazamientos(configuracion, imp, desplazamientos)
+		else:
+			desplazamientos = estabiliza_pila(configuracion, imp).desplazamientos
+			transformacion = None
+		suma_tiempo(tiempos, 'stabilize', inicio)
+	if punto['crop'] is not None and not streaming:
+		inicio = time.time()
+		recorta_pila(imp, punto['crop'])
+		suma_tiempo(tiempos, 'crop', inicio)
+	# El video se escribe en un archivo parcial y se renombra al terminar, para que un punto
+	# cancelado o fallido nunca reemplace un video terminado
+	ruta_parcial = os.path.splitext(output_path)[0] + '.partial.avi'
+	escrito = False
+	# Fuera del modo streaming los cuadros ya están en memoria, por eso la cancelación se verifica antes
+	# de escribir; un video con todos sus cuadros escritos siempre se conserva
+	verifica_cancelacion()
+	inicio = time.time()
+	try:
+		IJ.run(imp, "AVI... ", opciones_avi(configuracion, ruta_parcial))
+		if streaming and imp.getStack().cancelada:
+			raise ProcesamientoCancelado('Procesamiento cancelado')
+		Files.move(Paths.get(ruta_parcial), Paths.get(output_path), StandardCopyOption.REPLACE_EXISTING)
+		escrito = True
+	finally:
+		if not escrito and os.path.exists(ruta_parcial):
+			os.remove(ruta_parcial)
+	# En modo streaming los cuadros se leen, convierten e invierten aquí, por eso su tiempo es parte de 'write'
+	suma_tiempo(tiempos, 'write', inicio)
+	if streaming and imp.getStack().segundos_estabiliza:
+		# Los cuadros también se estabilizaron mientras se escribían; ese tiempo pertenece a 'stabilize'
+		segundos_estabiliza = imp.getStack().segundos_estabiliza
+		tiempos['write'] = max(0.0, tiempos['write'] - segundos_estabiliza)
+		tiempos['stabilize'] = tiempos.get('stabilize', 0.0) + segundos_estabiliza
+	debug(configuracion, 'Guardado de archivo finalizado: ', punto['video'])
+	if streaming and imp.getStack().registrador is not None:
+		desplazamientos = imp.getStack().registrador.desplazamientos
+		transformacion = None
+	# Solo se guarda un análisis nuevo; una re-exportación conserva el archivo desde el que se hizo
+	if transformacion is None:
+		guarda_transformacion(configuracion, ruta_transformacion(output_path), cambiar_orientacion, desplazamientos or [])
+	resultado['frames'] = imp.getStackSize()
+	resultado['output'] = output_path
+	resultado['status'] = 'done'
+	resultado['bytes_read'] = punto['bytes']
+	resultado['bytes_written'] = os.path.getsize(output_path)
+	with lock_avance:
+		cuadros_avance = cuadros_avance + resultado['frames']
+	if configuracion.get('Visor') != 'True':
+		imp.close()
+
+def procesa_punto(configuracion, newFolderName, BrightName, folderNames, BrightNames):
+	"""
+	Procesa un único trabajo (pocillo, punto): abre la secuencia de imágenes, la convierte a 8 bits,
+	verifica su orientación, la invierte si es necesario y la guarda como video AVI.
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración.
+	newFolderName (str): Carpeta del pocillo (ej. 'A01').
+	BrightName (str): Subcarpeta del punto (ej. 'POINT 00001\\BRIGHT').
+	folderNames (list): Todos los pocillos de la ejecución (se usa para calcular el avance).
+	BrightNames (list): Todos los puntos de la ejecución (se usa para calcular el avance).
+
+	Retorno:
+	dict: Registro de resultado con las claves 'well', 'point', 'status' ('done', 'skipped', 'missing', 'cancelled' o 'error'),
+	      'output', 'frames', 'flip', 'seconds', 'error', 'timings' (segundos por etapa, ver ETAPAS_METRICAS),
+	      'bytes_read' y 'bytes_written'.
+
+	Ejemplo de uso:
+	resultado = procesa_punto(configuracion, 'A01', 'POINT 00001\\BRIGHT', folderNames, BrightNames)
+	"""
+	resultado = nuevo_resultado(newFolderName, BrightName)
+	inicio = time.time()
+	punto = None
+	tiempos = resultado['timings']
+	try:
+		verifica_cancelacion()
+		punto = prepara_punto(configuracion, newFolderName, BrightName)
+		suma_tiempo(tiempos, 'prepare', inicio)
+		if punto is not None and punto['resumed'] is not None:
+			omite_punto(configuracion, punto, resultado)
+		elif punto is not None:
+			inicio_etapa = time.time()
+			cambiar_orientacion = orientacion_punto(configuracion, punto)
+			resultado['flip'] = cambiar_orientacion
+			suma_tiempo(tiempos, 'orientation', inicio_etapa)
+			inicio_etapa = time.time()
+			imp = abre_punto(configuracion, punto, cambiar_orientacion)
+			suma_tiempo(tiempos, 'open', inicio_etapa)
+			if imp:
+				codifica_punto(configuracion, punto, imp, cambiar_orientacion, resultado)
+			else:
+				mensaje_error = 'ERROR: No se pudo abrir la secuencia de imagenes de la carpeta %s' % punto['dir']
+				resultado['error'] = mensaje_error
+				debug(configuracion, mensaje_error, '')
+		else:
+			mensaje_no_dir = 'No existe directorio para %s\\%s.' % (newFolderName, BrightName)
+			resultado['status'] = 'missing'
+			debug(configuracion, mensaje_no_dir, '')
+	except ProcesamientoCancelado:
+		resultado['status'] = 'cancelled'
+		debug(configuracion, 'Cancelado: ', '%s\\%s' % (newFolderName, BrightName))
+	except Exception as e:
+		resultado['error'] = str(e)
+		debug(configuracion, 'ERROR: Fallo el procesamiento de %s\\%s: ' % (newFolderName, BrightName), str(e))
+	resultado['seconds'] = time.time() - inicio
+	registra_punto(configuracion, punto, resultado)
+	avance(folderNames, BrightNames, resultado, configuracion.get('OutputFolder'))
+	return resultado
+
+class TrabajoPunto(Callable):
+	"""
+	Tarea para el pool de workers: envuelve procesa_punto para que un par (pocillo, punto)
+	pueda enviarse a un executor de java.util.concurrent.
+	"""
+	def __init__(self, configuracion, newFolderName, BrightName, folderNames, BrightNames):
+		self.configuracion = configuracion
+		self.newFolderName = newFolderName
+		self.BrightName = BrightName
+		self.folderNames = folderNames
+		self.BrightNames = BrightNames
+
+	def call(self):
+		return procesa_punto(self.configuracion, self.newFolderName, self.BrightName, self.folderNames, self.BrightNames)
+
+def reporte_resultados(configuracion, resultados):
+	"""
+	Registra el resultado de cada trabajo y un resumen de la ejecución.
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración.
+	resultados (list): Registros de resultado retornados por procesa_punto.
+
+	Retorno:
+	None. (Efecto colateral: imprime por consola y escribe en el log.)
+
+	Ejemplo de uso:
+	reporte_resultados(configuracion, resultados)
+	"""
+	for resultado in resultados:
+		debug(configuracion, 'Resultado: ', '%s\\%s || %s || frames=%d || flip=%s || %.2f s || %s' % (
+			resultado['well'], resultado['point'], resultado['status'], resultado['frames'],
+			resultado['flip'], resultado['seconds'], resultado['error'] or resultado['output'] or ''))
+	terminados = len([r for r in resultados if r['status'] == 'done'])
+	omitidos = len([r for r in resultados if r['status'] == 'skipped'])
+	cancelados = len([r for r in resultados if r['status'] == 'cancelled'])
+	faltantes = len([r for r in resultados if r['status'] == 'missing'])
+	errores = len([r for r in resultados if r['status'] == 'error'])
+	debug(configuracion, 'Resumen de trabajos: ', 'terminados=%d, omitidos=%d, faltantes=%d, cancelados=%d, errores=%d' % (terminados, omitidos, faltantes, cancelados, errores))
+
+# =============================================
+# Métricas
+# =============================================
+ETAPAS_METRICAS = ('prepare', 'orientation', 'open', 'convert', 'flip', 'stabilize', 'crop', 'write')
+
+def suma_tiempo(tiempos, etapa, inicio):
+	"""
+	Suma el tiempo transcurrido desde inicio a una etapa de los 'timings' de un registro de resultado (ver ETAPAS_METRICAS).
+	"""
+	tiempos[etapa] = tiempos.get(etapa, 0.0) + (time.time() - inicio)
+
+def filas_metricas(resultados):
+	"""
+	Retorna las métricas de cada punto: tiempo por etapa, bytes leídos y escritos, cuadros/s y MB/s.
+	"""
+	terminado = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+	filas = []
+	for resultado in resultados:
+		segundos = resultado['seconds'] or 0.0
+		fila = [('well', resultado['well']), ('point', resultado['point']), ('status', resultado['status']),
+				('frames', resultado['frames']), ('seconds', round(segundos, 3))]
+		fila.extend([(etapa, round(resultado['timings'].get(etapa, 0.0), 3)) for etapa in ETAPAS_METRICAS])
+		fila.extend([('bytes_read', resultado['bytes_read']), ('bytes_written', resultado['bytes_written']),
+					 ('frames_per_second', round(resultado['frames'] / segundos, 2) if segundos else 0.0),
+					 ('read_mb_per_second', round(resultado['bytes_read'] / 1048576.0 / segundos, 2) if segundos else 0.0),
+					 ('finished', terminado)])
+		filas.append(fila)
+	return filas
+
+def guarda_metricas(configuracion, resultados):
+	"""
+	Agrega las métricas de cada punto a 'metrics.csv' en LogFolder, o a 'metrics.jsonl' (un objeto
+	JSON por línea) con MetricsFormat=jsonl.
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración.
+	resultados (list): Registros de resultado de la placa.
+
+	Ejemplo de uso:
+	guarda_metricas(configuracion, resultados)
+	"""
+	jsonl = (configuracion.get('MetricsFormat') or 'csv').lower() == 'jsonl'
+	ruta = os.path.join(configuracion.get('LogFolder'), 'metrics.jsonl' if jsonl else 'metrics.csv')
+	filas = filas_metricas(resultados)
+	try:
+		archivo_nuevo = not os.path.exists(ruta)
+		with open(ruta, 'a') as metricas:
+			if jsonl:
+				for fila in filas:
+					registro = JSONObject()
+					for clave, valor in fila:
+						registro.put(clave, valor)
+					metricas.write(registro.toString() + '\n')
+			else:
+				escritor = csv.writer(metricas, lineterminator='\n')
+				if archivo_nuevo:
+					escritor.writerow([clave for clave, valor in filas[0]] if filas else [])
+				for fila in filas:
+					escritor.writerow([valor for clave, valor in fila])
+		debug(configuracion, 'Metricas guardadas: ', ruta)
+	except (IOError, OSError) as e:
+		debug(configuracion, 'ERROR: No se pudieron guardar las metricas: ', str(e))
+
+def reporte_metricas(configuracion, resultados, placa=None):
+	"""
+	Registra en el log el resumen de métricas de una placa: cuadros, bytes y rendimiento, y el tiempo
+	de cada etapa como parte del total, que muestra si la placa estuvo limitada por el disco ('open',
+	'write'), la red ('orientation') o la CPU ('convert', 'stabilize'). Con Metrics=True también se
+	exportan las métricas de cada punto (ver guarda_metricas).
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración.
+	resultados (list): Registros de resultado de la placa.
+	placa (dict): Tiempos 'start' y 'discovery' registrados por planifica_placa.
+	"""
+	total_segundos = time.time() - placa['start'] if placa else sum([resultado['seconds'] for resultado in resultados])
+	cuadros = sum([resultado['frames'] for resultado in resultados])
+	leidos_mb = sum([resultado['bytes_read'] for resultado in resultados]) / 1048576.0
+	escritos_mb = sum([resultado['bytes_written'] for resultado in resultados]) / 1048576.0
+	debug(configuracion, 'Metricas de la placa: ', '%d puntos, %d cuadros en %.1f s (%.1f cuadros/s), leidos %.1f MB (%.1f MB/s), escritos %.1f MB' % (
+		len(resultados), cuadros, total_segundos, cuadros / total_segundos if total_segundos else 0.0,
+		leidos_mb, leidos_mb / total_segundos if total_segundos else 0.0, escritos_mb))
+	totales = [(etapa, sum([resultado['timings'].get(etapa, 0.0) for resultado in resultados])) for etapa in ETAPAS_METRICAS]
+	total = sum([segundos for etapa, segundos in totales])
+	etapas = ['%s=%.1f s (%d%%)' % (etapa, segundos, round(100.0 * segundos / total) if total else 0) for etapa, segundos in totales]
+	if placa:
+		etapas.insert(0, 'discovery=%.1f s' % placa['discovery'])
+	debug(configuracion, 'Tiempos por etapa: ', ', '.join(etapas))
+	if configuracion.get('Metrics') == 'True' and resultados:
+		guarda_metricas(configuracion, resultados)
+
+# =============================================
+# Perfilador
+# =============================================
+class PerfiladorMuestreo(object):
+	"""
+	Perfilador por muestreo de una ejecución. Cada 'intervalo' segundos un hilo en segundo plano lee
+	las trazas de pila de los hilos que ejecutan este script (las funciones de Python aparecen en ellas
+	como marcos de Jython) y cuenta, para cada función, las muestras en que está en la pila (inclusivo)
+	y en la cima (propio). Los hilos en espera (un worker esperando su orientación, el pool esperando
+	sus trabajos) se cuentan aparte, así los porcentajes solo describen el tiempo de trabajo.
+	"""
+	PUNTOS_CALIENTES = (('IJ.run (escritura AVI)', ('ij.IJ.run',)),
+						('FolderOpener.open', ('ij.plugin.FolderOpener.open',)),
+						('ImageConverter', ('ij.process.ImageConverter.',)),
+						('HTTP (Custom Vision)', ('java.net.', 'sun.net.www.', 'sun.security.ssl.', 'javax.net.ssl.')))
+	IGNORADOS = ('org.python.', 'sun.reflect.', 'java.lang.reflect.', 'jdk.internal.')
+	MAXIMO = 40
+
+	def __init__(self, ruta, intervalo):
+		self.ruta = ruta
+		self.intervalo = intervalo
+		self.funciones = {}   # función -> [muestras inclusivas, muestras propias]
+		self.esperas = {}   # función de este script donde espera el hilo -> muestras
+		self.puntos_calientes = dict([(etiqueta, 0) for etiqueta, prefijos in self.PUNTOS_CALIENTES])
+		self.muestras = 0
+		self.trabajando = 0
+		self.detenido = threading.Event()
+		self.hilo = None
+		self.inicio = 0
+
+	def inicia(self):
+		self.inicio = time.time()
+		self.hilo = threading.Thread(target=self.ejecuta, name='AutoStabilizer profiler')
+		self.hilo.setDaemon(True)
+		self.hilo.start()
+
+	def ejecuta(self):
+		while not self.detenido.isSet():
+			self.muestrea()
+			self.detenido.wait(self.intervalo)
+
+	def es_marco_script(self, marco):
+		"""
+		Indica si un marco de la pila ejecuta código de este script. El nombre de archivo del marco se
+		compara con archivo_script, así el script se reconoce con cualquier nombre y desde cualquier lugar.
+		"""
+		archivo = marco.getFileName()
+		return bool(archivo) and archivo in (archivo_script, os.path.basename(archivo_script))
+
+	def nombre_funcion(self, marco):
+		"""
+		Retorna el nombre de un marco de la pila: la función para este script, 'función (archivo.py)'
+		para otros archivos de Python, 'clase.método' para Java, o None para los marcos del propio Jython.
+		"""
+		archivo = marco.getFileName() or ''
+		if self.es_marco_script(marco):
+			return marco.getMethodName().split('$')[0]
+		if archivo.endswith('.py'):
+			return '%s (%s)' % (marco.getMethodName().split('$')[0], archivo)
+		clase = marco.getClassName()
+		if clase.startswith(self.IGNORADOS):
+			return None
+		return '%s.%s' % (clase, marco.getMethodName())
+
+	def muestrea(self):
+		actual = JavaThread.currentThread()
+		for entrada in JavaThread.getAllStackTraces().entrySet():
+			hilo, marcos = entrada.getKey(), entrada.getValue()
+			if hilo.equals(actual) or not [marco for marco in marcos if self.es_marco_script(marco)]:
+				continue
+			nombres = [nombre for nombre in [self.nombre_funcion(marco) for marco in marcos] if nombre]
+			self.muestras += 1
+			if str(hilo.getState()) in ('WAITING', 'TIMED_WAITING', 'BLOCKED'):
+				script = [self.nombre_funcion(marco) for marco in marcos if self.es_marco_script(marco)]
+				self.esperas[script[0]] = self.esperas.get(script[0], 0) + 1
+				continue
+			self.trabajando += 1
+			if nombres:
+				self.funciones.setdefault(nombres[0], [0, 0])[1] += 1
+			for nombre in set(nombres):
+				self.funciones.setdefault(nombre, [0, 0])[0] += 1
+			metodos = ['%s.%s' % (marco.getClassName(), marco.getMethodName()) for marco in marcos]
+			for etiqueta, prefijos in self.PUNTOS_CALIENTES:
+				if [metodo for metodo in metodos if metodo.startswith(prefijos)]:
+					self.puntos_calientes[etiqueta] += 1
+
+	def detiene(self):
+		"""
+		Detiene el muestreo y guarda el reporte.
+		"""
+		self.detenido.set()
+		if self.hilo is not None:
+			self.hilo.join()
+		self.guarda_reporte()
+
+	def guarda_reporte(self):
+		duracion = time.time() - self.inicio
+		parte = lambda cantidad, total: 100.0 * cantidad / total if total else 0.0
+		lineas = ['AutoStabilizer - perfil',
+				  'Inicio: %s, duracion: %.1f s, intervalo: %d ms' % (
+					  datetime.fromtimestamp(self.inicio).strftime('%Y-%m-%d %H:%M:%S'), duracion, self.intervalo * 1000),
+				  'Muestras de hilos: %d (trabajando %d, en espera %d)' % (self.muestras, self.trabajando, self.muestras - self.trabajando),
+				  '', 'Puntos calientes (parte de las muestras de trabajo)']
+		for etiqueta, prefijos in self.PUNTOS_CALIENTES:
+			lineas.append('  %6.1f%%  %s' % (parte(self.puntos_calientes[etiqueta], self.trabajando), etiqueta))
+		lineas.extend(['', 'Funciones por tiempo inclusivo (primeras %d)' % self.MAXIMO, '  total%  propio%  muestras  funcion'])
+		ranking = sorted(self.funciones.items(), key=lambda item: -item[1][0])[:self.MAXIMO]
+		for nombre, (inclusivas, propias) in ranking:
+			lineas.append('  %6.1f%%  %6.1f%%  %8d  %s' % (parte(inclusivas, self.trabajando), parte(propias, self.trabajando), inclusivas, nombre))
+		lineas.extend(['', 'En espera, por funcion del script', '  parte%  muestras  funcion'])
+		for nombre, cantidad in sorted(self.esperas.items(), key=lambda item: -item[1]):
+			lineas.append('  %6.1f%%  %8d  %s' % (parte(cantidad, self.muestras), cantidad, nombre))
+		with open(self.ruta, 'w') as reporte:
+			reporte.write('\n'.join(lineas) + '\n')
+
+def crea_perfilador(configuracion):
+	"""
+	Inicia un perfilador por muestreo con Profile=True. El reporte se guarda en
+	'profile_AAAA_MM_DD_HHMMSS.txt' en LogFolder al detenerlo. El intervalo de muestreo es
+	ProfileInterval milisegundos (por defecto 20).
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración.
+
+	Retorno:
+	PerfiladorMuestreo: El perfilador en ejecución, o None si Profile no está habilitado.
+
+	Ejemplo de uso:
+	perfilador = crea_perfilador(configuracion)
+	"""
+	if configuracion.get('Profile') != 'True':
+		return None
+	intervalo = max(1, obtiene_config_entero(configuracion, 'ProfileInterval', 20)) / 1000.0
+	ruta = os.path.join(configuracion.get('LogFolder'), 'profile_%s.txt' % datetime.now().strftime('%Y_%m_%d_%H%M%S'))
+	perfilador = PerfiladorMuestreo(ruta, intervalo)
+	perfilador.inicia()
+	debug(configuracion, 'Perfilador iniciado, intervalo (ms): ', str(int(intervalo * 1000)))
+	return perfilador
+
+def detiene_perfilador(configuracion, perfilador):
+	"""
+	Detiene un perfilador creado por crea_perfilador y guarda su reporte.
+	"""
+	if perfilador is None:
+		return
+	try:
+		perfilador.detiene()
+		debug(configuracion, 'Perfil guardado: ', perfilador.ruta)
+	except (IOError, OSError) as e:
+		debug(configuracion, 'ERROR: No se pudo guardar el perfil: ', str(e))
+
+# =============================================
+# Manifiesto de Ejecución
+# =============================================
+class ManifiestoEjecucion(object):
+	"""
+	Manifiesto de finalización de una placa ('run_manifest.csv' en OutputFolder). Se agrega una fila
+	apenas se escribe cada AVI, por lo que después de una caída una nueva ejecución con Resume=True
+	omite los puntos cuyas entradas y parámetros no cambiaron y cuyo video sigue siendo válido, y solo
+	hace el resto.
+
+	Formato de fila: well,point,fingerprint,bytes,frames,seconds,finished,output
+	"""
+	ENCABEZADO = 'well,point,fingerprint,bytes,frames,seconds,finished,output'
+
+	def __init__(self, ruta):
+		self.ruta = ruta
+		self.entradas = {}
+		self.lock = threading.Lock()
+		self.carga()
+
+	def carga(self):
+		if not os.path.exists(self.ruta):
+			return
+		with codecs.open(self.ruta, 'r', 'utf-8') as manifiesto:
+			for linea in manifiesto:
+				linea = linea.rstrip('\r\n')
+				if not linea or linea.startswith('#') or linea == self.ENCABEZADO:
+					continue
+				try:
+					pocillo, punto, huella, tamano, cuadros, segundos, terminado, salida = linea.split(',', 7)
+					# Una fila posterior del mismo punto reemplaza a las anteriores
+					self.entradas[(pocillo, punto)] = {'fingerprint': huella, 'bytes': long(tamano), 'frames': int(cuadros), 'output': salida}
+				except ValueError:
+					# Una fila cortada por una caída se ignora y su punto se procesa de nuevo
+					continue
+
+	def completo(self, pocillo, punto, huella, salida):
+		"""
+		Devuelve la entrada del manifiesto de un punto si su video se puede reutilizar, si no None.
+		"""
+		entrada = self.entradas.get((pocillo, punto))
+		if entrada is None or entrada['fingerprint'] != huella or entrada['output'] != salida:
+			return None
+		if not avi_valido(salida, entrada['bytes']):
+			return None
+		return entrada
+
+	def registra(self, resultado, huella):
+		tamano = os.path.getsize(resultado['output'])
+		linea = '%s,%s,%s,%d,%d,%.2f,%s,%s\n' % (resultado['well'], resultado['point'], huella, tamano, resultado['frames'],
+			resultado['seconds'], datetime.now().strftime('%Y-%m-%d %H:%M:%S'), resultado['output'])
+		with self.lock:
+			archivo_nuevo = not os.path.exists(self.ruta)
+			with codecs.open(self.ruta, 'a', 'utf-8') as manifiesto:
+				if archivo_nuevo:
+					manifiesto.write('# AutoStabilizer run manifest\n')
+					manifiesto.write(self.ENCABEZADO + '\n')
+				manifiesto.write(linea)
+			self.entradas[(resultado['well'], resultado['point'])] = {'fingerprint': huella, 'bytes': tamano,
+																	  'frames': resultado['frames'], 'output': resultado['output']}
+
+def crea_manifiesto_ejecucion(configuracion):
+	"""
+	Crea el manifiesto de finalización de la ejecución a partir de la clave opcional 'Resume' (por defecto False).
+
+	Retorno:
+	ManifiestoEjecucion: Manifiesto cargado desde OutputFolder, o None si Resume no está habilitado.
+
+	Ejemplo de uso:
+	manifiestos_ejecucion[configuracion.get('OutputFolder')] = crea_manifiesto_ejecucion(configuracion)
+	"""
+	if configuracion.get('Resume') != 'True':
+		return None
+	manifiesto = ManifiestoEjecucion(os.path.join(configuracion.get('OutputFolder'), 'run_manifest.csv'))
+	debug(configuracion, 'Manifiesto de ejecución: ', '%s (%d puntos registrados)' % (manifiesto.ruta, len(manifiesto.entradas)))
+	return manifiesto
+
+def avi_valido(ruta, tamano):
+	"""
+	Verifica que un video exista, tenga el tamaño registrado en el manifiesto y empiece con un encabezado AVI.
+	"""
+	try:
+		if os.path.getsize(ruta) != tamano:
+			return False
+		with open(ruta, 'rb') as video:
+			encabezado = video.read(12)
+	except (IOError, OSError):
+		return False
+	return encabezado[:4] == 'RIFF' and encabezado[8:12] == 'AVI '
+
+def huella_entrada(configuracion, NewDire, cuadros=None):
+	"""
+	Huella de un punto: cantidad, tamaño total y fecha más reciente de sus cuadros, más un hash de
+	los parámetros que cambian el video (compresión, cuadros por segundo, estabilización, recorte y streaming,
+	que convierte, invierte y estabiliza los cuadros de a uno, por lo que su video no es idéntico).
+	Los cuadros ya listados por quien llama (ver entradas_cuadros) se pueden pasar en 'cuadros'.
+
+	Retorno:
+	str: Huella como '120:125829120:1712345678000:3f2a9c1b'.
+	"""
+	if cuadros is None:
+		cuadros = entradas_cuadros(NewDire)
+	parametros = '|'.join([str(configuracion.get(clave, '')).strip() for clave in
+						   ('Compression', 'FrameRate', 'Stabilize', 'RegistrationSize', 'PyramidLevels', 'Crop', 'Streaming')])
+	return '%d:%d:%d:%s' % (len(cuadros), sum([entrada[2] for entrada in cuadros]),
+							max([entrada[3] for entrada in cuadros] or [0]), hashlib.md5(parametros).hexdigest()[:8])
+
+def omite_punto(configuracion, punto, resultado):
+	"""
+	Completa el registro de resultado de un punto cuyo video ya fue terminado por una ejecución anterior.
+	"""
+	resultado['status'] = 'skipped'
+	resultado['output'] = punto['output']
+	resultado['frames'] = punto['resumed']['frames']
+	debug(configuracion, 'Ya terminado, se omite: ', punto['output'])
+
+def registra_punto(configuracion, punto, resultado):
+	"""
+	Agrega un punto terminado al manifiesto de ejecución (solo con Resume=True).
+	"""
+	manifiesto_ejecucion = manifiestos_ejecucion.get(configuracion.get('OutputFolder'))
+	if manifiesto_ejecucion is None or punto is None or resultado['status'] != 'done':
+		return
+	try:
+		manifiesto_ejecucion.registra(resultado, punto['fingerprint'])
+	except (IOError, OSError) as e:
+		debug(configuracion, 'ERROR: No se pudo actualizar el manifiesto de ejecución: ', str(e))
+
+# =============================================
+# Índice de la Placa
+# =============================================
+def lista_entradas(ruta):
+	"""
+	Lista una carpeta en una sola pasada, como os.scandir: java.nio entrega las entradas junto con
+	sus atributos (en Windows vienen del propio listado del directorio), por lo que no se hace una
+	llamada stat adicional por archivo, lo que importa en unidades de red.
+
+	Parámetros:
+	ruta (str): Carpeta a listar.
+
+	Retorno:
+	list: Tuplas (nombre, es_directorio, tamaño, milisegundos_modificacion).
+	"""
+	entradas = []
+	flujo = Files.newDirectoryStream(Paths.get(ruta))
+	try:
+		for entrada in flujo:
+			atributos = Files.readAttributes(entrada, BasicFileAttributes)
+			entradas.append((str(entrada.getFileName()), atributos.isDirectory(), atributos.size(),
+							 atributos.lastModifiedTime().toMillis()))
+	finally:
+		flujo.close()
+	return entradas
+
+def entradas_cuadros(dir_punto):
+	"""
+	Lista los cuadros TIFF de una carpeta de punto con su tamaño y fecha (ver lista_entradas).
+	"""
+	return [entrada for entrada in lista_entradas(dir_punto)
+			if not entrada[1] and (entrada[0].lower().endswith('.tif') or entrada[0].lower().endswith('.tiff'))]
+
+def bytes_punto(configuracion, newFolderName, BrightName):
+	"""
+	Retorna el tamaño total de los cuadros de un punto, o None si su carpeta (aún) no existe.
+	"""
+	if input_readiness is not None and not input_readiness.is_ready(newFolderName):
+		# Con CopyOverlap las carpetas de un pocillo se crean antes de copiar sus archivos
+		return None
+	dir_punto = os.path.normpath(os.path.join(configuracion.get('InputFolder'), newFolderName, BrightName))
+	if not os.path.isdir(dir_punto):
+		return None
+	return sum([entrada[2] for entrada in entradas_cuadros(dir_punto)])
+
+def nombres_canales(configuracion):
+	"""
+	Retorna las carpetas de canal de BrightFoldersPoint (ej. set(['BRIGHT']) para 'POINT 00001\\BRIGHT'),
+	o un conjunto vacío cuando los puntos no tienen carpeta de canal.
+	"""
+	nombres = [nombre.strip() for nombre in configuracion.get('BrightFoldersPoint').split(',')]
+	return set([os.path.basename(nombre) for nombre in nombres if os.sep in nombre])
+
+def carpetas_punto(dir_pocillo, nombre, modificado, canales):
+	"""
+	Retorna los puntos de una subcarpeta de un pocillo como pares (punto, milisegundos_modificacion):
+	uno por cada carpeta de canal que contiene (ej. 'POINT 00001\\BRIGHT'), o la propia subcarpeta
+	cuando no hay canales.
+	"""
+	if not canales:
+		return [(nombre, modificado)]
+	return [(os.path.join(nombre, canal), canal_modificado)
+			for canal, canal_dir, canal_tamano, canal_modificado in lista_entradas(os.path.join(dir_pocillo, nombre))
+			if canal_dir and canal in canales]
+
+def formatea_archivos_cuadros(entradas):
+	"""
+	Codifica los cuadros de un punto para plate_index.csv como elementos 'nombre/tamaño/modificado'
+	separados por '|' (caracteres que Windows no permite en nombres de archivo), o '' si un nombre los contiene.
+	"""
+	if [entrada for entrada in entradas if '/' in entrada[0] or '|' in entrada[0] or ',' in entrada[0]]:
+		return ''
+	return '|'.join(['%s/%d/%d' % (entrada[0], entrada[2], entrada[3]) for entrada in entradas])
+
+def lee_archivos_cuadros(texto):
+	"""
+	Decodifica los cuadros escritos por formatea_archivos_cuadros como tuplas de entradas_cuadros, o None
+	si no se guardaron.
+	"""
+	if not texto:
+		return None
+	entradas = []
+	for elemento in texto.split('|'):
+		nombre, tamano, modificado = elemento.split('/')
+		entradas.append((nombre, False, long(tamano), long(modificado)))
+	return entradas
+
+def ruta_indice_placa(configuracion):
+	"""
+	Devuelve la ruta del manifiesto del índice de la placa ('plate_index.csv' en LogFolder).
+	"""
+	return os.path.join(configuracion.get('LogFolder'), 'plate_index.csv')
+
+def lee_indice_placa(configuracion, ruta):
+	"""
+	Lee un manifiesto del índice de la placa escrito por guarda_indice_placa.
+
+	Retorno:
+	dict: (pocillo, punto) -> (milisegundos_modificacion, cuadros, bytes, entradas de cuadros), o un
+	      diccionario vacío si el manifiesto no existe, no se puede leer o fue escrito para otra InputFolder.
+	"""
+	cacheado = {}
+	if not os.path.exists(ruta):
+		return cacheado
+	try:
+		with codecs.open(ruta, 'r', 'utf-8') as archivo_indice:
+			for linea in archivo_indice:
+				linea = linea.rstrip('\r\n')
+				if linea.startswith('# InputFolder='):
+					if linea[len('# InputFolder='):] != configuracion.get('InputFolder'):
+						return {}
+				elif linea and not linea.startswith('#') and linea != 'well,point,frames,bytes,modified,frame_files':
+					# Un índice escrito antes de guardar los archivos de cuadros falla aquí y se escanea de nuevo
+					pocillo, punto, cuadros, tamano, modificado, archivos_cuadros = linea.split(',')
+					cacheado[(pocillo, punto)] = (long(modificado), int(cuadros), long(tamano), lee_archivos_cuadros(archivos_cuadros))
+	except (IOError, ValueError) as e:
+		debug(configuracion, 'No se pudo leer el índice de la placa, se escanea de nuevo: ', str(e))
+		return {}
+	return cacheado
+
+def guarda_indice_placa(configuracion, ruta, indice):
+	"""
+	Escribe el índice de la placa como un manifiesto CSV (una fila por punto, con sus archivos de cuadros),
+	para que el siguiente escaneo solo tenga que listar las carpetas de punto cuya fecha de modificación cambió.
+	"""
+	with codecs.open(ruta, 'w', 'utf-8') as archivo_indice:
+		archivo_indice.write('# AutoStabilizer plate index\n')
+		archivo_indice.write('# InputFolder=%s\n' % configuracion.get('InputFolder'))
+		archivo_indice.write('well,point,frames,bytes,modified,frame_files\n')
+		for punto in indice:
+			archivo_indice.write('%s,%s,%d,%d,%d,%s\n' % (punto['well'], punto['point'], punto['frames'], punto['bytes'],
+														 punto['modified'], formatea_archivos_cuadros(punto['entries'])))
+
+def escanea_entrada(configuracion):
+	"""
+	Recorre InputFolder una sola vez y construye el índice pocillos -> puntos -> archivos de cuadros que
+	guía el procesamiento cuando DiscoverPoints=True. Los archivos de cuadros de cada punto se entregan a
+	prepara_punto (ver cuadros_escaneados), así las carpetas de punto no se vuelven a listar al procesarlas.
+
+	Los pocillos son las ReadFolders que existen en InputFolder. Los puntos son todas las subcarpetas
+	de un pocillo que contienen la carpeta de canal de BrightFoldersPoint (ej. 'BRIGHT' para
+	'POINT 00001\\BRIGHT'), incluidos los puntos que no están listados en BrightFoldersPoint. El índice
+	se guarda en plate_index.csv en LogFolder y una carpeta de punto solo se vuelve a listar cuando
+	cambió su fecha de modificación.
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración.
+
+	Retorno:
+	list: Un dict por punto con las claves 'well', 'point', 'dir', 'frames', 'bytes', 'modified' y
+	      'entries' (tuplas de entradas_cuadros), en el orden de ReadFolders y luego por nombre de punto.
+	      Para un pocillo que todavía se copia (CopyOverlap) 'frames', 'bytes', 'modified' y 'entries' son None.
+
+	Ejemplo de uso:
+	indice = escanea_entrada(configuracion)
+	"""
+	inicio = time.time()
+	inputFolder = configuracion.get('InputFolder')
+	ruta = ruta_indice_placa(configuracion)
+	cacheado = lee_indice_placa(configuracion, ruta)
+	BrightNames = [nombre.strip() for nombre in configuracion.get('BrightFoldersPoint').split(',')]
+	canales = nombres_canales(configuracion)
+	pocillos = dict([(nombre, es_dir) for nombre, es_dir, tamano, modificado in lista_entradas(inputFolder)])
+	indice = []
+	listadas = 0
+	for pocillo in [nombre.strip() for nombre in configuracion.get('ReadFolders').split(',')]:
+		dir_pocillo = os.path.join(inputFolder, pocillo)
+		if input_readiness is not None and not input_readiness.is_ready(pocillo):
+			# Esperar la copia aquí retendría todos los puntos hasta que se copie la placa completa.
+			# La ingesta Copy crea las carpetas de un pocillo antes que sus archivos, así el pocillo se
+			# planifica a partir de ellas (o de BrightFoldersPoint) y prepara_punto espera su copia
+			en_copia = []
+			if pocillos.get(pocillo):
+				for nombre, es_dir, tamano, modificado in sorted(lista_entradas(dir_pocillo)):
+					if es_dir:
+						en_copia.extend([entrada[0] for entrada in carpetas_punto(dir_pocillo, nombre, modificado, canales)])
+			for punto in en_copia or BrightNames:
+				indice.append({'well': pocillo, 'point': punto, 'dir': os.path.normpath(os.path.join(dir_pocillo, punto)),
+							   'frames': None, 'bytes': None, 'modified': None, 'entries': None})
+			continue
+		if not pocillos.get(pocillo):
+			debug(configuracion, 'No existe la carpeta del pocillo: ', pocillo)
+			continue
+		puntos = []
+		for nombre, es_dir, tamano, modificado in sorted(lista_entradas(dir_pocillo)):
+			if es_dir:
+				puntos.extend(carpetas_punto(dir_pocillo, nombre, modificado, canales))
+		for punto, modificado in puntos:
+			dir_punto = os.path.normpath(os.path.join(dir_pocillo, punto))
+			if (pocillo, punto) in cacheado and cacheado[(pocillo, punto)][0] == modificado and cacheado[(pocillo, punto)][3] is not None:
+				cuadros, tamano, entradas = cacheado[(pocillo, punto)][1:]
+			else:
+				listadas = listadas + 1
+				entradas = sorted(entradas_cuadros(dir_punto))
+				cuadros = len(entradas)
+				tamano = sum([entrada[2] for entrada in entradas])
+			if cuadros:
+				cuadros_escaneados[dir_punto] = entradas
+				indice.append({'well': pocillo, 'point': punto, 'dir': dir_punto, 'frames': cuadros, 'bytes': tamano,
+							   'modified': modificado, 'entries': entradas})
+	no_listados = sorted(set([punto['point'] for punto in indice]) - set(BrightNames))
+	if no_listados:
+		debug(configuracion, 'Puntos encontrados que no están listados en BrightFoldersPoint: ', ', '.join(no_listados))
+	# Los pocillos que todavía se copian se vuelven a listar en el siguiente escaneo
+	guarda_indice_placa(configuracion, ruta, [punto for punto in indice if punto['frames'] is not None])
+	debug(configuracion, 'Índice de la placa: ', '%d puntos, %d cuadros, %.1f MB (%d carpetas listadas, %.2f s)' % (
+		len(indice), sum([punto['frames'] or 0 for punto in indice]), sum([punto['bytes'] or 0 for punto in indice]) / 1048576.0,
+		listadas, time.time() - inicio))
+	return indice
+
+# =============================================
+# Vigilancia de Carpeta
+# =============================================
+class VigilanteCarpeta(object):
+	"""
+	Sigue una adquisición en curso en InputFolder (Watch=True). Cada consulta lista la carpeta raíz,
+	vuelve a listar un pocillo solo cuando cambió su fecha (apareció una carpeta de punto nueva) y luego
+	lista solo los puntos que siguen pendientes, por lo que su costo no crece con los puntos ya procesados.
+	Un punto está listo cuando sus cuadros (cantidad, bytes y fecha más reciente) no cambiaron durante
+	'espera' segundos.
+	"""
+	def __init__(self, configuracion, espera):
+		self.input_folder = configuracion.get('InputFolder')
+		self.pocillos = [nombre.strip() for nombre in configuracion.get('ReadFolders').split(',')]
+		self.canales = nombres_canales(configuracion)
+		self.espera = espera
+		self.modificacion_pocillo = {}   # pocillo -> fecha de su último listado
+		self.encontrados = set()   # (pocillo, carpeta de punto) ya encontrados
+		self.pendientes = {}   # (pocillo, carpeta de punto) -> (firma de los cuadros, sin cambios desde)
+		self.ultimo_cambio = time.time()
+
+	def consulta(self):
+		"""
+		Retorna los pares (pocillo, punto) que dejaron de crecer desde las consultas anteriores.
+		"""
+		ahora = time.time()
+		pocillos = dict([(nombre, (es_dir, modificado)) for nombre, es_dir, tamano, modificado in lista_entradas(self.input_folder)])
+		for pocillo in self.pocillos:
+			es_dir, modificado = pocillos.get(pocillo, (False, None))
+			if not es_dir or self.modificacion_pocillo.get(pocillo) == modificado:
+				continue
+			self.modificacion_pocillo[pocillo] = modificado
+			for nombre, entrada_dir, tamano, entrada_modificado in lista_entradas(os.path.join(self.input_folder, pocillo)):
+				if entrada_dir and (pocillo, nombre) not in self.encontrados:
+					self.encontrados.add((pocillo, nombre))
+					self.pendientes[(pocillo, nombre)] = (None, ahora)
+					self.ultimo_cambio = ahora
+		listos = []
+		for pocillo, nombre in sorted(self.pendientes.keys()):
+			dir_pocillo = os.path.join(self.input_folder, pocillo)
+			try:
+				firma = []
+				for punto, punto_modificado in carpetas_punto(dir_pocillo, nombre, None, self.canales):
+					cuadros = entradas_cuadros(os.path.normpath(os.path.join(dir_pocillo, punto)))
+					firma.append((punto, len(cuadros), sum([entrada[2] for entrada in cuadros]), max([entrada[3] for entrada in cuadros] or [0])))
+			except IOException:
+				# La carpeta fue eliminada o renombrada
+				del self.pendientes[(pocillo, nombre)]
+				continue
+			anterior, desde = self.pendientes[(pocillo, nombre)]
+			if firma != anterior:
+				self.pendientes[(pocillo, nombre)] = (firma, ahora)
+				self.ultimo_cambio = ahora
+			elif [entrada for entrada in firma if entrada[1]] and ahora - desde >= self.espera:
+				del self.pendientes[(pocillo, nombre)]
+				listos.extend([(pocillo, entrada[0]) for entrada in firma if entrada[1]])
+		return listos
+
+def vigila_entrada(configuracion, folderNames, BrightNames, workers):
+	"""
+	Modo daemon (Watch=True): consulta InputFolder cada WatchInterval segundos (por defecto 30) y envía
+	al pool de workers cada punto que no creció durante WatchSettle segundos (por defecto 120), para que
+	los videos se escriban mientras el microscopio sigue adquiriendo. La vigilancia termina cuando se
+	cancela la ejecución o, si WatchIdle está definido, después de esa cantidad de minutos sin cuadros
+	nuevos (por defecto 0, sin límite).
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración.
+	folderNames (list): Todos los pocillos de la ejecución (usado para calcular el avance).
+	BrightNames (list): Todos los puntos de la ejecución (usado para calcular el avance).
+	workers (int): Número de puntos procesados al mismo tiempo.
+
+	Retorno:
+	list: Registros de resultado de los puntos procesados, en el orden en que quedaron listos.
+
+	Ejemplo de uso:
+	resultados = vigila_entrada(configuracion, folderNames, BrightNames, 2)
+	"""
+	global total_avance
+	intervalo = max(1.0, obtiene_config_decimal(configuracion, 'WatchInterval', 30.0))
+	inactividad = obtiene_config_decimal(configuracion, 'WatchIdle', 0.0) * 60
+	vigilante = VigilanteCarpeta(configuracion, obtiene_config_decimal(configuracion, 'WatchSettle', 120.0))
+	debug(configuracion, 'Vigilando InputFolder: ', '%s (cada %.0f s)' % (vigilante.input_folder, intervalo))
+	pool = Executors.newFixedThreadPool(workers)
+	futuros = []
+	try:
+		while not evento_cancelacion.isSet():
+			try:
+				listos = vigilante.consulta()
+			except IOException as e:
+				debug(configuracion, 'ERROR: No se pudo listar InputFolder, se reintenta: ', str(e))
+				listos = []
+			for newFolderName, BrightName in listos:
+				debug(configuracion, 'Punto listo: ', '%s\\%s' % (newFolderName, BrightName))
+				with lock_avance:
+					total_avance = total_avance + 1
+				seguimiento_avance.agrega_trabajos(configuracion.get('OutputFolder'), [(newFolderName, BrightName)],
+												   [bytes_punto(configuracion, newFolderName, BrightName)])
+				futuros.append(pool.submit(TrabajoPunto(configuracion, newFolderName, BrightName, folderNames, BrightNames)))
+			if inactividad and time.time() - vigilante.ultimo_cambio >= inactividad:
+				debug(configuracion, 'Sin cuadros nuevos, fin de la vigilancia después de minutos: ', '%.0f' % (inactividad / 60))
+				break
+			# Retorna de inmediato cuando se cancela la ejecución
+			evento_cancelacion.wait(intervalo)
+		# Los puntos ya enviados se terminan (o se marcan como cancelados) antes de retornar
+		return [futuro.get() for futuro in futuros]
+	finally:
+		pool.shutdown()
+
+# =============================================
+# Pipeline con Precarga
+# =============================================
+class TareaOrientacion(Callable):
+	"""
+	Tarea que resuelve la orientación de un punto en el pool de orientación, para que la
+	consulta a Custom Vision esté en curso mientras se cargan los cuadros del punto.
+	"""
+	def __init__(self, configuracion, punto):
+		self.configuracion = configuracion
+		self.punto = punto
+
+	def call(self):
+		return orientacion_punto(self.configuracion, self.punto)
+
+class EtapaCarga(Callable):
+	"""
+	Primera etapa del pipeline: para cada trabajo inicia la consulta de orientación, lee los
+	cuadros del disco y deja el punto cargado (con sus tiempos 'prepare' y 'open') en la cola acotada. Como put() se bloquea cuando
+	la cola está llena, a lo sumo PrefetchDepth puntos esperan en memoria a un codificador.
+	"""
+	def __init__(self, configuracion, trabajos, cargados, pool_orientacion, codificadores):
+		self.configuracion = configuracion
+		self.trabajos = trabajos
+		self.cargados = cargados
+		self.pool_orientacion = pool_orientacion
+		self.codificadores = codificadores
+
+	def call(self):
+		try:
+			for indice, (newFolderName, BrightName) in enumerate(self.trabajos):
+				inicio = time.time()
+				punto = imp = orientacion_futura = None
+				error = ''
+				tiempos = {}
+				try:
+					# Después de una cancelación los trabajos restantes no se cargan, los codificadores los marcan como cancelados
+					if not evento_cancelacion.isSet():
+						punto = prepara_punto(self.configuracion, newFolderName, BrightName)
+					suma_tiempo(tiempos, 'prepare', inicio)
+					if punto is not None and punto['resumed'] is None:
+						orientacion_futura = self.pool_orientacion.submit(TareaOrientacion(self.configuracion, punto))
+						# La orientación se conoce después, por eso las pilas streaming se abren sin inversión
+						inicio_etapa = time.time()
+						imp = abre_punto(self.configuracion, punto, False)
+						suma_tiempo(tiempos, 'open', inicio_etapa)
+				except Exception as e:
+					error = str(e)
+				self.cargados.put((indice, newFolderName, BrightName, punto, imp, orientacion_futura, error, inicio, tiempos))
+		finally:
+			# Una marca de fin por codificador, para que todos terminen después del último trabajo
+			for i in range(self.codificadores):
+				self.cargados.put((None, None, None, None, None, None, '', 0, None))
+		return None
+
+class EtapaCodificacion(Callable):
+	"""
+	Segunda etapa del pipeline: toma los puntos cargados de la cola, espera su orientación y
+	los convierte, invierte, estabiliza y escribe (ver codifica_punto).
+	"""
+	def __init__(self, configuracion, cargados, resultados, folderNames, BrightNames):
+		self.configuracion = configuracion
+		self.cargados = cargados
+		self.resultados = resultados
+		self.folderNames = folderNames
+		self.BrightNames = BrightNames
+
+	def call(self):
+		while True:
+			indice, newFolderName, BrightName, punto, imp, orientacion_futura, error, inicio, tiempos = self.cargados.take()
+			if indice is None:
+				return None
+			resultado = nuevo_resultado(newFolderName, BrightName)
+			resultado['timings'] = tiempos
+			try:
+				verifica_cancelacion()
+				if error:
+					raise Exception(error)
+				if punto is None:
+					resultado['status'] = 'missing'
+					debug(self.configuracion, 'No existe directorio para %s\\%s.' % (newFolderName, BrightName), '')
+				elif punto['resumed'] is not None:
+					omite_punto(self.configuracion, punto, resultado)
+				else:
+					# Solo se cuenta el tiempo que el codificador espera la respuesta
+					inicio_etapa = time.time()
+					cambiar_orientacion = orientacion_futura.get()
+					resultado['flip'] = cambiar_orientacion
+					suma_tiempo(tiempos, 'orientation', inicio_etapa)
+					if imp:
+						codifica_punto(self.configuracion, punto, imp, cambiar_orientacion, resultado)
+					else:
+						resultado['error'] = 'ERROR: No se pudo abrir la secuencia de imagenes de la carpeta %s' % punto['dir']
+						debug(self.configuracion, resultado['error'], '')
+			except ProcesamientoCancelado:
+				resultado['status'] = 'cancelled'
+				debug(self.configuracion, 'Cancelado: ', '%s\\%s' % (newFolderName, BrightName))
+			except Exception as e:
+				resultado['error'] = str(e)
+				debug(self.configuracion, 'ERROR: Fallo el procesamiento de %s\\%s: ' % (newFolderName, BrightName), str(e))
+			if imp and resultado['status'] != 'done' and self.configuracion.get('Visor') != 'True':
+				# Un punto cargado que se cancela o falla no lo cierra codifica_punto
+				imp.close()
+			resultado['seconds'] = time.time() - inicio
+			registra_punto(self.configuracion, punto, resultado)
+			self.resultados[indice] = resultado
+			avance(self.folderNames, self.BrightNames, resultado, self.configuracion.get('OutputFolder'))
+
+def ejecuta_pipeline(configuracion, trabajos, folderNames, BrightNames, workers):
+	"""
+	Procesa los trabajos como un pipeline productor/consumidor: un cargador lee los puntos
+	siguientes (e inicia sus consultas de orientación) mientras 'workers' codificadores convierten
+	y escriben los actuales. La cola entre ambas etapas contiene a lo sumo PrefetchDepth puntos.
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración ('PrefetchDepth' es opcional, por defecto 2).
+	trabajos (list): Pares (pocillo, punto) a procesar.
+	folderNames (list): Todos los pocillos de la ejecución (se usa para calcular el avance).
+	BrightNames (list): Todos los puntos de la ejecución (se usa para calcular el avance).
+	workers (int): Número de hilos codificadores.
+
+	Retorno:
+	list: Registros de resultado de todos los trabajos, en el orden de los trabajos.
+
+	Ejemplo de uso:
+	resultados = ejecuta_pipeline(configuracion, trabajos, folderNames, BrightNames, 2)
+	"""
+	profundidad = max(1, obtiene_config_entero(configuracion, 'PrefetchDepth', 2))
+	debug(configuracion, 'Pipeline activado. Profundidad de precarga: ', str(profundidad))
+	cargados = ArrayBlockingQueue(profundidad)
+	resultados = [None] * len(trabajos)
+	# Las consultas de orientación pueden adelantarse a los codificadores, hasta MaxInFlight a la vez
+	pool_orientacion = Executors.newFixedThreadPool(max(workers, obtiene_config_entero(configuracion, 'MaxInFlight', 4)))
+	pool = Executors.newFixedThreadPool(workers + 1)
+	try:
+		etapas = [pool.submit(EtapaCarga(configuracion, trabajos, cargados, pool_orientacion, workers))]
+		for i in range(workers):
+			etapas.append(pool.submit(EtapaCodificacion(configuracion, cargados, resultados, folderNames, BrightNames)))
+		for etapa in etapas:
+			etapa.get()
+	finally:
+		pool.shutdown()
+		pool_orientacion.shutdown()
+	return resultados
+
+def planifica_placa(configuracion):
+	"""
+	Prepara una placa para el procesamiento: crea su política de orientación y su manifiesto de
+	ejecución y lista sus trabajos (pocillo, punto), de 'ReadFolders' x 'BrightFoldersPoint' o, con
+	DiscoverPoints=True, de un solo escaneo de InputFolder (ver escanea_entrada). Con Watch=True la
+	lista de trabajos queda vacía, los puntos se encuentran mientras la adquisición los escribe.
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración de la placa.
+
+	Retorno:
+	tuple: (trabajos, folderNames, BrightNames).
+
+	Ejemplo de uso:
+	trabajos, folderNames, BrightNames = planifica_placa(configuracion)
+	"""
+	folderNames = configuracion.get('ReadFolders').split(',')
+	BrightNames = configuracion.get('BrightFoldersPoint').split(',')
+	outputFolder = configuracion.get('OutputFolder')
+	politicas_orientacion[outputFolder] = crea_politica_orientacion(configuracion)
+	manifiestos_ejecucion[outputFolder] = crea_manifiesto_ejecucion(configuracion)
+	inicio = time.time()
+	if configuracion.get('Watch') == 'True':
+		trabajos = tamanos = []
+	elif configuracion.get('DiscoverPoints') == 'True':
+		puntos = escanea_entrada(configuracion)
+		trabajos = [(punto['well'], punto['point']) for punto in puntos]
+		tamanos = [punto['bytes'] for punto in puntos]
+	else:
+		trabajos = [(newFolderName, BrightName) for newFolderName in folderNames for BrightName in BrightNames]
+		# El tamaño de cada punto pondera el avance (ver SeguimientoAvance)
+		tamanos = [bytes_punto(configuracion, newFolderName, BrightName) for newFolderName, BrightName in trabajos]
+	seguimiento_avance.agrega_trabajos(outputFolder, trabajos, tamanos)
+	metricas_placa[outputFolder] = {'start': inicio, 'discovery': time.time() - inicio}
+	return trabajos, folderNames, BrightNames
+
+def finaliza_placa(configuracion, resultados):
+	"""
+	Escribe el resumen y las métricas de una placa en su log (ver reporte_resultados y reporte_metricas)
+	y libera su política de orientación y su manifiesto de ejecución.
+	"""
+	reporte_resultados(configuracion, resultados)
+	outputFolder = configuracion.get('OutputFolder')
+	reporte_metricas(configuracion, resultados, metricas_placa.pop(outputFolder, None))
+	politica_orientacion = politicas_orientacion.pop(outputFolder, None)
+	manifiestos_ejecucion.pop(outputFolder, None)
+	if politica_orientacion is not None:
+		debug(configuracion, 'Clasificaciones de orientacion: ', '%d de %d puntos' % (politica_orientacion.consultas, len(resultados)))
+
+def finaliza_ejecucion(configuracion, resultados):
+	"""
+	Guarda la caché de orientación y, con TrainLocalModel=True, entrena el modelo de orientación
+	local una vez procesadas todas las placas de la ejecución.
+	"""
+	cache = obtiene_cache_orientacion(configuracion)
+	if cache is not None:
+		# Reescribe el archivo de la caché sin las entradas descartadas
+		cache.guarda()
+	if configuracion.get('TrainLocalModel') == 'True':
+		entrena_modelo_local(configuracion, resultados)
+
+def procesamiento_imagenes(configuracion):
+	"""
+	Procesa cada combinación (pocillo, punto) de 'ReadFolders' x 'BrightFoldersPoint', o con
+	DiscoverPoints=True cada punto encontrado en InputFolder en un solo escaneo (ver planifica_placa).
+
+	Cada combinación es un trabajo independiente. Con Workers=1 (por defecto) los trabajos se ejecutan
+	uno tras otro; con más workers se distribuyen en un pool de hilos de tamaño fijo. Con Pipeline=True
+	los puntos siguientes se cargan (y se consulta su orientación) mientras se codifican los actuales.
+	Con Resume=True se omiten los puntos registrados como terminados en el manifiesto de ejecución. Con
+	Watch=True los puntos se procesan a medida que la adquisición los escribe (ver vigila_entrada).
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración.
+
+	Retorno:
+	list: Registros de resultado de todos los trabajos (ver procesa_punto).
+
+	Ejemplo de uso:
+	resultados = procesamiento_imagenes(configuracion)
+	"""
+	global total_avance, inicio_avance
+	resultados = []
+	inputFolder = configuracion.get('InputFolder')
+	if inputFolder:
+		trabajos, folderNames, BrightNames = planifica_placa(configuracion)
+		vigilar = configuracion.get('Watch') == 'True'
+		total_avance = len(trabajos)
+		inicio_avance = time.time()
+		seguimiento_avance.comienza()
+		workers = min(obtiene_workers(configuracion), len(trabajos)) if trabajos else 1
+		if vigilar:
+			workers = obtiene_workers(configuracion)
+		debug(configuracion, 'Workers: ', str(workers))
+		if vigilar:
+			resultados = vigila_entrada(configuracion, folderNames, BrightNames, workers)
+		elif configuracion.get('Pipeline') == 'True' and trabajos:
+			resultados = ejecuta_pipeline(configuracion, trabajos, folderNames, BrightNames, workers)
+		elif workers > 1:
+			pool = Executors.newFixedThreadPool(workers)
+			try:
+				futuros = [pool.submit(TrabajoPunto(configuracion, newFolderName, BrightName, folderNames, BrightNames))
+						   for newFolderName, BrightName in trabajos]
+				# Los resultados se recogen en el orden de envío para que el reporte sea determinista
+				resultados = [futuro.get() for futuro in futuros]
+			finally:
+				pool.shutdown()
+		else:
+			for newFolderName, BrightName in trabajos:
+				resultados.append(procesa_punto(configuracion, newFolderName, BrightName, folderNames, BrightNames))
+		finaliza_placa(configuracion, resultados)
+		finaliza_ejecucion(configuracion, resultados)
+	return resultados
+
+# =============================================
+# Línea de Comandos
+# =============================================
+def ejecuta_programa(configuracion, workspace_path, copy_dir):
+	"""
+	Ingresa la carpeta de origen al espacio de trabajo y la procesa. Compartida por el botón
+	Aceptar de la GUI y la línea de comandos sin GUI.
+
+	Parámetros:
+	configuracion (dict): Diccionario de configuración (el modo de ingesta se lee de 'Ingest').
+	workspace_path (str): Espacio de trabajo creado por setup_workspace.
+	copy_dir (str): Carpeta con los pocillos a procesar.
+
+	Retorno:
+	list: Registros de resultado de todos los trabajos (ver procesamiento_imagenes).
+
+	Ejemplo de uso:
+	resultados = ejecuta_programa(configuracion, workspace_path, copy_dir)
+	"""
+	global iteracion_avance, cuadros_avance
+	iteracion_avance = 0  # Reiniciar contador
+	cuadros_avance = 0
+	seguimiento_avance.reinicia()
+	cuadros_escaneados.clear()   # Los listados de una ejecución anterior pueden estar desactualizados
+	if configuracion.get('Watch') == 'True':
+		# Una adquisición en curso se lee donde el microscopio la escribe (ver vigila_entrada)
+		configuracion['Ingest'] = 'InPlace'
+	# La configuración se carga primero porque define el modo de ingesta (Ingest)
+	ingest_thread = start_ingest(configuracion, os.path.join(workspace_path, "InputFolder"), copy_dir)
+	inicio_programa(configuracion)
+	creacion_carpetas_destino(configuracion)
+	perfilador = crea_perfilador(configuracion)
+	try:
+		resultados = procesamiento_imagenes(configuracion)
+	finally:
+		detiene_perfilador(configuracion, perfilador)
+	if ingest_thread is not None:
+		# Tras una cancelación la ingesta se detiene en su siguiente archivo, así la espera es acotada
+		while ingest_thread.isAlive() and not evento_cancelacion.isSet():
+			ingest_thread.join(1.0)
+		ingest_thread.join(30.0)
+		if ingest_thread.isAlive():
+			debug(configuracion, 'La ingesta sigue deteniéndose tras la cancelación: ', copy_dir)
+	debug(configuracion, 'FIN DEL PROGRAMA.', '')
+	escritor_log.vacia()
+	return resultados
+
+def carpetas_placa(tamano_placa):
+	"""
+	Retorna las carpetas de pocillo de un tamaño de placa en el orden que usa la GUI (ej. '2 x 3' ->
+	A01, A02, B01, B02, C01, C02).
+
+	Parámetros:
+	tamano_placa (str): Tamaño de placa como 'filas x columnas' (ej. '8 x 12').
+
+	Retorno:
+	list: Nombres de las carpetas de pocillo.
+	"""
+	rows, cols = map(int, tamano_placa.strip().split("x"))
+	folders = []
+	for col in range(cols):
+		for row in range(1, rows + 1):
+			folders.append("{}{:02d}".format(chr(65 + col), row))  # 65 es el código ASCII de 'A'
+	return folders
+
+def reemplazo_config(valor):
+	"""
+	Interpreta un argumento CLAVE=VALOR de --set.
+	"""
+	if '=' not in valor:
+		raise argparse.ArgumentTypeError("se esperaba CLAVE=VALOR, se recibió '%s'" % valor)
+	clave, valor = valor.split('=', 1)
+	return (clave.strip(), valor.strip())
+
+def lista_placas(valor):
+	"""
+	Interpreta los tamaños de placa de --bench-plates ('all' selecciona todos los tamaños del menú de la GUI).
+	"""
+	if valor.strip().lower() == 'all':
+		return list(TAMANOS_PLACA)
+	placas = [placa.strip() for placa in valor.split(',') if placa.strip()]
+	for placa in placas:
+		try:
+			rows, cols = map(int, placa.split('x'))
+		except ValueError:
+			raise argparse.ArgumentTypeError("se esperaba 'filas x columnas', se recibió '%s'" % placa)
+	return placas
+
+def lista_enteros(valor):
+	"""
+	Interpreta una lista de enteros separados por comas de los argumentos --bench-*.
+	"""
+	try:
+		return [int(elemento) for elemento in valor.split(',') if elemento.strip()]
+	except ValueError:
+		raise argparse.ArgumentTypeError("se esperaban enteros separados por ',', se recibió '%s'" % valor)
+
+def lista_decimales(valor):
+	"""
+	Interpreta una lista de números separados por comas de los argumentos --bench-*.
+	"""
+	try:
+		return [float(elemento) for elemento in valor.split(',') if elemento.strip()]
+	except ValueError:
+		raise argparse.ArgumentTypeError("se esperaban números separados por ',', se recibió '%s'" % valor)
+
+def lista_tamanos(valor):
+	"""
+	Interpreta los tamaños de cuadro ANCHOxALTO de --bench-sizes.
+	"""
+	try:
+		tamanos = []
+		for tamano in valor.split(','):
+			if tamano.strip():
+				ancho, alto = map(int, tamano.lower().split('x'))
+				tamanos.append((ancho, alto))
+		return tamanos
+	except ValueError:
+		raise argparse.ArgumentTypeError("se esperaban tamaños ANCHOxALTO separados por ',', se recibió '%s'" % valor)
+
+def lee_argumentos(argv):
+	"""
+	Interpreta los argumentos de la línea de comandos sin GUI.
+
+	Ejemplo de uso:
+	opciones = lee_argumentos(['--work-dir', '/data/work', '--source', '/data/plate1', '--plate', '8 x 12'])
+	"""
+	parser = argparse.ArgumentParser(prog='AutoStabilizer', description='Procesa una placa del Muvicyte sin la interfaz gráfica.')
+	parser.add_argument('--work-dir', help='Carpeta donde se crea el espacio de trabajo de AutoStabilizer.')
+	parser.add_argument('--source', help='Carpeta con los pocillos a procesar.')
+	parser.add_argument('--batch', metavar='MANIFIESTO', help='Archivo CSV con varias placas (source, output, plate, wells, points) '
+						'procesadas con un único pool de workers; reemplaza --work-dir y --source.')
+	parser.add_argument('--benchmark', metavar='DIR', help='Genera placas sintéticas en DIR y procesa cada configuración de las '
+						'listas --bench-* contra un sustituto local de Custom Vision; reemplaza --work-dir y --source.')
+	parser.add_argument('--bench-plates', default='2 x 2', type=lista_placas,
+						help="Tamaños de placa del banco de pruebas, ej. '2 x 2,8 x 6', o 'all' para los tamaños de la GUI (por defecto '2 x 2').")
+	parser.add_argument('--bench-points', default='1', type=lista_enteros, help='Puntos por pocillo del banco de pruebas (por defecto 1).')
+	parser.add_argument('--bench-frames', default='24', type=lista_enteros, help='Cuadros por punto del banco de pruebas (por defecto 24).')
+	parser.add_argument('--bench-sizes', default='512x512', type=lista_tamanos, help="Tamaños de cuadro del banco de pruebas, ej. '512x512,2048x2048' (por defecto 512x512).")
+	parser.add_argument('--bench-depths', default='8', type=lista_enteros, help='Profundidades de bits de los cuadros, 8 y/o 16 (por defecto 8).')
+	parser.add_argument('--bench-drift', default='0', type=lista_decimales, help='Deriva de los cuadros en píxeles por cuadro (por defecto 0).')
+	parser.add_argument('--bench-latency', default=0.0, type=float, help='Milisegundos que espera el sustituto de Custom Vision antes de responder (por defecto 0).')
+	parser.add_argument('--selftest', action='store_true', help='Prueba el cliente de Custom Vision (reintentos, tiempos '
+						'de espera, MaxInFlight) contra un sustituto local y termina.')
+	parser.add_argument('--plate', help="Tamaño de placa como 'filas x columnas', ej. '8 x 12' (define ReadFolders y CreateFolders).")
+	parser.add_argument('--wells', help="Pocillos a procesar, ej. 'A01,A02' (define ReadFolders y CreateFolders).")
+	parser.add_argument('--points', help="Puntos a procesar, ej. 'POINT 00001\\BRIGHT' o 'POINT 00001/BRIGHT' (define BrightFoldersPoint).")
+	parser.add_argument('--watch', action='store_true', help='Procesa los puntos mientras la adquisición los escribe (define Watch=True).')
+	parser.add_argument('--config', default='Config.txt', help='Archivo de configuración base (por defecto Config.txt).')
+	parser.add_argument('--set', dest='overrides', action='append', default=[], type=reemplazo_config, metavar='CLAVE=VALOR',
+						help='Reemplaza una clave del archivo de configuración, ej. --set Workers=4 (se puede repetir).')
+	opciones = parser.parse_args(argv)
+	if not opciones.batch and not opciones.benchmark and not opciones.selftest and not (opciones.work_dir and opciones.source):
+		parser.error('--work-dir y --source son obligatorios si no se usa --batch, --benchmark o --selftest')
+	if [profundidad for profundidad in opciones.bench_depths if profundidad not in (8, 16)]:
+		parser.error('--bench-depths solo acepta 8 y 16')
+	return opciones
+
+def ejecuta_sin_gui(argv):
+	"""
+	Punto de entrada sin GUI: crea el espacio de trabajo, arma la configuración a partir del
+	archivo de configuración base y de los argumentos, y procesa la placa sin la GUI de Swing.
+
+	Parámetros:
+	argv (list): Argumentos de la línea de comandos (ver lee_argumentos).
+
+	Ejemplo de uso:
+	ImageJ-linux64 --headless --jython AutoStabilizer_v1.4.4_ES.ijm.py --work-dir /data/work --source /data/plate1 --plate "8 x 12"
+	ImageJ-linux64 --headless --jython AutoStabilizer_v1.4.4_ES.ijm.py --batch /data/batch.csv --set Workers=8
+	ImageJ-linux64 --headless --jython AutoStabilizer_v1.4.4_ES.ijm.py --benchmark /data/bench --bench-frames 24,96
+	ImageJ-linux64 --headless --jython AutoStabilizer_v1.4.4_ES.ijm.py --selftest
+	"""
+	global configuracion
+	opciones = lee_argumentos(argv)
+	if opciones.selftest:
+		if not ejecuta_autoprueba():
+			sys.exit(1)
+		return
+	if opciones.batch:
+		ejecuta_lote(opciones.batch, opciones.config, dict(opciones.overrides))
+		return
+	if opciones.benchmark:
+		ejecuta_banco_pruebas(opciones)
+		return
+	workspace_path = setup_workspace(opciones.work_dir)
+	if not workspace_path:
+		sys.exit(1)
+	reemplazos = {}
+	for subdir in ["LogFolder", "InputFolder", "OutputFolder"]:
+		reemplazos[subdir] = os.path.join(workspace_path, subdir)
+	folders = None
+	if opciones.wells:
+		folders = [pocillo.strip() for pocillo in opciones.wells.split(',')]
+	elif opciones.plate:
+		folders = carpetas_placa(opciones.plate)
+	if folders:
+		reemplazos['ReadFolders'] = reemplazos['CreateFolders'] = ','.join(folders)
+	if opciones.points:
+		reemplazos['BrightFoldersPoint'] = opciones.points
+	if opciones.watch:
+		reemplazos['Watch'] = 'True'
+	reemplazos.update(dict(opciones.overrides))
+	configuracion = abre_archivo_config(opciones.config, reemplazos)
+	ejecuta_programa(configuracion, workspace_path, opciones.source)
+
+# =============================================
+# Lote de Placas
+# =============================================
+def lee_manifiesto_lote(ruta):
+	"""
+	Lee un manifiesto de lote: un archivo CSV con una placa por fila y las columnas 'source' (carpeta
+	con los pocillos), 'output' (carpeta donde se crea el espacio de trabajo de la placa) y opcionalmente
+	'plate' (ej. '8 x 12'), 'wells' y 'points' (listas separadas por ';'). Se ignoran las líneas vacías
+	y las que empiezan con '#'.
+
+	Parámetros:
+	ruta (str): Ruta del manifiesto.
+
+	Retorno:
+	list: Un diccionario por placa con las claves del encabezado.
+
+	Ejemplo de uso:
+	placas = lee_manifiesto_lote('/data/batch.csv')
+	"""
+	with open(ruta, 'r') as manifiesto:
+		lineas = [linea for linea in manifiesto if linea.strip() and not linea.lstrip().startswith('#')]
+	placas = []
+	for fila in csv.DictReader(lineas):
+		placa = dict([(clave.strip().lower(), (valor or '').strip()) for clave, valor in fila.items() if clave])
+		if not placa.get('source') or not placa.get('output'):
+			raise ValueError("cada fila del manifiesto de lote necesita 'source' y 'output': %s" % fila)
+		placas.append(placa)
+	return placas
+
+def reemplazos_placa(placa, workspace_path):
+	"""
+	Retorna los valores de configuración de una placa del manifiesto de lote (carpetas del espacio
+	de trabajo, pocillos y puntos).
+	"""
+	reemplazos = {}
+	for subdir in ["LogFolder", "InputFolder", "OutputFolder"]:
+		reemplazos[subdir] = os.path.join(workspace_path, subdir)
+	folders = None
+	if placa.get('wells'):
+		folders = [pocillo.strip() for pocillo in placa['wells'].split(';')]
+	elif placa.get('plate'):
+		folders = carpetas_placa(placa['plate'])
+	if folders:
+		reemplazos['ReadFolders'] = reemplazos['CreateFolders'] = ','.join(folders)
+	if placa.get('points'):
+		reemplazos['BrightFoldersPoint'] = ','.join([punto.strip() for punto in placa['points'].split(';')])
+	return reemplazos
+
+def ejecuta_lote(ruta_manifiesto, ruta_config='Config.txt', reemplazos=None):
+	"""
+	Procesa todas las placas de un manifiesto de lote (ver lee_manifiesto_lote) en una sola ejecución.
+	Los puntos de todas las placas se envían a un único pool de workers, así el pool no se vacía entre
+	placas, y se comparten el cliente de Custom Vision, la caché de orientación y el modelo local.
+	Cada placa conserva su espacio de trabajo, su log, su manifiesto de ejecución y su política de orientación.
+
+	Parámetros:
+	ruta_manifiesto (str): Ruta del manifiesto de lote.
+	ruta_config (str): Archivo de configuración base (por defecto 'Config.txt').
+	reemplazos (dict): Valores que reemplazan los del archivo en todas las placas (--set).
+
+	Retorno:
+	list: Registros de resultado de todas las placas.
+
+	Ejemplo de uso:
+	resultados = ejecuta_lote('/data/batch.csv', 'Config.txt', {'Workers': '8'})
+	"""
+	global configuracion, iteracion_avance, cuadros_avance, total_avance, inicio_avance
+	iteracion_avance = 0  # Reiniciar contador
+	cuadros_avance = 0
+	seguimiento_avance.reinicia()
+	cuadros_escaneados.clear()   # Los listados de una ejecución anterior pueden estar desactualizados
+	placas = []
+	for placa in lee_manifiesto_lote(ruta_manifiesto):
+		workspace_path = setup_workspace(placa['output'])
+		if not workspace_path:
+			sys.exit(1)
+		valores = reemplazos_placa(placa, workspace_path)
+		valores.update(reemplazos or {})
+		config_placa = abre_archivo_config(ruta_config, valores)
+		# Un lote solo lee adquisiciones ya terminadas
+		config_placa['Watch'] = 'False'
+		if placas:
+			# La caché de orientación y el modelo local de la primera placa sirven a todo el lote
+			for clave, valor in (('OrientationCacheFolder', placas[0][0].get('OrientationCacheFolder') or placas[0][0].get('LogFolder')),
+								 ('LocalModel', ruta_modelo_local(placas[0][0]))):
+				if not config_placa.get(clave):
+					config_placa[clave] = valor
+		placas.append((config_placa, workspace_path, placa['source']))
+	if not placas:
+		IJ.log("El manifiesto de lote no tiene placas: {}".format(ruta_manifiesto))
+		return []
+	configuracion = placas[0][0]
+	planificadas = []
+	for config_placa, workspace_path, source_dir in placas:
+		inicio_programa(config_placa)
+		ingest_input(config_placa, os.path.join(workspace_path, "InputFolder"), source_dir)
+		creacion_carpetas_destino(config_placa)
+		trabajos, folderNames, BrightNames = planifica_placa(config_placa)
+		debug(config_placa, 'Placa del lote: ', '%s (%d puntos)' % (source_dir, len(trabajos)))
+		planificadas.append((config_placa, trabajos, folderNames, BrightNames))
+	total_avance = sum([len(plan[1]) for plan in planificadas])
+	inicio_avance = time.time()
+	seguimiento_avance.comienza()
+	workers = max(1, min(obtiene_workers(configuracion), total_avance))
+	debug(configuracion, 'Workers: ', str(workers))
+	perfilador = crea_perfilador(configuracion)
+	pool = Executors.newFixedThreadPool(workers)
+	try:
+		futuros = []
+		for config_placa, trabajos, folderNames, BrightNames in planificadas:
+			futuros.append([pool.submit(TrabajoPunto(config_placa, newFolderName, BrightName, folderNames, BrightNames))
+							for newFolderName, BrightName in trabajos])
+		resultados = []
+		for (config_placa, trabajos, folderNames, BrightNames), futuros_placa in zip(planificadas, futuros):
+			# Cada placa se reporta en su propio log apenas terminan sus puntos
+			resultados_placa = [futuro.get() for futuro in futuros_placa]
+			for resultado in resultados_placa:
+				resultado['input'] = config_placa.get('InputFolder')
+			finaliza_placa(config_placa, resultados_placa)
+			resultados.extend(resultados_placa)
+	finally:
+		pool.shutdown()
+		detiene_perfilador(configuracion, perfilador)
+	finaliza_ejecucion(configuracion, resultados)
+	for config_placa, workspace_path, source_dir in placas:
+		debug(config_placa, 'FIN DEL PROGRAMA.', '')
+	escritor_log.vacia()
+	return resultados
+
+# =============================================
+# Banco de Pruebas
+# =============================================
+def escena_sintetica(ancho, alto, maximo, aleatorio):
+	"""
+	Retorna la escena de la que se recortan los cuadros de un punto sintético: un gradiente de
+	iluminación suave con células aleatorias (discos suavizados), con valores entre 0 y maximo.
+	"""
+	esquinas = FloatProcessor(2, 2, jarray.array([0.25 + 0.1 * aleatorio.nextDouble() for i in range(4)], 'f'))
+	esquinas.setInterpolationMethod(ImageProcessor.BILINEAR)
+	escena = esquinas.resize(ancho, alto)
+	escena.multiply(maximo)
+	for i in range(ancho * alto // 2000):
+		radio = 3 + aleatorio.nextInt(10)
+		escena.setValue(maximo * (0.5 + 0.4 * aleatorio.nextDouble()))
+		escena.fillOval(aleatorio.nextInt(ancho) - radio, aleatorio.nextInt(alto) - radio, 2 * radio, 2 * radio)
+	escena.blurGaussian(2.0)
+	return escena
+
+def genera_punto(dir_punto, cuadros, ancho, alto, profundidad, deriva, semilla):
+	"""
+	Escribe los cuadros de un punto sintético como 00000.TIFF, 00001.TIFF, ... en dir_punto. Cada cuadro
+	es una ventana de la misma escena desplazada 'deriva' píxeles por cuadro (en diagonal, con un píxel
+	de variación), más ruido, de modo que Stabilize tiene una traslación real que recuperar. Los cuadros
+	que ya existen se conservan, así un banco de pruebas se repite sin volver a generar sus placas.
+
+	Parámetros:
+	dir_punto (str): Carpeta BRIGHT del punto.
+	cuadros (int): Número de cuadros.
+	ancho (int), alto (int): Tamaño del cuadro en píxeles.
+	profundidad (int): 8 o 16 bits.
+	deriva (float): Traslación en píxeles por cuadro.
+	semilla (int): Semilla de la escena, la variación y el ruido.
+	"""
+	if not os.path.isdir(dir_punto):
+		os.makedirs(dir_punto)
+	aleatorio = Random(semilla)
+	maximo = 255.0 if profundidad == 8 else 4095.0
+	margen = int(math.ceil(deriva * max(0, cuadros - 1))) + 2
+	escena = None
+	for i in range(cuadros):
+		x = min(margen, max(0, 1 + int(round(deriva * i)) + aleatorio.nextInt(3) - 1)) if deriva else 1
+		y = min(margen, max(0, 1 + int(round(deriva * i * 0.5)) + aleatorio.nextInt(3) - 1)) if deriva else 1
+		ruta = os.path.join(dir_punto, '%05d.TIFF' % i)
+		if os.path.exists(ruta):
+			continue
+		if escena is None:
+			escena = escena_sintetica(ancho + margen, alto + margen, maximo, Random(semilla))
+		escena.setRoi(x, y, ancho, alto)
+		cuadro = escena.crop()
+		cuadro.noise(maximo * 0.02)
+		if profundidad == 8:
+			cuadro = cuadro.convertToByteProcessor(False)
+		else:
+			cuadro = cuadro.convertToShortProcessor(False)
+		FileSaver(ImagePlus('%05d' % i, cuadro)).saveAsTiff(ruta)
+
+def genera_placa(dir_origen, tamano_placa, puntos, cuadros, ancho, alto, profundidad, deriva):
+	"""
+	Escribe una placa sintética del Muvicyte en dir_origen con la estructura de la adquisición,
+	<pocillo>/POINT 0000N/BRIGHT/00000.TIFF, para los pocillos de tamano_placa (ver carpetas_placa).
+
+	Retorno:
+	tuple: (pocillos, BrightNames) para usar como ReadFolders y BrightFoldersPoint.
+
+	Ejemplo de uso:
+	pocillos, BrightNames = genera_placa('/data/bench/plates/2x2', '2 x 2', 1, 24, 512, 512, 8, 1.0)
+	"""
+	pocillos = carpetas_placa(tamano_placa)
+	BrightNames = [os.path.join('POINT %05d' % (punto + 1), 'BRIGHT') for punto in range(puntos)]
+	for indice, pocillo in enumerate(pocillos):
+		for punto in range(puntos):
+			dir_punto = os.path.join(dir_origen, pocillo, 'POINT %05d' % (punto + 1), 'BRIGHT')
+			genera_punto(dir_punto, cuadros, ancho, alto, profundidad, deriva, indice * puntos + punto)
+	return pocillos, BrightNames
+
+def pools_heap():
+	"""
+	Retorna los pools de memoria del heap de Java, cuyo uso máximo es la memoria máxima de una configuración del banco de pruebas.
+	"""
+	return [pool for pool in ManagementFactory.getMemoryPoolMXBeans() if pool.getType() == MemoryType.HEAP]
+
+def guarda_banco_pruebas(ruta, filas):
+	"""
+	Agrega las filas del banco de pruebas a un archivo CSV, con encabezado cuando el archivo es nuevo.
+	"""
+	archivo_nuevo = not os.path.exists(ruta)
+	with open(ruta, 'a') as banco:
+		writer = csv.writer(banco, lineterminator='\n')
+		if archivo_nuevo and filas:
+			writer.writerow([clave for clave, valor in filas[0]])
+		for fila in filas:
+			writer.writerow([valor for clave, valor in fila])
+
+def ejecuta_banco_pruebas(opciones):
+	"""
+	Mide el rendimiento del pipeline con placas sintéticas. Cada combinación de las listas --bench-*
+	(tamaño de placa, puntos, cuadros, tamaño de cuadro, profundidad de bits, deriva) se genera una vez
+	en DIR/plates (ver genera_placa) y se procesa sin GUI en su lugar, con su espacio de trabajo en
+	DIR/runs, contra un sustituto local de Custom Vision (ver SustitutoCustomVision). El archivo de
+	configuración y --set se aplican a todas las ejecuciones, así se comparan ej. --set Workers=4 o --set Stabilize=True.
+
+	Para cada configuración se registran los cuadros/s, MB/s, el heap máximo y la parte del tiempo de cada
+	punto dedicada a la etapa 'stabilize', y se agregan a DIR/benchmark.csv.
+	Si una configuración no termina todos sus puntos, el banco de pruebas se detiene con un error en lugar
+	de informar el rendimiento de una ejecución incompleta.
+	El heap máximo es la suma de los máximos de los pools del heap, medidos tras una recolección de basura.
+	Los cuadros se acaban de escribir, así que normalmente se leen desde la caché del sistema operativo.
+
+	Parámetros:
+	opciones: Argumentos de la línea de comandos (ver lee_argumentos).
+
+	Retorno:
+	list: Una fila por configuración, como pares (columna, valor).
+
+	Ejemplo de uso:
+	ImageJ-linux64 --headless --jython AutoStabilizer_v1.4.4_ES.ijm.py --benchmark /data/bench --bench-plates all --set Workers=4
+	"""
+	global configuracion
+	dir_base = opciones.benchmark
+	configuraciones = [(tamano_placa, puntos, cuadros, tamano, profundidad, deriva)
+					   for tamano_placa in opciones.bench_plates for puntos in opciones.bench_points
+					   for cuadros in opciones.bench_frames for tamano in opciones.bench_sizes
+					   for profundidad in opciones.bench_depths for deriva in opciones.bench_drift]
+	servidor, endpoint = inicia_sustituto(SustitutoCustomVision(opciones.bench_latency / 1000.0))
+	filas = []
+	fallida = None
+	try:
+		for tamano_placa, puntos, cuadros, (ancho, alto), profundidad, deriva in configuraciones:
+			etiqueta = '%s_%dpt_%df_%dx%d_%dbit_drift%g' % (tamano_placa.replace(' ', ''), puntos, cuadros, ancho, alto, profundidad, deriva)
+			dir_origen = os.path.join(dir_base, 'plates', etiqueta)
+			IJ.log("Banco de pruebas: generando {}".format(dir_origen))
+			pocillos, BrightNames = genera_placa(dir_origen, tamano_placa, puntos, cuadros, ancho, alto, profundidad, deriva)
+			workspace_path = setup_workspace(os.path.join(dir_base, 'runs', etiqueta))
+			if not workspace_path:
+				sys.exit(1)
+			reemplazos = {'ReadFolders': ','.join(pocillos), 'CreateFolders': ','.join(pocillos),
+						  'BrightFoldersPoint': ','.join(BrightNames), 'Ingest': 'InPlace',
+						  'ENDPOINT': endpoint, 'PREDICTION_KEY': 'benchmark'}
+			for subdir in ["LogFolder", "InputFolder", "OutputFolder"]:
+				reemplazos[subdir] = os.path.join(workspace_path, subdir)
+			reemplazos.update(dict(opciones.overrides))
+			configuracion = abre_archivo_config(opciones.config, reemplazos)
+			pools = pools_heap()
+			System.gc()
+			for pool in pools:
+				pool.resetPeakUsage()
+			inicio = time.time()
+			resultados = ejecuta_programa(configuracion, workspace_path, dir_origen)
+			segundos = time.time() - inicio
+			heap_mb = sum([pool.getPeakUsage().getUsed() for pool in pools]) / 1048576.0
+			terminados = len([resultado for resultado in resultados if resultado['status'] == 'done'])
+			if not resultados or terminados != len(resultados):
+				fallida = etiqueta
+				IJ.log("ERROR: Banco de pruebas {}: {} de {} puntos terminados, ver el log en {}".format(
+					etiqueta, terminados, len(pocillos) * puntos, configuracion.get('LogFolder')))
+				break
+			total_cuadros = sum([resultado['frames'] for resultado in resultados])
+			leidos_mb = sum([resultado['bytes_read'] for resultado in resultados]) / 1048576.0
+			# Parte del tiempo de cada punto dedicada a registrar y trasladar los cuadros
+			segundos_puntos = sum([resultado['seconds'] for resultado in resultados])
+			segundos_estabiliza = sum([resultado['timings'].get('stabilize', 0.0) for resultado in resultados])
+			porcentaje_estabiliza = 100.0 * segundos_estabiliza / segundos_puntos if segundos_puntos else 0.0
+			fila = [('configuration', etiqueta), ('plate', tamano_placa), ('points', puntos), ('jobs', len(resultados)), ('done', terminados),
+					('frames', total_cuadros), ('width', ancho), ('height', alto), ('bit_depth', profundidad), ('drift', deriva),
+					('workers', obtiene_workers(configuracion)), ('seconds', round(segundos, 3)),
+					('frames_per_second', round(total_cuadros / segundos, 2) if segundos else 0.0),
+					('read_mb_per_second', round(leidos_mb / segundos, 2) if segundos else 0.0),
+					('peak_heap_mb', round(heap_mb, 1)), ('stabilize_percent', round(porcentaje_estabiliza, 1))]
+			IJ.log("Banco de pruebas {}: {} cuadros en {:.1f} s ({:.1f} cuadros/s, {:.1f} MB/s), heap máximo {:.0f} MB, estabilización {:.1f}% del tiempo de los puntos".format(
+				etiqueta, total_cuadros, segundos, total_cuadros / segundos if segundos else 0.0,
+				leidos_mb / segundos if segundos else 0.0, heap_mb, porcentaje_estabiliza))
+			filas.append(fila)
+	finally:
+		servidor.stop(0)
+		servidor.getExecutor().shutdown()
+	ruta = os.path.join(dir_base, 'benchmark.csv')
+	guarda_banco_pruebas(ruta, filas)
+	IJ.log("Resultados del banco de pruebas: {}".format(ruta))
+	if fallida:
+		sys.exit(1)
+	return filas
+
+# =============================================
+# Ejecución Principal
+# =============================================
+# Solo esto se ejecuta al inicio
+if __name__ == "__main__":
+	if HEADLESS:
+		ejecuta_sin_gui(sys.argv[1:])
+	else:
+		setup_gui()
 
 # =============================================
 # Fin del Programa